@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload, secret):
+    return hmac.new(secret.encode(), payload.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(user, secret, ttl, scope=None):
+    """Выпуск подписанного токена с id, ролью и сроком действия.
+
+    scope ограничивает токен одним назначением (например, 'stream'): такой
+    токен не принимается вместо обычного, а обычный — вместо него.
+    """
+    claims = {
+        'id': user['id'],
+        'username': user['username'],
+        'role': user['role'],
+        'exp': int(time.time()) + ttl,
+    }
+    if scope:
+        claims['scope'] = scope
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{payload}.{_b64encode(_sign(payload, secret))}'
+
+
+def verify_token(token, secret, scope=None):
+    """Проверка подписи, срока действия и назначения; возвращает claims или None"""
+    try:
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload, secret)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, UnicodeError):
+        return None
+
+    if claims.get('exp', 0) < time.time() or claims.get('scope') != scope:
+        return None
+    return claims
+
+
+class UserCache:
+    """LRU-кэш строк пользователей с ограниченным временем жизни.
+
+    Запись хранит поколение своего слота. invalidate() увеличивает его, и
+    запись, прочитанная из базы до изменения, считается устаревшей.
+    """
+
+    def __init__(self, max_size=1024, ttl=30.0, slots=4096):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = [0] * slots
+        self._shared_lock = None
+
+    def share_between_processes(self):
+        """Хранить поколения в общей памяти.
+
+        Вызывается в мастер-процессе до fork: пополнение баланса в одном
+        воркере сбрасывает запись пользователя во всех остальных. Слот общий
+        для пользователей с одинаковым id % slots, поэтому изменение одного
+        сбрасывает лишь несколько соседних записей, а не весь кэш.
+        """
+        self._generations = multiprocessing.RawArray('q', len(self._generations))
+        self._shared_lock = multiprocessing.Lock()
+
+    def generation(self, user_id):
+        """Снимок поколения до чтения из базы; передаётся в put()"""
+        return self._generations[user_id % len(self._generations)]
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None:
+                return None
+            expires, generation, user = item
+            if expires < time.monotonic() or generation != self.generation(user_id):
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return user
+
+    def put(self, user_id, user, generation):
+        with self._lock:
+            # Пока строка читалась из базы, пользователя успели изменить
+            if generation != self.generation(user_id):
+                return
+            self._items[user_id] = (time.monotonic() + self.ttl, generation, user)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id):
+        slot = user_id % len(self._generations)
+        with self._lock:
+            if self._shared_lock is not None:
+                with self._shared_lock:
+                    self._generations[slot] += 1
+            else:
+                self._generations[slot] += 1
+            self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
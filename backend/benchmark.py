@@ -0,0 +1,942 @@
+"""Нагрузочный прогон всех маршрутов API через тестовый клиент Flask.
+
+    cd backend
+    python seed_data.py --database bench.db
+    python benchmark.py --database bench.db --requests 500 --threads 8 --save baseline.json
+    python benchmark.py --database bench.db --compare baseline.json
+
+Для каждого маршрута печатает p50/p95/p99 задержки и пропускную способность.
+С --save результаты сохраняются как эталон, с --compare сравниваются с ним:
+маршруты, у которых p95 вырос больше чем на --tolerance процентов или
+выросло наибольшее число SQL-запросов на один HTTP-запрос (признак N+1),
+отмечаются как регрессия, и скрипт завершается с кодом 1.
+Маршруты, меняющие данные, запускаются только с флагом --writes. Для
+выдачи, отмены, удаления блюд и рассмотрения заявок записи создаются
+в базе перед прогоном (prepare_pools), так что --writes — на копии базы.
+
+Входы в секунду при разной стоимости scrypt (первые входы пересчитывают
+хэши пользователей seed_data.py под новую стоимость):
+
+    CAFE_SCRYPT_N=32768 python benchmark.py --database bench.db --only login
+
+Цена журналирования для обработчиков — два прогона с разным --log-level:
+
+    python benchmark.py --database bench.db --log-level off --save nolog.json
+    python benchmark.py --database bench.db --log-level debug --compare nolog.json 2>/dev/null
+
+Пул соединений с WAL против прежнего get_db(), который открывал новое
+соединение на каждый запрос (--no-pool; база на время прогона
+переводится в журнал отката, следующий прогон с пулом возвращает WAL):
+
+    python benchmark.py --database bench.db --writes --only menu,orders_my_student,order_create --no-pool --save connect.json
+    python benchmark.py --database bench.db --writes --only menu,orders_my_student,order_create --compare connect.json
+
+Масштабирование по процессам: gunicorn -c gunicorn.conf.py wsgi:app
+запускается на копии базы с CAFE_WORKERS=1, 2, 4, и GET /api/menu и
+POST /api/orders нагружаются по HTTP из --threads потоков:
+
+    python benchmark.py --database bench.db --workers 1,2,4 --requests 4000 --threads 16
+
+Цена аутентификации на один запрос: прежний SELECT пользователя по имени,
+проверка подписанного токена и попадание и промах кэша пользователей:
+
+    python benchmark.py --database bench.db --auth
+
+Сериализация строк заказов старым (dict + json) и новым (queries.rows_to_json) путём:
+
+    python benchmark.py --database bench.db --serialize 100000
+
+Время кодирования JSON (стандартный провайдер Flask и FastJSONProvider) и
+размер тела без сжатия, с gzip и brotli для самых больших ответов:
+
+    python benchmark.py --database bench.db --encoding
+
+Время ответа поискового индекса меню без HTTP (для меню из тысяч блюд
+сгенерируйте базу с --dishes 5000):
+
+    python benchmark.py --database bench.db --search
+
+Расчёт очереди из N предзаказов пачками против оформления тех же заказов
+по одному (на копии базы, исходная не меняется):
+
+    python benchmark.py --database bench.db --settle 50000
+
+Выдача и отмена N заказов запросами по одному против подносов по --tray
+заказов через /api/orders/serve и /api/orders/cancel (на копии базы):
+
+    python benchmark.py --database bench.db --bulk 1000
+
+Выписка за последний месяц для ученика с несколькими годами истории:
+от снимка баланса и от суммы всего журнала (на копии базы):
+
+    python benchmark.py --database bench.db --statement 3
+
+Прогноз спроса по году заказов: загрузка счётчиков из SQLite, расчёт
+NumPy и повторное обращение из кэша:
+
+    python benchmark.py --database bench.db --forecast
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+
+# Число SQL-запросов текущего HTTP-запроса: тестовый клиент выполняет
+# запрос в потоке, который его отправил
+_request_queries = threading.local()
+
+
+def counting_observer(observer):
+    """Наблюдатель для db.set_query_observer: считает запросы и передаёт их дальше"""
+    def observe(sql, params, seconds):
+        # PRAGMA при открытии соединения в пуле к обработчику не относятся
+        if not sql.startswith('PRAGMA'):
+            _request_queries.count = getattr(_request_queries, 'count', 0) + 1
+        if observer is not None:
+            observer(sql, params, seconds)
+    return observe
+
+
+class PerRequestConnections:
+    """Замена пула для --no-pool: как прежний get_db(), новое соединение
+    без PRAGMA на каждый запрос и close() в конце запроса"""
+
+    def __init__(self, database):
+        import db
+
+        self.database = database
+        self.factory = db.InstrumentedConnection
+        conn = sqlite3.connect(database)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+
+    def acquire(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+    def close_all(self):
+        pass
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def load_context(database):
+    conn = sqlite3.connect(database)
+    students = [row[0] for row in conn.execute('SELECT id FROM users WHERE role = 0 LIMIT 1000')]
+    cooks = [row[0] for row in conn.execute('SELECT id FROM users WHERE role = 1 LIMIT 10')]
+    admins = [row[0] for row in conn.execute('SELECT id FROM users WHERE role = 2 LIMIT 10')]
+    dishes = [row[0] for row in conn.execute('SELECT id FROM dishes WHERE is_available = 1 AND quantity > 0')]
+    categories = [row[0] for row in conn.execute('SELECT DISTINCT category FROM dishes')]
+    subscribers = [row[0] for row in conn.execute('''
+        SELECT DISTINCT user_id FROM subscriptions
+        WHERE is_active = 1 AND end_date >= DATE('now', 'localtime') LIMIT 1000
+    ''')]
+    # Пароль password123 есть только у пользователей seed_data.py
+    logins = [row[0] for row in conn.execute("SELECT username FROM users WHERE username LIKE 'gen_student%' LIMIT 20")]
+    conn.close()
+    return {'students': students, 'cooks': cooks, 'admins': admins, 'dishes': dishes,
+            'categories': categories, 'subscribers': subscribers, 'logins': logins}
+
+
+def bench_serializer(database, count):
+    import queries
+
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('SELECT * FROM orders LIMIT ?', (count,)).fetchall()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    tuples = cursor.execute('SELECT * FROM orders LIMIT ?', (count,)).fetchall()
+    columns = tuple(column[0] for column in cursor.description)
+    conn.close()
+
+    paths = [
+        ('dict + json.dumps', lambda: json.dumps([dict(row) for row in rows], sort_keys=True).encode()),
+        ('queries.rows_to_json', lambda: queries.rows_to_json(columns, tuples).encode()),
+    ]
+    print(f'{len(rows)} строк заказов')
+    for name, serialize in paths:
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            body = serialize()
+            timings.append(time.perf_counter() - started)
+        print(f'{name:<24}{min(timings) * 1000:>10.1f} мс{len(body) / 1024:>12.0f} КБ')
+
+
+ENCODING_ROUTES = [
+    ('orders_my_admin', 2, '/api/orders/my'),
+    ('reports_detailed', 2, '/api/reports/detailed'),
+    ('reports_summary', 2, '/api/reports/summary'),
+    ('orders_my_admin_page', 2, '/api/orders/my?limit=500'),
+]
+
+
+def bench_encoding(app, tokens):
+    import gzip
+    from flask.json.provider import DefaultJSONProvider
+    from compression import brotli
+
+    providers = [('flask', DefaultJSONProvider(app)), ('fast', app.json)]
+    client = app.test_client()
+    header = f'{"маршрут":<24}' + ''.join(f'{name + " мс":>12}' for name, _ in providers)
+    print(header + f'{"КБ":>10}{"gzip КБ":>10}{"br КБ":>10}')
+    for name, role, path in ENCODING_ROUTES:
+        response = client.get(path, headers={'Authorization': 'Bearer ' + tokens[role][0]})
+        payload = json.loads(response.get_data())
+        line = f'{name:<24}'
+        for _, provider in providers:
+            timings = []
+            for _ in range(5):
+                started = time.perf_counter()
+                with app.app_context():
+                    body = provider.response(payload).get_data()
+                timings.append(time.perf_counter() - started)
+            line += f'{min(timings) * 1000:>12.1f}'
+        line += f'{len(body) / 1024:>10.0f}{len(gzip.compress(body, compresslevel=5)) / 1024:>10.0f}'
+        line += f'{len(brotli.compress(body, quality=4)) / 1024:>10.0f}' if brotli else f'{"—":>10}'
+        print(line)
+
+
+SEARCH_QUERIES = ['котл', 'суп кур', 'каша', 'ч', 'домашний сыр', 'компот ягод']
+
+
+def bench_search(database, rounds=2000):
+    import search
+    from db import connect
+
+    conn = connect(database)
+    index = search.DishIndex()
+    started = time.perf_counter()
+    index.ensure_loaded(conn)
+    print(f'индекс {len(index)} блюд построен за {(time.perf_counter() - started) * 1000:.1f} мс')
+    conn.close()
+
+    excluded = search.normalize_allergens('молоко, орехи')
+    for query in SEARCH_QUERIES:
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            found = index.search(query, exclude_allergens=excluded)
+            timings.append(time.perf_counter() - started)
+        print(f'{query!r:<20}{len(found):>6} блюд  p50 {percentile(timings, 50) * 1000:.3f} мс  '
+              f'p99 {percentile(timings, 99) * 1000:.3f} мс')
+
+
+def bench_auth(database, rounds=20000, seed=1):
+    import auth
+    from db import connect
+
+    conn = connect(database)
+    users = [dict(row) for row in conn.execute('SELECT id, username, role FROM users LIMIT 1000')]
+    secret = 'benchmark-secret'
+    tokens = [auth.issue_token(user, secret, 3600) for user in users]
+    rng = random.Random(seed)
+    picks = [rng.randrange(len(users)) for _ in range(rounds)]
+
+    warm = auth.UserCache(max_size=len(users), ttl=3600)
+    shared = auth.UserCache(max_size=len(users), ttl=3600)
+    shared.share_between_processes()
+    for cache in (warm, shared):
+        for user in users:
+            cache.put(user['id'], user, cache.generation(user['id']))
+    # В кэш на одну запись пользователи по кругу не попадают никогда
+    cold = auth.UserCache(max_size=1, ttl=3600)
+
+    def cache_miss(user):
+        if cold.get(user['id']) is None:
+            generation = cold.generation(user['id'])
+            row = conn.execute('SELECT * FROM users WHERE id = ?', (user['id'],)).fetchone()
+            cold.put(user['id'], dict(row), generation)
+
+    paths = [
+        ('SELECT по username (старый)',
+         lambda i: conn.execute('SELECT * FROM users WHERE username = ?', (users[i]['username'],)).fetchone()),
+        ('verify_token', lambda i: auth.verify_token(tokens[i], secret)),
+        ('UserCache попадание', lambda i: warm.get(users[i]['id'])),
+        ('UserCache попадание (общая)', lambda i: shared.get(users[i]['id'])),
+        ('UserCache промах + SELECT', lambda i: cache_miss(users[i])),
+    ]
+    print(f'{len(users)} пользователей, {rounds} обращений на путь')
+    for name, run in paths:
+        timings = []
+        for i in picks:
+            started = time.perf_counter()
+            run(i)
+            timings.append(time.perf_counter() - started)
+        print(f'{name:<30}p50 {percentile(timings, 50) * 1e6:>7.1f} мкс  p99 {percentile(timings, 99) * 1e6:>7.1f} мкс  '
+              f'среднее {sum(timings) / len(timings) * 1e6:>7.1f} мкс')
+    conn.close()
+
+
+def bench_forecast(database):
+    from datetime import date
+
+    import forecast
+    from db import connect
+
+    if not forecast.available():
+        print('Для прогноза нужен numpy: pip install numpy')
+        return
+
+    conn = connect(database)
+    start = forecast.history_start(date.today(), forecast.HISTORY_WEEKS)
+    started = time.perf_counter()
+    counts, dish_ids, meal_types = forecast.load_counts(conn.cursor(), start, forecast.HISTORY_WEEKS)
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    forecast.rolling_stats(counts, forecast.WINDOW_WEEKS)
+    computed = time.perf_counter() - started
+    print(f'{int(counts.sum())} заказов, {len(dish_ids)} блюд, {forecast.HISTORY_WEEKS} недель: '
+          f'SQL {loaded * 1000:.0f} мс, NumPy {computed * 1000:.1f} мс')
+
+    for attempt in ('первый', 'из кэша'):
+        started = time.perf_counter()
+        rows = forecast.plan(conn)
+        print(f'plan() {attempt:<10}{(time.perf_counter() - started) * 1000:>8.1f} мс, '
+              f'к закупке {sum(1 for row in rows if row["need"])} блюд')
+    conn.close()
+
+
+def bench_settle(database, count, seed=1):
+    import shutil
+    import tempfile
+    from datetime import date
+
+    import migrations
+    import preorders
+    import reservations
+    from db import connect
+
+    copy = os.path.join(tempfile.mkdtemp(), 'settle.db')
+    shutil.copy(database, copy)
+    conn = connect(copy)
+    migrations.migrate(conn)
+    # Запаса и денег хватает почти всем: замеряется основной путь, а не отказы
+    conn.execute('UPDATE dishes SET quantity = quantity + ?, is_available = 1', (count,))
+    conn.execute('UPDATE users SET balance = balance + 100000 WHERE role = 0')
+    ctx = load_context(copy)
+    rng = random.Random(seed)
+    today = date.today().isoformat()
+    conn.executemany('''
+                     INSERT INTO preorders (user_id, dish_id, service_date, meal_type, payment_type)
+                     VALUES (?, ?, ?, 'обед', 'разовый')
+                     ''', [(rng.choice(ctx['students']), rng.choice(ctx['dishes']), today) for _ in range(count)])
+    conn.commit()
+
+    started = time.perf_counter()
+    settled, rejected, _ = preorders.settle(conn)
+    elapsed = time.perf_counter() - started
+    print(f'settle: {settled} оформлено, {rejected} отклонено за {elapsed:.2f} с '
+          f'({(settled + rejected) / elapsed:.0f} в секунду)')
+
+    sample = min(count, 5000)
+    started = time.perf_counter()
+    for _ in range(sample):
+        reservations.place_orders(conn, rng.choice(ctx['students']), {rng.choice(ctx['dishes']): 1},
+                                  'обед', 'разовый')
+    elapsed = time.perf_counter() - started
+    print(f'place_orders по одному: {sample} заказов за {elapsed:.2f} с ({sample / elapsed:.0f} в секунду)')
+    conn.close()
+    shutil.rmtree(os.path.dirname(copy))
+
+
+def bench_bulk(database, count, tray, seed=1):
+    import shutil
+    import tempfile
+
+    import migrations
+    from db import connect
+
+    copy = os.path.join(tempfile.mkdtemp(), 'bulk.db')
+    shutil.copy(database, copy)
+    conn = connect(copy)
+    migrations.migrate(conn)
+    ctx = load_context(copy)
+    prices = dict(conn.execute('SELECT id, price FROM dishes').fetchall())
+    rng = random.Random(seed)
+    # Ожидающие заказы на четыре прогона: выдача и отмена, по одному и подносами
+    dish_ids = [rng.choice(ctx['dishes']) for _ in range(count * 4)]
+    conn.executemany('''
+                     INSERT INTO orders (user_id, dish_id, dish_name, price, meal_type, payment_type, status)
+                     VALUES (?, ?, 'Блюдо', ?, 'обед', 'разовый', 'pending')
+                     ''', [(rng.choice(ctx['students']), dish_id, prices[dish_id]) for dish_id in dish_ids])
+    conn.commit()
+    order_ids = [row[0] for row in conn.execute('SELECT id FROM orders ORDER BY id DESC LIMIT ?', (count * 4,))]
+    conn.close()
+
+    os.environ['CAFE_DATABASE'] = copy
+    os.environ['CAFE_LOG_LEVEL'] = 'off'
+    import working_server
+    from auth import issue_token
+
+    app = working_server.app
+    client = app.test_client()
+    token = issue_token({'id': ctx['cooks'][0], 'username': 'bench', 'role': 1}, app.config['SECRET_KEY'], 3600)
+    headers = {'Authorization': 'Bearer ' + token}
+
+    def single(action, ids):
+        return [client.post(f'/api/orders/{order_id}/{action}', headers=headers) for order_id in ids]
+
+    def bulk(action, ids):
+        return [client.post(f'/api/orders/{action}', json={'order_ids': ids[i:i + tray]}, headers=headers)
+                for i in range(0, len(ids), tray)]
+
+    runs = [('serve', 'по одному', single), ('serve', f'подносами по {tray}', bulk),
+            ('cancel', 'по одному', single), ('cancel', f'подносами по {tray}', bulk)]
+    for number, (action, name, run) in enumerate(runs):
+        ids = order_ids[number * count:(number + 1) * count]
+        started = time.perf_counter()
+        responses = run(action, ids)
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for response in responses if response.status_code != 200)
+        print(f'{action:<8}{name:<20}{count} заказов, {len(responses):>5} запросов за {elapsed:.2f} с '
+              f'({count / elapsed:.0f} заказов/с){f", ошибок {failed}" if failed else ""}')
+    working_server.pool.close_all()
+    shutil.rmtree(os.path.dirname(copy))
+
+
+def bench_workers(database, workers, requests, threads, seed=1):
+    """GET /api/menu и POST /api/orders по HTTP к gunicorn с CAFE_WORKERS из workers"""
+    import http.client
+    import secrets
+    import shutil
+    import socket
+    import subprocess
+    import tempfile
+    import urllib.request
+
+    import ledger
+    import migrations
+    from auth import issue_token
+    from db import connect
+
+    ctx = load_context(database)
+    secret = secrets.token_hex(32)
+    tokens = [issue_token({'id': user_id, 'username': f'bench{user_id}', 'role': 0}, secret, 3600)
+              for user_id in ctx['students']]
+    per_thread = max(requests // threads, 1)
+    routes = [('GET /api/menu', 'GET', lambda rng: '/api/menu', lambda rng: None),
+              ('POST /api/orders', 'POST', lambda rng: '/api/orders',
+               lambda rng: json.dumps({'dish_id': rng.choice(ctx['dishes'])}))]
+
+    def prepare_copy():
+        # Заказы списывают баланс и остатки: на каждое число воркеров — своя копия с запасом
+        copy = os.path.join(tempfile.mkdtemp(), 'workers.db')
+        shutil.copy(database, copy)
+        conn = connect(copy)
+        migrations.migrate(conn)
+        cursor = conn.cursor()
+        price = conn.execute('SELECT MAX(price) FROM dishes').fetchone()[0]
+        amount = (per_thread * threads // len(ctx['students']) + 1) * price
+        for user_id in ctx['students']:
+            ledger.record(cursor, user_id, amount, 'topup', 'Пополнение для нагрузочного прогона')
+        cursor.executemany('UPDATE users SET balance = balance + ? WHERE id = ?',
+                           [(amount, user_id) for user_id in ctx['students']])
+        cursor.execute('UPDATE dishes SET quantity = quantity + ? WHERE is_available = 1', (per_thread * threads,))
+        conn.commit()
+        conn.close()
+        return copy
+
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def drive(port, route):
+        name, method, path, body = route
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(seed + index)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            local = []
+            local_statuses = {}
+            for _ in range(per_thread):
+                headers = {'Authorization': 'Bearer ' + rng.choice(tokens), 'Content-Type': 'application/json'}
+                started = time.perf_counter()
+                conn.request(method, path(rng), body=body(rng), headers=headers)
+                response = conn.getresponse()
+                response.read()
+                local.append(time.perf_counter() - started)
+                local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+            conn.close()
+            with lock:
+                latencies.extend(local)
+                for code, count in local_statuses.items():
+                    statuses[code] = statuses.get(code, 0) + count
+
+        started = time.perf_counter()
+        clients = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {'rps': round(len(latencies) / elapsed, 1),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'statuses': {str(code): count for code, count in sorted(statuses.items())}}
+
+    print(f'{os.cpu_count()} CPU, {threads} клиентских потоков, {per_thread * threads} запросов на маршрут')
+    print(f'{"воркеров":<10}{"маршрут":<20}{"rps":>10}{"x":>7}{"p50 мс":>10}{"p95 мс":>10}  статусы')
+    first = {}
+    for count in workers:
+        copy = prepare_copy()
+        port = free_port()
+        env = dict(os.environ, CAFE_WORKERS=str(count), CAFE_BIND=f'127.0.0.1:{port}', CAFE_DATABASE=copy,
+                   SECRET_KEY=secret, CAFE_LOG_LEVEL='off')
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1).read()
+                    break
+                except OSError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError(f'gunicorn с {count} воркерами не запустился')
+                    time.sleep(0.2)
+            for route in routes:
+                result = drive(port, route)
+                first.setdefault(route[0], result['rps'])
+                print(f'{count:<10}{route[0]:<20}{result["rps"]:>10}{result["rps"] / first[route[0]]:>7.2f}'
+                      f'{result["p50_ms"]:>10}{result["p95_ms"]:>10}  {result["statuses"]}')
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            shutil.rmtree(os.path.dirname(copy))
+
+
+def bench_statement(database, years, per_day=20, seed=1):
+    import shutil
+    import tempfile
+    from datetime import date, timedelta
+
+    import ledger
+    import migrations
+    from db import connect
+
+    copy = os.path.join(tempfile.mkdtemp(), 'statement.db')
+    shutil.copy(database, copy)
+    conn = connect(copy)
+    migrations.migrate(conn)
+    cursor = conn.cursor()
+    user_id = load_context(copy)['students'][0]
+    rng = random.Random(seed)
+
+    # История по учебным дням; снимки — еженедельным запуском ledger.py snapshot
+    day = date.today() - timedelta(days=365 * years)
+    rows = 0
+    while day < date.today():
+        if day.weekday() < 5:
+            entries = [(user_id, -float(rng.randrange(40, 250, 10)), 'payment', 'Заказ',
+                        f'{day} {8 + i % 8:02d}:{i:02d}:00') for i in range(per_day)]
+            entries.append((user_id, 3000.0, 'topup', 'Пополнение баланса', f'{day} 18:00:00'))
+            cursor.executemany('''
+                               INSERT INTO transactions (user_id, amount, type, description, created_at)
+                               VALUES (?, ?, ?, ?, ?)
+                               ''', entries)
+            rows += len(entries)
+        if day.weekday() == 6:
+            ledger.take_snapshots(cursor)
+        day += timedelta(days=1)
+    conn.commit()
+
+    date_to = date.today() - timedelta(days=1)
+    date_from = (date_to.replace(day=1)).isoformat()
+    print(f'{rows} строк журнала у ученика {user_id}, выписка с {date_from} по {date_to}')
+
+    def full_history():
+        cursor.execute('SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE user_id = ? AND created_at < ?',
+                       (user_id, date_from))
+        opening = cursor.fetchone()[0]
+        cursor.execute('''
+                       SELECT id, amount, type, description, order_id, created_at FROM transactions
+                       WHERE user_id = ? AND created_at >= ? AND created_at <= ?
+                       ORDER BY created_at, id
+                       ''', (user_id, date_from, f'{date_to} 23:59:59.999'))
+        return opening, cursor.fetchall()
+
+    for name, build in (('сумма всей истории', full_history),
+                        ('снимок + хвост', lambda: ledger.statement(cursor, user_id, date_from, date_to.isoformat()))):
+        timings = []
+        for _ in range(50):
+            started = time.perf_counter()
+            build()
+            timings.append(time.perf_counter() - started)
+        print(f'{name:<24}p50 {percentile(timings, 50) * 1000:.2f} мс  p95 {percentile(timings, 95) * 1000:.2f} мс')
+    conn.close()
+    shutil.rmtree(os.path.dirname(copy))
+
+
+# Маршруты, которые расходуют записи: (пул, записей на запрос; None — поднос)
+CONSUMERS = {
+    'order_serve': ('orders', 1),
+    'order_cancel': ('orders', 1),
+    'orders_serve_bulk': ('orders', None),
+    'orders_cancel_bulk': ('orders', None),
+    'dish_delete': ('dishes', 1),
+    'purchase_approve': ('purchases', 1),
+    'purchase_reject': ('purchases', 1),
+    'purchase_confirm': ('drafts', 1),
+}
+
+
+def prepare_pools(database, names, total, tray, seed=1):
+    """Ожидающие заказы, блюда на удаление, заявки и черновики для маршрутов
+    из CONSUMERS: готовятся до прогона, чтобы замерялся сам маршрут."""
+    from collections import Counter
+
+    import ledger
+    import reservations
+    from db import connect
+
+    need = {}
+    for name in names:
+        if name in CONSUMERS:
+            pool, per_request = CONSUMERS[name]
+            need[pool] = need.get(pool, 0) + total * (per_request or tray)
+    if 'dish_toggle' in names:
+        # Доступность переключается у скрытых блюд прогона, а не у настоящего меню
+        need['scratch'] = 10
+
+    conn = connect(database)
+    cursor = conn.cursor()
+    ctx = load_context(database)
+    rng = random.Random(seed)
+    pools = {pool: [] for pool, _ in CONSUMERS.values()}
+    pools['scratch'] = []
+
+    if need.get('orders'):
+        # Заказы оформляются как обычно, через place_orders: после отмены
+        # возвраты сходятся с журналом операций
+        count = need['orders']
+        students = ctx['students'][:100]
+        dishes = ctx['dishes']
+        price = conn.execute('SELECT MAX(price) FROM dishes').fetchone()[0]
+        amount = (count // len(students) + 1) * price
+        for user_id in students:
+            ledger.record(cursor, user_id, amount, 'topup', 'Пополнение для нагрузочного прогона')
+        cursor.executemany('UPDATE users SET balance = balance + ? WHERE id = ?',
+                           [(amount, user_id) for user_id in students])
+        cursor.execute(f'UPDATE dishes SET quantity = quantity + ? WHERE id IN ({", ".join("?" * len(dishes))})',
+                       [count] + dishes)
+        conn.commit()
+        for number, offset in enumerate(range(0, count, 50)):
+            quantities = Counter(rng.choice(dishes) for _ in range(min(50, count - offset)))
+            order_ids, _ = reservations.place_orders(conn, students[number % len(students)], dict(quantities),
+                                                     'обед', 'разовый')
+            pools['orders'].extend(order_ids)
+
+    for pool in ('dishes', 'scratch'):
+        for _ in range(need.get(pool, 0)):
+            cursor.execute('''
+                           INSERT INTO dishes (name, category, price, quantity, is_available)
+                           VALUES (?, 'прогон', 100, 0, 0)
+                           ''', (f'Прогон {os.urandom(8).hex()}',))
+            pools[pool].append(cursor.lastrowid)
+
+    for pool, status in (('purchases', 'pending'), ('drafts', 'draft')):
+        for _ in range(need.get(pool, 0)):
+            cursor.execute('''
+                           INSERT INTO purchase_requests (created_by, dish_name, quantity, reason, status)
+                           VALUES (?, 'Прогон', 1, 'нагрузочный прогон', ?)
+                           ''', (ctx['cooks'][0], status))
+            pools[pool].append(cursor.lastrowid)
+    conn.commit()
+    conn.close()
+    return pools
+
+
+def build_routes(ctx, writes, pools=None, tray=30):
+    """(имя, роль, метод, путь, тело) — путь и тело могут быть функциями от rng.
+
+    Маршруты из CONSUMERS берут id из pools (prepare_pools); когда пул
+    исчерпан, запрос уходит с id 0 и получает 404 или 400.
+    """
+    pools = {} if pools is None else pools
+    lock = threading.Lock()
+
+    def take(pool, count=1):
+        with lock:
+            ids = pools.get(pool, [])[:count]
+            del pools.get(pool, [])[:count]
+        return ids
+
+    def take_one(pool):
+        ids = take(pool)
+        return ids[0] if ids else 0
+
+    month_ago = time.strftime('%Y-%m-%d', time.localtime(time.time() - 30 * 86400))
+    routes = [
+        ('health', None, 'GET', '/api/health', None),
+        ('menu', None, 'GET', '/api/menu', None),
+        ('menu_category', None, 'GET', lambda rng: f'/api/menu?category={rng.choice(ctx["categories"])}', None),
+        ('menu_search', None, 'GET', lambda rng: f'/api/menu/search?q={rng.choice(SEARCH_QUERIES)}&exclude=молоко', None),
+        ('dish_reviews', None, 'GET', lambda rng: f'/api/dishes/{rng.choice(ctx["dishes"])}/reviews?limit=20', None),
+        ('profile', 0, 'GET', '/api/user/profile', None),
+        ('orders_my_student', 0, 'GET', '/api/orders/my', None),
+        ('orders_my_cook', 1, 'GET', '/api/orders/my', None),
+        ('orders_my_admin_page', 2, 'GET', '/api/orders/my?limit=50', None),
+        ('orders_my_admin', 2, 'GET', '/api/orders/my', None),
+        ('dishes_admin', 2, 'GET', '/api/dishes', None),
+        ('purchases_admin_page', 2, 'GET', '/api/purchases?limit=50', None),
+        ('purchases_cook', 1, 'GET', '/api/purchases', None),
+        ('purchases_forecast', 1, 'GET', '/api/purchases/forecast', None),
+        ('reports_summary', 2, 'GET', '/api/reports/summary', None),
+        ('reports_detailed', 2, 'GET', '/api/reports/detailed', None),
+        ('reports_detailed_orders', 2, 'GET', '/api/reports/detailed?section=orders&limit=100', None),
+        ('reports_detailed_users', 2, 'GET', '/api/reports/detailed?section=users&limit=100', None),
+        ('reports_detailed_dishes', 2, 'GET', '/api/reports/detailed?section=dishes&limit=100', None),
+        ('reports_export_csv', 2, 'GET', f'/api/reports/export?format=csv&date_from={month_ago}', None),
+        ('reports_export_ndjson_gzip', 2, 'GET',
+         f'/api/reports/export?format=ndjson&date_from={month_ago}&compress=gzip', None),
+    ]
+    if ctx['logins']:
+        # Стоимость scrypt задаётся CAFE_SCRYPT_N; первый вход после её смены пересчитывает хэш
+        routes.append(('login', None, 'POST', '/api/auth/login',
+                       lambda rng: {'username': rng.choice(ctx['logins']), 'password': 'password123'}))
+    if writes:
+        routes += [
+            ('order_create', 0, 'POST', '/api/orders', lambda rng: {'dish_id': rng.choice(ctx['dishes'])}),
+            ('order_create_subscription', 'sub', 'POST', '/api/orders',
+             lambda rng: {'dish_id': rng.choice(ctx['dishes']), 'payment_type': 'абонемент'}),
+            ('order_batch', 0, 'POST', '/api/orders/batch',
+             lambda rng: {'items': [{'dish_id': d} for d in rng.sample(ctx['dishes'], 3)]}),
+            ('balance_topup', 0, 'POST', '/api/balance/topup', lambda rng: {'amount': 100}),
+            ('review_submit', 0, 'POST', lambda rng: f'/api/dishes/{rng.choice(ctx["dishes"])}/reviews',
+             lambda rng: {'rating': rng.randint(1, 5)}),
+            ('order_serve', 1, 'POST', lambda rng: f'/api/orders/{take_one("orders")}/serve', None),
+            ('order_cancel', 1, 'POST', lambda rng: f'/api/orders/{take_one("orders")}/cancel', None),
+            ('orders_serve_bulk', 1, 'POST', '/api/orders/serve', lambda rng: {'order_ids': take('orders', tray)}),
+            ('orders_cancel_bulk', 1, 'POST', '/api/orders/cancel', lambda rng: {'order_ids': take('orders', tray)}),
+            ('dish_create', 2, 'POST', '/api/dishes',
+             lambda rng: {'name': f'Прогон {os.urandom(8).hex()}', 'category': 'прогон', 'price': 100}),
+            ('dish_update', 2, 'PUT', lambda rng: f'/api/dishes/{rng.choice(ctx["dishes"])}',
+             lambda rng: {'description': f'Обновлено {rng.randint(1, 10 ** 6)}'}),
+            ('dish_toggle', 2, 'POST', lambda rng: f'/api/dishes/{rng.choice(pools.get("scratch") or [0])}/toggle', None),
+            ('dish_delete', 2, 'DELETE', lambda rng: f'/api/dishes/{take_one("dishes")}', None),
+            ('purchase_create', 1, 'POST', '/api/purchases',
+             lambda rng: {'dish_name': 'Прогон', 'quantity': rng.randint(1, 20), 'reason': 'нагрузочный прогон'}),
+            ('purchase_approve', 2, 'POST', lambda rng: f'/api/purchases/{take_one("purchases")}/approve', None),
+            ('purchase_reject', 2, 'POST', lambda rng: f'/api/purchases/{take_one("purchases")}/reject', None),
+            # Подтверждение раньше пересчёта: POST /api/purchases/forecast заменяет все черновики
+            ('purchase_confirm', 1, 'POST', lambda rng: f'/api/purchases/{take_one("drafts")}/confirm', None),
+            ('purchases_forecast_draft', 1, 'POST', '/api/purchases/forecast', lambda rng: {'days': 7}),
+        ]
+    return routes
+
+
+def run_route(app, tokens, route, requests, threads, seed, accept_encoding=None):
+    name, role, method, path, body = route
+    latencies = []
+    sizes = []
+    queries = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = max(requests // threads, 1)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = app.test_client()
+        local = []
+        local_statuses = {}
+        local_sizes = []
+        local_queries = []
+        for _ in range(per_thread):
+            headers = {}
+            if accept_encoding:
+                headers['Accept-Encoding'] = accept_encoding
+            if role is not None:
+                headers['Authorization'] = 'Bearer ' + rng.choice(tokens[role])
+            url = path(rng) if callable(path) else path
+            payload = body(rng) if callable(body) else body
+            _request_queries.count = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, json=payload, headers=headers)
+            local_sizes.append(len(response.get_data()))
+            local.append(time.perf_counter() - started)
+            local_queries.append(_request_queries.count)
+            local_statuses[response.status_code] = local_statuses.get(response.status_code, 0) + 1
+        with lock:
+            latencies.extend(local)
+            sizes.extend(local_sizes)
+            queries.extend(local_queries)
+            for code, count in local_statuses.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'avg_kb': round(sum(sizes) / len(sizes) / 1024, 1),
+        'max_queries': max(queries),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон API')
+    parser.add_argument('--database', default='bench.db')
+    parser.add_argument('--requests', type=int, default=500, help='запросов на маршрут')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--only', help='имена маршрутов через запятую')
+    parser.add_argument('--writes', action='store_true', help='включить маршруты, меняющие данные')
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='сравнить с сохранённым эталоном')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='допустимый рост p95, %%')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--serialize', type=int, metavar='N',
+                        help='только сравнить сериализацию N строк заказов')
+    parser.add_argument('--statement', type=int, metavar='YEARS',
+                        help='только замерить выписку ученика с историей за YEARS лет')
+    parser.add_argument('--settle', type=int, metavar='N', help='только замерить расчёт N предзаказов')
+    parser.add_argument('--bulk', type=int, metavar='N',
+                        help='только сравнить выдачу и отмену N заказов по одному и подносами')
+    parser.add_argument('--tray', type=int, default=30, help='заказов в подносе для --bulk и маршрутов *_bulk')
+    parser.add_argument('--auth', action='store_true', help='только замерить цену аутентификации на запрос')
+    parser.add_argument('--search', action='store_true', help='только замерить поиск по меню')
+    parser.add_argument('--forecast', action='store_true', help='только замерить прогноз спроса')
+    parser.add_argument('--encoding', action='store_true',
+                        help='только сравнить кодирование JSON и сжатие больших ответов')
+    parser.add_argument('--accept-encoding', help='заголовок Accept-Encoding для запросов (gzip, br)')
+    parser.add_argument('--no-pool', action='store_true',
+                        help='соединение на каждый запрос вместо пула (как до db.ConnectionPool)')
+    parser.add_argument('--workers', metavar='N,N,...',
+                        help='только замерить масштабирование gunicorn по числу воркеров (через HTTP)')
+    parser.add_argument('--log-level', default='off', help='уровень журнала сервера (off, debug, info, ...)')
+    args = parser.parse_args()
+
+    if args.statement:
+        bench_statement(args.database, args.statement, seed=args.seed)
+        return
+
+    if args.settle:
+        bench_settle(args.database, args.settle, args.seed)
+        return
+
+    if args.bulk:
+        bench_bulk(args.database, args.bulk, args.tray, args.seed)
+        return
+
+    if args.workers:
+        bench_workers(args.database, [int(count) for count in args.workers.split(',')], args.requests,
+                      args.threads, args.seed)
+        return
+
+    if args.auth:
+        bench_auth(args.database, seed=args.seed)
+        return
+
+    if args.search:
+        bench_search(args.database)
+        return
+
+    if args.forecast:
+        bench_forecast(args.database)
+        return
+
+    if args.serialize:
+        bench_serializer(args.database, args.serialize)
+        return
+
+    os.environ['CAFE_DATABASE'] = args.database
+    os.environ.setdefault('CAFE_DB_POOL_SIZE', str(args.threads))
+    os.environ['CAFE_LOG_LEVEL'] = args.log_level
+    import db
+    import working_server
+    from auth import issue_token
+
+    db.set_query_observer(counting_observer(working_server.metrics.observe_query))
+    if args.no_pool:
+        working_server.pool.close_all()
+        working_server.pool = PerRequestConnections(args.database)
+    app = working_server.app
+    ctx = load_context(args.database)
+    secret = app.config['SECRET_KEY']
+    # 'sub' — ученики с действующим абонементом
+    tokens = {
+        key: [issue_token({'id': user_id, 'username': f'bench{user_id}', 'role': role}, secret, 3600)
+              for user_id in ids]
+        for key, role, ids in ((0, 0, ctx['students']), (1, 1, ctx['cooks']), (2, 2, ctx['admins']),
+                               ('sub', 0, ctx['subscribers']))
+    }
+
+    if args.encoding:
+        bench_encoding(app, tokens)
+        return
+
+    pools = {}
+    routes = build_routes(ctx, args.writes, pools, args.tray)
+    if args.only:
+        wanted = set(args.only.split(','))
+        routes = [route for route in routes if route[0] in wanted]
+    if args.writes:
+        total = max(args.requests // args.threads, 1) * args.threads
+        pools.update(prepare_pools(args.database, [route[0] for route in routes], total, args.tray, args.seed))
+
+    results = {}
+    print(f'{"маршрут":<28}{"rps":>10}{"p50 мс":>10}{"p95 мс":>10}{"p99 мс":>10}{"КБ":>10}{"SQL":>6}  статусы')
+    for route in routes:
+        if route[1] is not None and not tokens[route[1]]:
+            continue
+        result = run_route(app, tokens, route, args.requests, args.threads, args.seed,
+                           args.accept_encoding)
+        results[route[0]] = result
+        print(f'{route[0]:<28}{result["rps"]:>10}{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+              f'{result["p99_ms"]:>10}{result["avg_kb"]:>10}{result["max_queries"]:>6}  {result["statuses"]}')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'database': args.database, 'threads': args.threads, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = []
+        for name, result in results.items():
+            if name in baseline:
+                before = baseline[name]['p95_ms']
+                change = (result['p95_ms'] - before) / before * 100 if before else 0.0
+                marker = '  ⚠️ регрессия' if change > args.tolerance else ''
+                # Число запросов не зависит от шума замера: любой рост — регрессия
+                queries_before = baseline[name].get('max_queries')
+                if queries_before is not None and result['max_queries'] > queries_before:
+                    marker += f'  ⚠️ SQL-запросов {queries_before} → {result["max_queries"]}'
+                print(f'{name:<28}p95 {before} → {result["p95_ms"]} мс ({change:+.1f}%){marker}')
+                if marker:
+                    regressions.append(name)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
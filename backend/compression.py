@@ -0,0 +1,72 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = ('application/json', 'text/plain', 'text/csv')
+
+
+class Compressor:
+    """Сжатие больших ответов gzip или brotli по Accept-Encoding клиента.
+
+    Потоковые ответы (экспорт, SSE) и ответы, уже имеющие Content-Encoding,
+    не трогаются: меню сжимает обработчик и кэширует сжатое тело. Маленькие тела отдаются как есть: на них сжатие стоит
+    дороже, чем экономит.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=5, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def choose_encoding(self, accept_encoding):
+        if brotli is not None and accept_encoding['br']:
+            return 'br'
+        if accept_encoding['gzip']:
+            return 'gzip'
+        return None
+
+    def encoding_for(self, body):
+        """Кодировка для тела ответа на текущий запрос или None"""
+        if len(body) < self.min_size:
+            return None
+        return self.choose_encoding(request.accept_encodings)
+
+    def encode(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def apply(self, response, encoded, encoding):
+        """Подменяет тело ответа сжатым в кодировке encoding"""
+        response.vary.add('Accept-Encoding')
+        response.set_data(encoded)
+        response.headers['Content-Encoding'] = encoding
+
+        # Сжатое тело побайтно отличается от исходного: ETag становится слабым
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def compress(self, response):
+        if (response.status_code < 200 or response.status_code >= 300
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = self.encoding_for(body)
+        if encoding is None:
+            return response
+        return self.apply(response, self.encode(body, encoding), encoding)
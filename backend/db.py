@@ -0,0 +1,153 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+# Настройки соединения применяются один раз при открытии и живут,
+# пока соединение лежит в пуле.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+# observer(sql, params, seconds) вызывается после каждого запроса; см. set_query_observer
+_query_observer = None
+
+
+def set_query_observer(observer):
+    global _query_observer
+    _query_observer = observer
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, сообщающий наблюдателю время выполнения каждого запроса"""
+
+    def execute(self, sql, parameters=()):
+        observer = _query_observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        observer = _query_observer
+        if observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer(sql, None, time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute создаёт курсор в обход cursor(), поэтому переопределяем и его
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(database):
+    """Открытие соединения с WAL-журналом и настроенным кэшем"""
+    # Кэш подготовленных выражений с запасом на все запросы из queries.STATEMENTS
+    conn = sqlite3.connect(database, timeout=5.0, check_same_thread=False,
+                           factory=InstrumentedConnection, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений SQLite.
+
+    Соединения открываются лениво, не больше max_size штук, и
+    переиспользуются между запросами. Если все соединения заняты,
+    acquire() ждёт освобождения не дольше timeout секунд.
+    """
+
+    def __init__(self, database, max_size=8, timeout=10.0):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.max_size:
+                self._opened += 1
+                try:
+                    return connect(self.database)
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError('Пул соединений исчерпан')
+
+    def release(self, conn):
+        # Незавершённая транзакция (ранний return без commit) не должна
+        # достаться следующему запросу.
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def _check_fork(self):
+        # Соединения SQLite нельзя использовать в дочернем процессе:
+        # после fork пул начинает с чистого листа.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Унаследованные соединения не закрываем: close() в дочернем
+                    # процессе может испортить блокировки родителя
+                    self._inherited = self._idle
+                    self._idle = queue.LifoQueue()
+                    self._opened = 0
+                    self._pid = os.getpid()
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from db import connect
+
+
+logger = logging.getLogger('cafe.events')
+
+
+# События заказов пишутся в order_events в той же транзакции, что и сам
+# заказ. Один поток на процесс читает новые строки и раздаёт их всем
+# подписчикам (экранам кухни), поэтому нагрузка на базу не зависит от
+# числа подключённых терминалов, а события из других воркеров тоже видны.
+
+EVENTS_QUERY = '''
+               SELECT e.id as event_id, e.type as event_type,
+                      o.*, u.full_name as user_name, u.class_name
+               FROM order_events e
+                        JOIN orders o ON e.order_id = o.id
+                        JOIN users u ON o.user_id = u.id
+               WHERE e.id > ?
+               ORDER BY e.id
+               LIMIT 500
+               '''
+
+
+def create_table(cursor):
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS order_events (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       type TEXT NOT NULL,
+                       order_id INTEGER NOT NULL,
+                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                   )
+                   ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_events_created ON order_events (created_at)')
+
+
+def record(cursor, event_type, order_ids):
+    """Событие created / served / cancelled для каждого заказа"""
+    cursor.executemany('INSERT INTO order_events (type, order_id) VALUES (?, ?)',
+                       [(event_type, order_id) for order_id in order_ids])
+
+
+def fetch_since(conn, last_id):
+    events = []
+    for row in conn.execute(EVENTS_QUERY, (last_id,)):
+        order = dict(row)
+        event_id = order.pop('event_id')
+        event_type = order.pop('event_type')
+        events.append((event_id, event_type, order))
+    return events
+
+
+def format_sse(event_id, event_type, order):
+    data = json.dumps(order, ensure_ascii=False)
+    return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+
+
+class OrderEventBus:
+    """Раздача событий заказов подписчикам внутри процесса"""
+
+    def __init__(self, database, interval=0.05, queue_size=1000, retention_hours=24):
+        self.database = database
+        self.interval = interval
+        self.queue_size = queue_size
+        self.retention_hours = retention_hours
+        self._subscribers = set()
+        self._lock = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self):
+        q = queue.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+            self._ensure_thread()
+            self._lock.notify()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _ensure_thread(self):
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='order-events', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        conn = connect(self.database)
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+        last_cleanup = 0.0
+
+        while True:
+            with self._lock:
+                # Пока никто не подписан, базу не опрашиваем
+                while not self._subscribers:
+                    self._lock.wait()
+                    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+
+            try:
+                events = fetch_since(conn, last_id)
+                if events:
+                    last_id = events[-1][0]
+                    self._dispatch(events)
+
+                if time.monotonic() - last_cleanup > 3600:
+                    conn.execute("DELETE FROM order_events WHERE created_at < datetime('now', ?)",
+                                 (f'-{self.retention_hours} hours',))
+                    conn.commit()
+                    last_cleanup = time.monotonic()
+            except Exception as e:
+                logger.exception("Ошибка чтения событий заказов")
+
+            time.sleep(self.interval)
+
+    def _dispatch(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            for event in events:
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    # Отстающий клиент отключается и переподключится с Last-Event-ID
+                    self.unsubscribe(q)
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    q.put_nowait(None)
+                    break
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+
+ORDER_COLUMNS = (
+    'id', 'order_date', 'served_at', 'status', 'meal_type', 'payment_type',
+    'dish_id', 'dish_name', 'category', 'price',
+    'user_id', 'username', 'full_name', 'class_name',
+)
+
+ORDERS_QUERY = '''
+               SELECT o.id, o.order_date, o.served_at, o.status, o.meal_type, o.payment_type,
+                      o.dish_id, o.dish_name, d.category, o.price,
+                      u.id, u.username, u.full_name, u.class_name
+               FROM orders o
+                        JOIN users u ON o.user_id = u.id
+                        LEFT JOIN dishes d ON o.dish_id = d.id
+               '''
+
+BATCH_SIZE = 1000
+
+
+def parse_filters(args):
+    """Фильтры выгрузки из query-параметров; неверная дата даёт ValueError"""
+    filters = {}
+    for key in ('date_from', 'date_to'):
+        if args.get(key):
+            filters[key] = datetime.strptime(args[key], '%Y-%m-%d').strftime('%Y-%m-%d')
+    if args.get('class_name'):
+        filters['class_name'] = args['class_name']
+    return filters
+
+
+def build_orders_query(filters):
+    conditions = []
+    params = []
+    if 'date_from' in filters:
+        conditions.append('o.order_date >= ?')
+        params.append(filters['date_from'])
+    if 'date_to' in filters:
+        conditions.append("o.order_date < DATE(?, '+1 day')")
+        params.append(filters['date_to'])
+    if 'class_name' in filters:
+        conditions.append('u.class_name = ?')
+        params.append(filters['class_name'])
+
+    query = ORDERS_QUERY
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return query + ' ORDER BY o.order_date, o.id', params
+
+
+def iter_rows(pool, query, params):
+    """Строки запроса порциями; соединение берётся из пула на время выгрузки"""
+    conn = pool.acquire()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        pool.release(conn)
+
+
+def iter_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel правильно открыл кириллицу
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(batches, columns):
+    for rows in batches:
+        chunk = ''.join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+        )
+        yield chunk.encode('utf-8')
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,262 @@
+import math
+import sys
+import threading
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Прогноз спроса по истории заказов. SQLite сворачивает заказы до счётчиков
+# (блюдо, день, приём пищи), дальше всё считается массивами NumPy вида
+# [приём пищи, блюдо, неделя, день недели]: скользящие среднее и разброс
+# за последние WINDOW_WEEKS недель по каждому дню недели через cumsum,
+# без циклов по блюдам и дням. Дни, когда столовая не работала (нет ни
+# одного заказа), в среднее не входят.
+#
+# Расчёт кэшируется в процессе до появления новых заказов (MAX(orders.id)).
+# История — полные недели до текущего понедельника, а новые заказы почти
+# всегда относятся к текущей неделе: тогда кэш остаётся в силе, и
+# полный пересчёт нужен раз в неделю или после загрузки старых заказов.
+# Остатки сравниваются с прогнозом при каждом обращении.
+
+HISTORY_WEEKS = 52
+WINDOW_WEEKS = 8
+HORIZON_DAYS = 7
+MAX_HORIZON_DAYS = 28
+# Запас на разброс спроса: прогноз + SAFETY_Z стандартных отклонений
+SAFETY_Z = 1.0
+
+DRAFT_STATUS = 'draft'
+
+_cache = {}
+_cache_lock = threading.Lock()
+# Пересчёт идёт в одном потоке, остальные ждут его результат
+_compute_lock = threading.Lock()
+
+
+def available():
+    return np is not None
+
+
+def history_start(today, weeks):
+    # Полные недели с понедельника, текущая неделя не входит
+    return today - timedelta(days=today.weekday()) - timedelta(weeks=weeks)
+
+
+def load_counts(cursor, start, weeks):
+    """Массив заказов [приём пищи, блюдо, неделя, день недели] и подписи осей"""
+    cursor.row_factory = None
+    # Год истории — почти вся таблица: последовательный проход быстрее,
+    # чем диапазон по idx_orders_date с переходом в таблицу на каждую строку
+    cursor.execute('''
+                   SELECT dish_id,
+                          CAST(julianday(order_date) - julianday(?) AS INTEGER) as day,
+                          COALESCE(meal_type, 'обед') as meal_type,
+                          COUNT(*)
+                   FROM orders NOT INDEXED
+                   WHERE order_date >= ? AND order_date < DATE(?, ?) AND status != 'cancelled'
+                   GROUP BY dish_id, day, meal_type
+                   ''', (start.isoformat(), start.isoformat(), start.isoformat(), f'+{weeks * 7} days'))
+    rows = cursor.fetchall()
+    if not rows:
+        return np.zeros((0, 0, weeks, 7)), [], []
+
+    dish_column, day_column, meal_column, count_column = zip(*rows)
+    dish_ids, dish_index = np.unique(np.array(dish_column, dtype=np.int64), return_inverse=True)
+    meal_types, meal_index = np.unique(np.array(meal_column, dtype=object), return_inverse=True)
+    counts = np.zeros((len(meal_types), len(dish_ids), weeks * 7))
+    np.add.at(counts, (meal_index, dish_index, np.array(day_column, dtype=np.int64)),
+              np.array(count_column, dtype=np.float64))
+    return counts.reshape(len(meal_types), len(dish_ids), weeks, 7), dish_ids.tolist(), list(meal_types)
+
+
+def _window_sums(values, window):
+    """Скользящие суммы по оси недель: [..., недели - window + 1, 7]"""
+    cumulative = np.cumsum(values, axis=-2)
+    shape = list(cumulative.shape)
+    shape[-2] = 1
+    cumulative = np.concatenate([np.zeros(shape), cumulative], axis=-2)
+    return cumulative[..., window:, :] - cumulative[..., :-window, :]
+
+
+def rolling_stats(counts, window):
+    """Скользящие среднее и дисперсия спроса по дням недели за рабочие дни.
+
+    Возвращает (mean, var, open_days) формы [приём пищи, блюдо, недели - window + 1, 7].
+    """
+    # День рабочий, если в этот день был хоть один заказ
+    is_open = (counts.sum(axis=(0, 1)) > 0).astype(np.float64)
+    open_days = _window_sums(is_open, window)
+    sums = _window_sums(counts, window)
+    squares = _window_sums(counts ** 2, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(open_days > 0, sums / open_days, 0.0)
+        var = np.where(open_days > 0, squares / open_days - mean ** 2, 0.0)
+    return mean, np.maximum(var, 0.0), open_days
+
+
+def compute(cursor, today=None, weeks=HISTORY_WEEKS, window=WINDOW_WEEKS):
+    """Спрос по блюдам: среднее и дисперсия на каждый день недели и приём пищи
+    по последнему окну плюс ошибка такого прогноза на истории."""
+    today = today or date.today()
+    start = history_start(today, weeks)
+    counts, dish_ids, meal_types = load_counts(cursor, start, weeks)
+    if not dish_ids:
+        return {'dish_ids': [], 'meal_types': [], 'mean': None, 'var': None, 'error': None,
+                'history_from': start.isoformat()}
+
+    mean, var, open_days = rolling_stats(counts, window)
+
+    # Проверка на истории: окно недель [t - window, t) предсказывает неделю t
+    predicted = mean[..., :-1, :].sum(axis=0)
+    actual = counts[..., window:, :].sum(axis=0)
+    was_open = open_days[:-1, :] > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error = np.abs(predicted - actual)[..., was_open].mean(axis=-1) if was_open.any() \
+            else np.zeros(len(dish_ids))
+
+    return {
+        'dish_ids': dish_ids,
+        'meal_types': meal_types,
+        'mean': mean[..., -1, :],
+        'var': var[..., -1, :],
+        'error': error,
+        'history_from': start.isoformat(),
+    }
+
+
+def _cached_result(db, start, end, last_order_id):
+    with _cache_lock:
+        cached = dict(_cache)
+    if cached.get('start') != start:
+        return None
+    if cached['last_order_id'] >= last_order_id:
+        return cached['result']
+
+    # Новые заказы текущей недели в историю не входят
+    stale = db.execute('SELECT 1 FROM orders WHERE id > ? AND order_date < ? LIMIT 1',
+                       (cached['last_order_id'], end.isoformat())).fetchone()
+    if stale is not None:
+        return None
+    with _cache_lock:
+        if _cache.get('start') == start:
+            _cache['last_order_id'] = max(_cache['last_order_id'], last_order_id)
+    return cached['result']
+
+
+def cached_compute(db, today=None):
+    """compute() с кэшем в памяти процесса до появления новых заказов за прошлые недели"""
+    today = today or date.today()
+    start = history_start(today, HISTORY_WEEKS)
+    end = history_start(today, 0)
+    last_order_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM orders').fetchone()[0]
+    result = _cached_result(db, start, end, last_order_id)
+    if result is not None:
+        return result
+
+    with _compute_lock:
+        # Пока ждали блокировку, другой поток мог уже пересчитать
+        result = _cached_result(db, start, end, last_order_id)
+        if result is None:
+            result = compute(db.cursor(), today)
+            with _cache_lock:
+                _cache.update(start=start, last_order_id=last_order_id, result=result)
+    return result
+
+
+def plan(db, days=HORIZON_DAYS, today=None, safety_z=SAFETY_Z):
+    """Ожидаемый спрос на days дней вперёд (с сегодняшнего) против остатков.
+
+    need — сколько порций докупить сверх остатка и уже поданных заявок.
+    """
+    today = today or date.today()
+    result = cached_compute(db, today)
+    if not result['dish_ids']:
+        return []
+
+    # Сколько раз каждый день недели встречается в горизонте
+    weekdays = np.zeros(7)
+    for offset in range(days):
+        weekdays[(today + timedelta(days=offset)).weekday()] += 1
+
+    by_meal = result['mean'] @ weekdays
+    expected = by_meal.sum(axis=0)
+    safety = safety_z * np.sqrt(result['var'].sum(axis=0) @ weekdays)
+
+    cursor = db.cursor()
+    cursor.execute('SELECT id, name, quantity, is_available FROM dishes')
+    dishes = {dish['id']: dish for dish in cursor.fetchall()}
+    cursor.execute('''
+                   SELECT dish_id, SUM(quantity) as quantity FROM purchase_requests
+                   WHERE status = 'pending' AND dish_id IS NOT NULL
+                   GROUP BY dish_id
+                   ''')
+    requested = {row['dish_id']: row['quantity'] for row in cursor.fetchall()}
+
+    rows = []
+    for index, dish_id in enumerate(result['dish_ids']):
+        dish = dishes.get(dish_id)
+        if dish is None or not dish['is_available']:
+            continue
+        demand = expected[index] + safety[index]
+        stock = dish['quantity'] or 0
+        rows.append({
+            'dish_id': dish_id,
+            'dish_name': dish['name'],
+            'expected': round(float(expected[index]), 1),
+            'safety': round(float(safety[index]), 1),
+            'by_meal_type': {meal_type: round(float(by_meal[meal, index]), 1)
+                             for meal, meal_type in enumerate(result['meal_types'])},
+            'error_per_day': round(float(result['error'][index]), 2),
+            'stock': stock,
+            'requested': requested.get(dish_id, 0),
+            'need': max(math.ceil(demand - stock - requested.get(dish_id, 0)), 0),
+        })
+    rows.sort(key=lambda row: (-row['need'], row['dish_id']))
+    return rows
+
+
+def draft_purchases(cursor, created_by, rows, days):
+    """Черновики заявок на закупку по прогнозу вместо прежних черновиков.
+
+    Черновик не виден администратору, пока повар его не подтвердит.
+    Возвращает число черновиков.
+    """
+    cursor.execute('DELETE FROM purchase_requests WHERE status = ?', (DRAFT_STATUS,))
+    drafts = [(created_by, row['dish_id'], row['dish_name'], row['need'],
+               f'Прогноз на {days} дн.: нужно ~{row["expected"] + row["safety"]:.0f}, '
+               f'в наличии {row["stock"]}, уже заказано {row["requested"]}', DRAFT_STATUS)
+              for row in rows if row['need'] > 0]
+    cursor.executemany('''
+                       INSERT INTO purchase_requests (created_by, dish_id, dish_name, quantity, reason, status)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ''', drafts)
+    return len(drafts)
+
+
+if __name__ == '__main__':
+    # python forecast.py draft [путь к базе] [дней] — запускается по расписанию (cron)
+    if len(sys.argv) < 2 or sys.argv[1] != 'draft':
+        print('Использование: python forecast.py draft [school_cafe_full.db] [дней]')
+        sys.exit(1)
+    if not available():
+        print('❌ Для прогноза нужен numpy: pip install numpy')
+        sys.exit(1)
+
+    from db import connect
+
+    database = sys.argv[2] if len(sys.argv) > 2 else 'school_cafe_full.db'
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else HORIZON_DAYS
+    conn = connect(database)
+    cook = conn.execute('SELECT id FROM users WHERE role = 1 ORDER BY id LIMIT 1').fetchone()
+    if cook is None:
+        print('❌ В базе нет повара, от имени которого создаются черновики')
+        sys.exit(1)
+    rows = plan(conn, days)
+    count = draft_purchases(conn.cursor(), cook['id'], rows, days)
+    conn.commit()
+    conn.close()
+    print(f'✅ Черновиков заявок: {count}')
@@ -0,0 +1,44 @@
+# Конфигурация gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Переменные окружения:
+#   CAFE_BIND     адрес, по умолчанию 0.0.0.0:5000
+#   CAFE_WORKERS  число процессов, по умолчанию 2 * CPU + 1
+#   CAFE_THREADS  потоков в каждом процессе, по умолчанию 4
+#   CAFE_HASH_WORKERS  процессов scrypt в каждом воркере, по умолчанию CPU / CAFE_WORKERS
+#   CAFE_MAX_STREAMS   подключений SSE на воркер, по умолчанию половина CAFE_THREADS
+import multiprocessing
+import os
+
+bind = os.environ.get('CAFE_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('CAFE_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('CAFE_THREADS', 4))
+worker_class = 'gthread'
+
+# Приложение загружается в мастере: init_db() выполняется один раз до fork
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
+errorlog = '-'
+
+# Каждому потоку воркера — своё соединение из пула
+os.environ.setdefault('CAFE_DB_POOL_SIZE', str(threads))
+# Пул scrypt создаётся в каждом воркере: делим ядра между ними, иначе
+# процессов хэширования было бы workers * CPU (по 16 МБ памяти на каждый)
+os.environ.setdefault('CAFE_HASH_WORKERS', str(max(multiprocessing.cpu_count() // workers, 1)))
+
+# Экран кухни (/api/orders/stream) держит поток воркера, пока подключён. Потокам
+# событий отдаём не больше половины потоков, остальные — обычным запросам; лишние
+# подключения получают 503. Для N экранов CAFE_THREADS нужен от 2 * N / workers
+os.environ.setdefault('CAFE_MAX_STREAMS', str(max(threads // 2, 1)))
+
+
+def post_fork(server, worker):
+    # Кэш пользователей унаследован от мастера; в воркере начинаем с пустого
+    import working_server
+    working_server.user_cache.clear()
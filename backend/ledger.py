@@ -0,0 +1,180 @@
+import sqlite3
+import sys
+
+
+# Журнал движений по балансу. Каждое изменение users.balance дописывает
+# сюда строку в той же транзакции; строки никогда не меняются и не удаляются.
+# users.balance остаётся быстрым текущим значением, а журнал — историей.
+#
+# Снимки balance_snapshots фиксируют баланс на момент некоторой строки
+# журнала. Баланс на дату и выписка считаются от ближайшего снимка плюс
+# «хвост» журнала после него, а не суммой всей истории ученика.
+
+TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        type TEXT NOT NULL,
+        description TEXT,
+        order_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions (user_id, created_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS balance_snapshots (
+        user_id INTEGER NOT NULL,
+        transaction_id INTEGER NOT NULL,
+        balance REAL NOT NULL,
+        taken_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (user_id, transaction_id)
+    ) WITHOUT ROWID
+    ''',
+)
+
+# Снимок делается, когда после предыдущего накопилось столько строк
+SNAPSHOT_EVERY = 50
+
+
+def create_tables(cursor):
+    for ddl in TABLES:
+        cursor.execute(ddl)
+
+
+def open_accounts(cursor):
+    """Начальная строка 'opening' для пользователей с балансом, но без истории"""
+    cursor.execute('''
+                   INSERT INTO transactions (user_id, amount, type, description)
+                   SELECT u.id, u.balance, 'opening', 'Остаток на начало учёта'
+                   FROM users u
+                   WHERE u.balance != 0
+                     AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.user_id = u.id)
+                   ''')
+
+
+def record(cursor, user_id, amount, type, description=None, order_id=None):
+    """amount со знаком: пополнение и возврат > 0, оплата < 0"""
+    cursor.execute('''
+                   INSERT INTO transactions (user_id, amount, type, description, order_id)
+                   VALUES (?, ?, ?, ?, ?)
+                   ''', (user_id, amount, type, description, order_id))
+
+
+def record_many(cursor, entries):
+    """entries: (user_id, amount, type, description, order_id)"""
+    cursor.executemany('''
+                       INSERT INTO transactions (user_id, amount, type, description, order_id)
+                       VALUES (?, ?, ?, ?, ?)
+                       ''', entries)
+
+
+def record_order_payments(cursor, orders):
+    record_many(cursor, [(order['user_id'], -order['price'], 'payment',
+                          f'Заказ #{order["id"]}: {order["dish_name"]}', order['id']) for order in orders])
+
+
+def record_order_refunds(cursor, orders):
+    record_many(cursor, [(order['user_id'], order['price'], 'refund',
+                          f'Отмена заказа #{order["id"]}', order['id']) for order in orders])
+
+
+def take_snapshots(cursor, every=SNAPSHOT_EVERY):
+    """Новые снимки для пользователей, у которых после последнего снимка
+    накопилось не меньше every строк. Возвращает число снимков."""
+    # Голые столбцы при MAX(): created_at и balance берутся из строки с максимумом
+    cursor.execute('''
+                   INSERT INTO balance_snapshots (user_id, transaction_id, balance, taken_at)
+                   SELECT t.user_id, MAX(t.id), COALESCE(s.balance, 0) + SUM(t.amount), t.created_at
+                   FROM transactions t
+                            LEFT JOIN (SELECT user_id, MAX(transaction_id) as transaction_id, balance
+                                       FROM balance_snapshots
+                                       GROUP BY user_id) s ON s.user_id = t.user_id
+                   WHERE t.id > COALESCE(s.transaction_id, 0)
+                   GROUP BY t.user_id
+                   HAVING COUNT(*) >= ?
+                   ''', (every,))
+    return cursor.rowcount
+
+
+def _snapshot_before(cursor, user_id, moment):
+    cursor.execute('''
+                   SELECT transaction_id, balance, taken_at
+                   FROM balance_snapshots
+                   WHERE user_id = ? AND taken_at < ?
+                   ORDER BY transaction_id DESC
+                   LIMIT 1
+                   ''', (user_id, moment))
+    return cursor.fetchone()
+
+
+def balance_at(cursor, user_id, moment):
+    """Баланс до момента moment ('ГГГГ-ММ-ДД ЧЧ:ММ:СС' или дата): снимок + хвост журнала"""
+    snapshot = _snapshot_before(cursor, user_id, moment)
+    if snapshot is None:
+        transaction_id, balance, taken_at = 0, 0.0, ''
+    else:
+        transaction_id, balance, taken_at = snapshot
+    cursor.execute('''
+                   SELECT COALESCE(SUM(amount), 0)
+                   FROM transactions
+                   WHERE user_id = ? AND created_at >= ? AND created_at < ? AND id > ?
+                   ''', (user_id, taken_at, moment, transaction_id))
+    return balance + cursor.fetchone()[0]
+
+
+def statement(cursor, user_id, date_from, date_to):
+    """Выписка за [date_from, date_to]: остаток на начало, движения, остаток на конец"""
+    # date_to включительно: все строки до начала следующего дня
+    end = f"{date_to} 23:59:59.999"
+    opening = balance_at(cursor, user_id, date_from)
+    cursor.execute('''
+                   SELECT id, amount, type, description, order_id, created_at
+                   FROM transactions
+                   WHERE user_id = ? AND created_at >= ? AND created_at <= ?
+                   ORDER BY created_at, id
+                   ''', (user_id, date_from, end))
+    entries = [dict(row) for row in cursor.fetchall()]
+    closing = opening + sum(entry['amount'] for entry in entries)
+    return {
+        'user_id': user_id,
+        'date_from': date_from,
+        'date_to': date_to,
+        'opening_balance': round(opening, 2),
+        'closing_balance': round(closing, 2),
+        'transactions': entries,
+    }
+
+
+def find_mismatches(cursor):
+    """Пользователи, у которых сумма журнала расходится с users.balance"""
+    cursor.execute('''
+                   SELECT u.id, u.balance, COALESCE(SUM(t.amount), 0) as ledger_balance
+                   FROM users u
+                            LEFT JOIN transactions t ON t.user_id = u.id
+                   GROUP BY u.id
+                   HAVING ABS(u.balance - ledger_balance) > 0.005
+                   ''')
+    return cursor.fetchall()
+
+
+if __name__ == '__main__':
+    # python ledger.py snapshot|check [путь к базе] — snapshot запускается по расписанию (cron)
+    if len(sys.argv) < 2 or sys.argv[1] not in ('snapshot', 'check'):
+        print('Использование: python ledger.py snapshot|check [school_cafe_full.db]')
+        sys.exit(1)
+
+    database = sys.argv[2] if len(sys.argv) > 2 else 'school_cafe_full.db'
+    conn = sqlite3.connect(database)
+    if sys.argv[1] == 'snapshot':
+        count = take_snapshots(conn.cursor())
+        conn.commit()
+        print(f'✅ Снимков баланса: {count}')
+    else:
+        mismatches = find_mismatches(conn.cursor())
+        for user_id, balance, ledger_balance in mismatches:
+            print(f'⚠️ Пользователь {user_id}: баланс {balance}, по журналу {ledger_balance}')
+        print(f'Расхождений: {len(mismatches)}')
+    conn.close()
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+
+# Потоки запросов только кладут запись в очередь; форматирование в JSON и
+# запись в stderr выполняет отдельный поток-слушатель, поэтому обработчики
+# не ждут на блокировке вывода.
+
+logger = logging.getLogger('cafe')
+
+# Стандартные атрибуты LogRecord; всё остальное пришло через extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'request_id'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AsyncHandler(QueueHandler):
+    """QueueHandler, который сам запускает слушателя в каждом процессе"""
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        # Поток слушателя не переживает fork, поэтому воркер gunicorn запускает свой
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._listener = QueueListener(self.queue, self.target)
+                    self._listener.start()
+                    self._pid = os.getpid()
+        super().emit(record)
+
+    def prepare(self, record):
+        # Очередь внутри процесса: запись не сериализуется, форматирование
+        # остаётся слушателю. Аргументы подставляем сразу, пока они не изменились.
+        record.request_id = _current_request_id()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._pid = None
+
+
+def _current_request_id():
+    if has_request_context():
+        return g.get('request_id')
+    return None
+
+
+def setup_logging(app, level='INFO'):
+    """JSON-журнал через очередь и идентификатор запроса X-Request-ID"""
+    target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonFormatter())
+    handler = AsyncHandler(target)
+
+    logger.handlers[:] = [handler]
+    # OFF выключает журнал полностью (например, для замеров)
+    logger.setLevel(logging.CRITICAL + 10 if level.upper() == 'OFF' else level.upper())
+    logger.propagate = False
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    @app.after_request
+    def return_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    return handler
@@ -0,0 +1,68 @@
+import hashlib
+import multiprocessing
+import threading
+
+
+class MenuCache:
+    """Кэш готовых JSON-ответов меню по категориям.
+
+    Любое изменение блюд вызывает invalidate(): версия увеличивается,
+    и следующие запросы заново собирают ответ из базы. Рядом с телом
+    хранятся его сжатые варианты по кодировкам (get_encoded).
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._version = 0
+        self._shared = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def share_between_processes(self):
+        """Хранить версию в общей памяти.
+
+        Вызывается в мастер-процессе до fork: все воркеры видят одну версию,
+        и изменение меню в одном из них сбрасывает кэш в остальных.
+        """
+        self._shared = multiprocessing.RawValue('q', 0)
+        self._shared_lock = multiprocessing.Lock()
+
+    def _current_version(self):
+        return self._shared.value if self._shared is not None else self._version
+
+    def get(self, key, loader):
+        """Возвращает (etag, body); loader() вызывается только при промахе"""
+        version = self._current_version()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1], entry[2]
+
+        body = loader()
+        etag = hashlib.md5(body).hexdigest()
+
+        with self._lock:
+            # Если меню поменялось, пока мы читали базу, результат не кэшируем
+            if version == self._current_version() and (key in self._entries or len(self._entries) < self.max_entries):
+                self._entries[key] = (version, etag, body, {})
+        return etag, body
+
+    def get_encoded(self, key, etag, encoding, encode):
+        """Тело (etag, body) из get() в кодировке encoding; encode() вызывается
+        один раз на версию тела, пока оно в кэше"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] != etag:
+            return encode()
+        encoded = entry[3].get(encoding)
+        if encoded is None:
+            encoded = encode()
+            entry[3][encoding] = encoded
+        return encoded
+
+    def invalidate(self):
+        with self._lock:
+            if self._shared is not None:
+                with self._shared_lock:
+                    self._shared.value += 1
+            else:
+                self._version += 1
+            self._entries.clear()
@@ -0,0 +1,136 @@
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+import db
+
+
+logger = logging.getLogger('cafe.metrics')
+
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 50)
+
+_WHITESPACE = re.compile(r'\s+')
+# В параметрах запросов к users — хэши паролей, телефоны и почта: в журнал
+# медленных запросов попадает только их число
+_REDACTED_TABLES = re.compile(r'\busers\b', re.IGNORECASE)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Metrics:
+    """Метрики запросов к API и к базе в формате Prometheus.
+
+    Значения хранятся в памяти процесса: при нескольких воркерах gunicorn
+    каждый отдаёт свою часть.
+    """
+
+    def __init__(self, slow_query_ms=None):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._queries_per_request = {}
+        self._responses = {}
+        self._queries = {}
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        db.set_query_observer(self.observe_query)
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = 0
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (route, request.method)
+        with self._lock:
+            self._latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self._queries_per_request.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(
+                g.pop('_metrics_queries', 0))
+            status_key = key + (response.status_code,)
+            self._responses[status_key] = self._responses.get(status_key, 0) + 1
+        return response
+
+    def observe_query(self, sql, params, seconds):
+        statement = _WHITESPACE.sub(' ', sql).strip()[:200]
+        with self._lock:
+            count, total = self._queries.get(statement, (0, 0.0))
+            self._queries[statement] = (count + 1, total + seconds)
+
+        if has_request_context():
+            g._metrics_queries = g.get('_metrics_queries', 0) + 1
+
+        if self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms:
+            if params is not None and _REDACTED_TABLES.search(sql):
+                params = f'<скрыто: {len(params)}>'
+            logger.warning("Медленный запрос", extra={'ms': round(seconds * 1000, 1), 'sql': statement,
+                                                      'params': params})
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP cafe_http_request_duration_seconds Время обработки запроса')
+            lines.append('# TYPE cafe_http_request_duration_seconds histogram')
+            for (route, method), hist in sorted(self._latency.items()):
+                lines.extend(_histogram_lines('cafe_http_request_duration_seconds',
+                                              f'route="{route}",method="{method}"', hist))
+
+            lines.append('# HELP cafe_http_request_queries Число SQL-запросов на один HTTP-запрос')
+            lines.append('# TYPE cafe_http_request_queries histogram')
+            for (route, method), hist in sorted(self._queries_per_request.items()):
+                lines.extend(_histogram_lines('cafe_http_request_queries',
+                                              f'route="{route}",method="{method}"', hist))
+
+            lines.append('# HELP cafe_http_responses_total Ответы по маршрутам и кодам')
+            lines.append('# TYPE cafe_http_responses_total counter')
+            for (route, method, status), count in sorted(self._responses.items()):
+                lines.append(f'cafe_http_responses_total{{route="{route}",method="{method}",'
+                             f'status="{status}"}} {count}')
+
+            lines.append('# HELP cafe_db_query_duration_seconds Время выполнения SQL-запросов')
+            lines.append('# TYPE cafe_db_query_duration_seconds summary')
+            for statement, (count, total) in sorted(self._queries.items()):
+                label = _escape(statement)
+                lines.append(f'cafe_db_query_duration_seconds_sum{{query="{label}"}} {total:.6f}')
+                lines.append(f'cafe_db_query_duration_seconds_count{{query="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, labels, hist):
+    cumulative = 0
+    for bound, count in zip(hist.buckets, hist.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_bucket{{{labels},le="+Inf"}} {hist.total}'
+    yield f'{name}_sum{{{labels}}} {hist.sum:.6f}'
+    yield f'{name}_count{{{labels}}} {hist.total}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
@@ -0,0 +1,129 @@
+import sqlite3
+import sys
+
+import events
+import ledger
+import preorders
+import reports
+import reviews
+import subscriptions
+
+
+# Базовые таблицы создаёт init_db(); всё, что появилось позже,
+# добавляется отдельной пронумерованной миграцией. Номера не меняются
+# и не переиспользуются, новые шаги дописываются в конец списка.
+
+def _reporting_tables(cursor):
+    reports.create_tables(cursor)
+    reports.populate(cursor)
+
+
+def _hot_query_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders (user_id, order_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders (status, order_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_dish_status ON orders (dish_id, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_dishes_category_available_price '
+                   'ON dishes (category, is_available, price)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchase_requests_creator_date '
+                   'ON purchase_requests (created_by, created_at)')
+
+
+def _pagination_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchase_requests_status_date '
+                   'ON purchase_requests (status, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at)')
+
+
+def _order_events(cursor):
+    events.create_table(cursor)
+
+
+def _preorders(cursor):
+    preorders.create_table(cursor)
+
+
+def _ledger(cursor):
+    ledger.create_tables(cursor)
+    ledger.open_accounts(cursor)
+
+
+def _subscriptions(cursor):
+    subscriptions.create_table(cursor)
+    # Заказ помнит абонемент, с которого списана порция, чтобы отмена вернула именно её
+    cursor.execute('ALTER TABLE orders ADD COLUMN subscription_id INTEGER')
+
+
+def _reviews(cursor):
+    reviews.create_table(cursor)
+
+
+def _purchase_status_order_index(cursor):
+    # Админский список идёт по status, затем от новых к старым; направления
+    # столбцов совпадают с ORDER BY, иначе SQLite досортировывает во временном B-дереве
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchase_requests_status_created_id '
+                   'ON purchase_requests (status, created_at DESC, id DESC)')
+    cursor.execute('DROP INDEX IF EXISTS idx_purchase_requests_status_date')
+
+
+MIGRATIONS = [
+    (1, 'Отчётные таблицы', _reporting_tables),
+    (2, 'Индексы для частых запросов', _hot_query_indexes),
+    (3, 'Индексы для постраничной выдачи', _pagination_indexes),
+    (4, 'События заказов для экранов кухни', _order_events),
+    (5, 'Очередь предзаказов', _preorders),
+    (6, 'Журнал движений по балансу', _ledger),
+    (7, 'Абонементы на питание', _subscriptions),
+    (8, 'Отзывы о блюдах', _reviews),
+    (9, 'Индекс заявок в порядке админского списка', _purchase_status_order_index),
+]
+
+
+def current_version(cursor):
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS schema_version (
+                       version INTEGER PRIMARY KEY,
+                       name TEXT NOT NULL,
+                       applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                   )
+                   ''')
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(db):
+    """Применяет недостающие миграции, каждую в своей транзакции"""
+    cursor = db.cursor()
+    version = current_version(cursor)
+    db.commit()
+
+    applied = []
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            # DDL в sqlite3 не открывает транзакцию сам, поэтому BEGIN явно.
+            # IMMEDIATE берёт блокировку записи до проверки версии: второй процесс,
+            # стартующий одновременно, дождётся её и не применит тот же шаг ещё раз
+            cursor.execute('BEGIN IMMEDIATE')
+            version = current_version(cursor)
+            if number <= version:
+                db.rollback()
+                continue
+            step(cursor)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (number, name))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(number)
+    return applied
+
+
+if __name__ == '__main__':
+    database = sys.argv[1] if len(sys.argv) > 1 else 'school_cafe_full.db'
+    # Долгий шаг в другом процессе держит блокировку записи: ждём дольше обычного
+    conn = sqlite3.connect(database, timeout=60.0)
+    applied = migrate(conn)
+    print(f'Версия схемы: {current_version(conn.cursor())}, применено: {applied or "ничего"}')
+    conn.close()
@@ -1,17 +1,24 @@
+from .base import Base, Session, make_engine
 from .user import User
 from .dish import Dish
 from .order import Order
 from .review import Review
 from .purchase_request import PurchaseRequest
 from .subscription import Subscription
-from .transaction import Transaction
+from .transaction import Transaction, BalanceSnapshot
+from .preorder import Preorder
 
 __all__ = [
+    'Base',
+    'Session',
+    'make_engine',
     'User',
     'Dish',
     'Order',
     'Review',
     'PurchaseRequest',
     'Subscription',
-    'Transaction'
-]
\ No newline at end of file
+    'Transaction',
+    'BalanceSnapshot',
+    'Preorder'
+]
@@ -0,0 +1,36 @@
+import sqlite3
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import db
+
+
+# Одни метаданные на все модели. Схему по-прежнему создают init_db() и
+# migrations.py; модели описывают её и не вызывают create_all().
+
+class Base(DeclarativeBase):
+    pass
+
+
+def make_engine(database, pool_size=5):
+    """Движок поверх тех же соединений, что и пул сервера.
+
+    Соединения открываются с InstrumentedConnection и PRAGMA из db.py,
+    поэтому запросы ORM попадают в метрики и журнал медленных запросов.
+    QueuePool явно: для URL без файла SQLAlchemy выбрал бы
+    SingletonThreadPool, который закрывает соединения чужих потоков.
+    """
+    def connect():
+        conn = sqlite3.connect(database, timeout=5.0, check_same_thread=False,
+                               factory=db.InstrumentedConnection)
+        for pragma in db.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    return create_engine('sqlite://', creator=connect, poolclass=QueuePool, pool_size=pool_size)
+
+
+# expire_on_commit=False: объекты остаются читаемыми после commit без повторного SELECT
+Session = sessionmaker(expire_on_commit=False)
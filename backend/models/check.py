@@ -0,0 +1,22 @@
+"""Сверка моделей с живой схемой базы.
+
+    cd backend
+    python -m models.check school_cafe_full.db
+
+Схему создают init_db() и migrations.py, модели её только описывают.
+После новой миграции модели нужно обновить; эта проверка показывает,
+что разошлось, и завершается с кодом 1, если расхождения есть.
+"""
+import sys
+
+from .base import make_engine
+from .repository import schema_drift
+
+
+if __name__ == '__main__':
+    database = sys.argv[1] if len(sys.argv) > 1 else 'school_cafe_full.db'
+    problems = schema_drift(make_engine(database))
+    for problem in problems:
+        print(f'⚠️ {problem}')
+    print(f'Расхождений: {len(problems)}')
+    sys.exit(1 if problems else 0)
@@ -1,12 +1,14 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, DateTime, Index, text
 
-Base = declarative_base()
+from .base import Base
 
 class Dish(Base):
     __tablename__ = 'dishes'
+    __table_args__ = (
+        Index('idx_dishes_category_available_price', 'category', 'is_available', 'price'),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
     description = Column(Text)
     category = Column(String(50), nullable=False)  # завтрак, обед, напиток
@@ -14,11 +16,12 @@ class Dish(Base):
     ingredients = Column(Text)
     allergens = Column(Text)
     calories = Column(Integer)
-    is_available = Column(Boolean, default=True)
-    quantity = Column(Integer, default=0)
-    rating = Column(Float, default=0.0)
-    rating_count = Column(Integer, default=0)
-    created_at = Column(DateTime, default=datetime.now)
+    is_available = Column(Boolean, server_default=text('1'))
+    quantity = Column(Integer, server_default=text('0'))
+    # Скользящее среднее по отзывам, см. reviews.py
+    rating = Column(Float, server_default=text('0.0'))
+    rating_count = Column(Integer, server_default=text('0'))
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
 
     def to_dict(self):
         return {
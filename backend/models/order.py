@@ -1,38 +1,48 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 
-Base = declarative_base()
+from .base import Base
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('idx_orders_user_date', 'user_id', 'order_date'),
+        Index('idx_orders_status_date', 'status', 'order_date'),
+        Index('idx_orders_dish_status', 'dish_id', 'status'),
+        Index('idx_orders_date', 'order_date'),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     dish_id = Column(Integer, ForeignKey('dishes.id'), nullable=False)
-    order_date = Column(DateTime, default=datetime.now)
+    # Название и цена на момент заказа: блюдо могли изменить или удалить
+    dish_name = Column(String(100), nullable=False)
+    price = Column(Float, nullable=False)
     meal_type = Column(String(20))  # завтрак, обед
-    status = Column(String(20), default='pending')  # pending, preparing, served, cancelled
     payment_type = Column(String(20))  # разовый, абонемент
-    price = Column(Float, nullable=False)
-    served_by = Column(Integer, ForeignKey('users.id'))
+    status = Column(String(20), server_default=text("'pending'"))  # pending, served, cancelled
+    order_date = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
     served_at = Column(DateTime)
+    # Абонемент, с которого списана порция (migrations.py, шаг 7)
+    subscription_id = Column(Integer, ForeignKey('subscriptions.id'))
 
-    # Relationships
-    user = relationship('User', foreign_keys=[user_id])
-    dish = relationship('Dish')
-    server = relationship('User', foreign_keys=[served_by])
+    # Relationships: ленивая загрузка запрещена, чтобы цикл по заказам
+    # не превращался в N+1; загружать через joinedload()/selectinload()
+    user = relationship('User', back_populates='orders', lazy='raise_on_sql')
+    dish = relationship('Dish', lazy='raise_on_sql')
+    subscription = relationship('Subscription', lazy='raise_on_sql')
 
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'dish_id': self.dish_id,
-            'order_date': self.order_date.isoformat() if self.order_date else None,
+            'dish_name': self.dish_name,
+            'price': self.price,
             'meal_type': self.meal_type,
-            'status': self.status,
             'payment_type': self.payment_type,
-            'price': self.price,
-            'served_by': self.served_by,
-            'served_at': self.served_at.isoformat() if self.served_at else None
-        }
\ No newline at end of file
+            'status': self.status,
+            'order_date': self.order_date.isoformat() if self.order_date else None,
+            'served_at': self.served_at.isoformat() if self.served_at else None,
+            'subscription_id': self.subscription_id
+        }
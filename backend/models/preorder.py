@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Index, text
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+class Preorder(Base):
+    __tablename__ = 'preorders'
+    __table_args__ = (
+        Index('idx_preorders_queue', 'status', 'service_date', 'created_at', 'id'),
+        Index('idx_preorders_user_date', 'user_id', 'service_date'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    dish_id = Column(Integer, ForeignKey('dishes.id'), nullable=False)
+    service_date = Column(Date, nullable=False)
+    meal_type = Column(String(20), nullable=False)
+    payment_type = Column(String(20), nullable=False)
+    status = Column(String(20), nullable=False, server_default=text("'queued'"))  # queued, settled, rejected, cancelled
+    reason = Column(Text)
+    order_id = Column(Integer)
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+    settled_at = Column(DateTime)
+
+    # Relationships
+    dish = relationship('Dish', lazy='raise_on_sql')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'dish_id': self.dish_id,
+            'service_date': self.service_date.isoformat() if self.service_date else None,
+            'meal_type': self.meal_type,
+            'payment_type': self.payment_type,
+            'status': self.status,
+            'reason': self.reason,
+            'order_id': self.order_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'settled_at': self.settled_at.isoformat() if self.settled_at else None
+        }
@@ -1,34 +1,40 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, text
+from sqlalchemy.orm import relationship
 
-Base = declarative_base()
+from .base import Base
 
 class PurchaseRequest(Base):
     __tablename__ = 'purchase_requests'
+    __table_args__ = (
+        Index('idx_purchase_requests_creator_date', 'created_by', 'created_at'),
+        Index('idx_purchase_requests_status_created_id', 'status', text('created_at DESC'), text('id DESC')),
+    )
 
-    id = Column(Integer, primary_key=True)
-    cook_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    product_name = Column(String(100), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    dish_id = Column(Integer)
+    dish_name = Column(String(100), nullable=False)
     quantity = Column(Integer, nullable=False)
-    unit = Column(String(20), nullable=False)  # кг, л, шт
     reason = Column(Text)
-    status = Column(String(20), default='pending')  # pending, approved, rejected
-    admin_id = Column(Integer, ForeignKey('users.id'))
-    admin_comment = Column(Text)
-    created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    status = Column(String(20), server_default=text("'pending'"))  # draft, pending, approved, rejected
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+    processed_at = Column(DateTime)
+    processed_by = Column(Integer, ForeignKey('users.id'))
+
+    # Relationships
+    creator = relationship('User', foreign_keys=[created_by], lazy='raise_on_sql')
+    processor = relationship('User', foreign_keys=[processed_by], lazy='raise_on_sql')
 
     def to_dict(self):
         return {
             'id': self.id,
-            'cook_id': self.cook_id,
-            'product_name': self.product_name,
+            'created_by': self.created_by,
+            'dish_id': self.dish_id,
+            'dish_name': self.dish_name,
             'quantity': self.quantity,
-            'unit': self.unit,
             'reason': self.reason,
             'status': self.status,
-            'admin_id': self.admin_id,
-            'admin_comment': self.admin_comment,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None,
+            'processed_by': self.processed_by
+        }
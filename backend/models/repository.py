@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from sqlalchemy import String, insert, inspect, select, tuple_, type_coerce, update
+from sqlalchemy.orm import joinedload, selectinload
+
+from .base import Base
+from .dish import Dish
+from .order import Order
+from .purchase_request import PurchaseRequest
+from .transaction import Transaction
+from .user import User
+
+
+# Доступ к данным через модели для скриптов и админских задач. Связи
+# моделей объявлены с lazy='raise_on_sql': обращение к незагруженной
+# связи — ошибка, а не скрытый запрос на каждую строку, поэтому каждая
+# функция здесь явно перечисляет, что загружается вместе с основной выборкой.
+
+def row_dict(obj):
+    """Столбцы объекта как в SELECT *: даты строкой в формате SQLite (ГГГГ-ММ-ДД ЧЧ:ММ:СС)"""
+    row = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.key)
+        row[column.key] = str(value) if isinstance(value, datetime) else value
+    return row
+
+
+def recent_orders(session, limit=100, status=None, user_id=None, before=None, with_dish=True):
+    """Заказы вместе с учеником (и блюдом) одним SELECT с JOIN (связи many-to-one).
+
+    before — (order_date, id) последнего показанного заказа для следующей страницы.
+    """
+    query = (select(Order)
+             .options(joinedload(Order.user, innerjoin=True))
+             .order_by(Order.order_date.desc(), Order.id.desc())
+             .limit(limit))
+    if with_dish:
+        query = query.options(joinedload(Order.dish))
+    if status is not None:
+        query = query.where(Order.status == status)
+    if user_id is not None:
+        query = query.where(Order.user_id == user_id)
+    if before is not None:
+        # Дата из курсора сравнивается строкой, как хранится: datetime
+        # ушёл бы в запрос с микросекундами и сдвинул границу страницы
+        query = query.where(tuple_(type_coerce(Order.order_date, String), Order.id) < tuple(before))
+    return session.scalars(query).all()
+
+
+def students_with_orders(session, user_ids, since=None):
+    """Ученики и их заказы: два SELECT (второй — WHERE user_id IN (...)) на любое число учеников"""
+    orders = User.orders
+    if since is not None:
+        orders = orders.and_(Order.order_date >= since)
+    query = (select(User)
+             .where(User.id.in_(user_ids))
+             .options(selectinload(orders))
+             .order_by(User.id))
+    return session.scalars(query).all()
+
+
+def purchase_requests_with_people(session, status=None, limit=100):
+    """Заявки на закупку с автором и обработавшим: две связи на users, один SELECT"""
+    query = (select(PurchaseRequest)
+             .options(joinedload(PurchaseRequest.creator), joinedload(PurchaseRequest.processor))
+             .order_by(PurchaseRequest.created_at.desc(), PurchaseRequest.id.desc())
+             .limit(limit))
+    if status is not None:
+        query = query.where(PurchaseRequest.status == status)
+    return session.scalars(query).all()
+
+
+def admin_purchase_requests(session):
+    """Все заявки, кроме черновиков, с автором и обработавшим одним SELECT;
+    порядок как у страниц /api/purchases: по статусу, затем от новых к старым"""
+    query = (select(PurchaseRequest)
+             .options(joinedload(PurchaseRequest.creator, innerjoin=True),
+                      joinedload(PurchaseRequest.processor))
+             .where(PurchaseRequest.status != 'draft')
+             .order_by(PurchaseRequest.status, PurchaseRequest.created_at.desc(), PurchaseRequest.id.desc()))
+    return session.scalars(query).all()
+
+
+def bulk_insert_orders(session, rows):
+    """rows — словари со столбцами orders; одна INSERT через executemany без объектов ORM"""
+    if rows:
+        session.execute(insert(Order), rows)
+
+
+def bulk_insert_transactions(session, entries):
+    """entries — словари (user_id, amount, type, description, order_id), см. ledger.py"""
+    if entries:
+        session.execute(insert(Transaction), entries)
+
+
+def bulk_set_stock(session, quantities):
+    """Остатки {id блюда: количество} одним UPDATE ... WHERE id = ? через executemany"""
+    if quantities:
+        session.execute(update(Dish), [{'id': dish_id, 'quantity': quantity}
+                                       for dish_id, quantity in quantities.items()])
+
+
+def schema_drift(engine):
+    """Расхождения моделей с живой схемой: таблицы и столбцы, которых нет с одной из сторон"""
+    inspector = inspect(engine)
+    live_tables = set(inspector.get_table_names())
+    problems = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in live_tables:
+            problems.append(f'{table.name}: таблицы нет в базе')
+            continue
+        live = {column['name'] for column in inspector.get_columns(table.name)}
+        model = set(table.columns.keys())
+        for name in sorted(model - live):
+            problems.append(f'{table.name}.{name}: столбца нет в базе')
+        for name in sorted(live - model):
+            problems.append(f'{table.name}.{name}: столбца нет в модели')
+        live_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in live_indexes:
+                problems.append(f'{table.name}: индекса {index.name} нет в базе')
+    return problems
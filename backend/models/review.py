@@ -1,17 +1,25 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.orm import relationship
 
-Base = declarative_base()
+from .base import Base
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'dish_id'),
+        Index('idx_reviews_dish_created', 'dish_id', 'created_at'),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     dish_id = Column(Integer, ForeignKey('dishes.id'), nullable=False)
     rating = Column(Integer, nullable=False)  # 1-5
     comment = Column(Text)
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+
+    # Relationships
+    user = relationship('User', lazy='raise_on_sql')
+    dish = relationship('Dish', lazy='raise_on_sql')
 
     def to_dict(self):
         return {
@@ -21,4 +29,4 @@ class Review(Base):
             'rating': self.rating,
             'comment': self.comment,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
@@ -1,28 +1,35 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, Float, Date, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Index, text
 
-Base = declarative_base()
+from .base import Base
 
 class Subscription(Base):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        Index('idx_subscriptions_active', 'user_id', 'end_date', sqlite_where=text('is_active = 1')),
+        Index('idx_subscriptions_user', 'user_id', 'created_at'),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    plan = Column(String(20), nullable=False)  # код из subscriptions.PLANS
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
     meals_left = Column(Integer, nullable=False)
     total_meals = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
-    is_active = Column(Boolean, default=True)
+    is_active = Column(Boolean, nullable=False, server_default=text('1'))
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
 
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
+            'plan': self.plan,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
             'meals_left': self.meals_left,
             'total_meals': self.total_meals,
             'price': self.price,
-            'is_active': self.is_active
-        }
\ No newline at end of file
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
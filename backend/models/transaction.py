@@ -1,17 +1,21 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Index, text
 
-Base = declarative_base()
+from .base import Base
 
 class Transaction(Base):
+    """Строка журнала движений по балансу (ledger.py); не меняется и не удаляется"""
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index('idx_transactions_user_created', 'user_id', 'created_at'),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    amount = Column(Float, nullable=False)
-    type = Column(String(20), nullable=False)  # topup, payment, subscription
+    amount = Column(Float, nullable=False)  # пополнение и возврат > 0, оплата < 0
+    type = Column(String(20), nullable=False)  # opening, topup, payment, refund, subscription
     description = Column(Text)
-    created_at = Column(DateTime, default=datetime.now)
+    order_id = Column(Integer)
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
 
     def to_dict(self):
         return {
@@ -20,5 +24,16 @@ class Transaction(Base):
             'amount': self.amount,
             'type': self.type,
             'description': self.description,
+            'order_id': self.order_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+
+class BalanceSnapshot(Base):
+    __tablename__ = 'balance_snapshots'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    user_id = Column(Integer, primary_key=True)
+    transaction_id = Column(Integer, primary_key=True)
+    balance = Column(Float, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
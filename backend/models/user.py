@@ -1,24 +1,26 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, text
+from sqlalchemy.orm import relationship
 
-Base = declarative_base()
+from .base import Base
 
 class User(Base):
     __tablename__ = 'users'
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String(50), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     full_name = Column(String(100), nullable=False)
-    role = Column(Integer, nullable=False)  # 0=ученик, 1=повар, 2=админ
+    role = Column(Integer, nullable=False, server_default=text('0'))  # 0=ученик, 1=повар, 2=админ
     class_name = Column(String(20))
-    balance = Column(Float, default=0.0)
+    balance = Column(Float, server_default=text('0.0'))
     allergies = Column(Text)
     dietary_preferences = Column(Text)
     email = Column(String(100))
     phone = Column(String(20))
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+
+    # Relationships: ленивая загрузка запрещена, нужен selectinload()
+    orders = relationship('Order', back_populates='user', lazy='raise_on_sql')
 
     def to_dict(self):
         return {
@@ -33,4 +35,4 @@ class User(Base):
             'email': self.email,
             'phone': self.phone,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,54 @@
+import base64
+import json
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    """Курсор не декодируется или не совпадает с ключом сортировки выдачи"""
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(text, shape=None):
+    """Значения ключа из курсора; shape — типы полей ключа, например (str, int)"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(text + '=' * (-len(text) % 4)))
+    except ValueError:
+        raise InvalidCursor('Неверный курсор')
+    if not isinstance(values, list):
+        raise InvalidCursor('Неверный курсор')
+    if shape is not None and (len(values) != len(shape) or not all(
+            isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(values, shape))):
+        raise InvalidCursor('Неверный курсор')
+    return values
+
+
+def get_page_args(args, keys=('limit', 'cursor'), shape=None):
+    """(limit, cursor) из query-параметров или None для старого формата ответа.
+
+    Постраничная выдача включается, если клиент передал limit или cursor.
+    shape — типы полей ключа сортировки; курсор другой длины или с полями
+    других типов приводит к InvalidCursor, остальные неверные значения — к ValueError.
+    """
+    if not any(key in args for key in keys):
+        return None
+
+    limit = int(args.get('limit', DEFAULT_LIMIT))
+    if limit <= 0:
+        raise ValueError('limit должен быть положительным')
+
+    cursor = args.get('cursor')
+    return min(limit, MAX_LIMIT), decode_cursor(cursor, shape) if cursor else None
+
+
+def make_page(rows, limit, key):
+    """Ответ {'items', 'next_cursor'} из limit + 1 прочитанных строк"""
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(key(rows[limit - 1])) if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
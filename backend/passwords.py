@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Стоимость scrypt: N — память и время (степень двойки), r — размер блока, p — параллелизм.
+# Хэш хранит свои параметры, поэтому их можно менять без миграции базы:
+# старые хэши пересчитываются при следующем входе.
+SCRYPT_N = int(os.environ.get('CAFE_SCRYPT_N', 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+class HasherBusy(Exception):
+    """Очередь проверки паролей переполнена"""
+
+
+def hash_password(password, n=None):
+    n = n or SCRYPT_N
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                            maxmem=256 * n * SCRYPT_R)
+    return f'scrypt${n}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}'
+
+
+def verify_password(password, stored):
+    """Возвращает (совпадает, нужно_пересчитать)"""
+    if stored.startswith('scrypt$'):
+        _, n, r, p, salt, digest = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        candidate = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p,
+                                   maxmem=256 * n * r)
+        ok = hmac.compare_digest(candidate.hex(), digest)
+        return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+    # Старый формат: SHA-256 без соли
+    ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    return ok, ok
+
+
+def check_and_rehash(password, stored):
+    """Проверка пароля и новый хэш, если старый устарел: (совпадает, новый_хэш или None)"""
+    ok, needs_rehash = verify_password(password, stored)
+    return ok, hash_password(password) if needs_rehash else None
+
+
+class PasswordHasher:
+    """Хэширование паролей в отдельных процессах.
+
+    scrypt намеренно дорогой; в потоках запросов он бы блокировал GIL и
+    остальные запросы во время утреннего наплыва входов. Число одновременно
+    ожидающих задач ограничено, лишние запросы получают HasherBusy.
+    """
+
+    def __init__(self, workers, max_pending=None, timeout=5.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending or max(workers, 1) * 4)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Пул создаётся лениво в каждом процессе (воркеры gunicorn появляются через fork)
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy()
+        try:
+            return self._get_executor().submit(func, *args).result(timeout=self.timeout)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def check(self, password, stored):
+        return self._run(check_and_rehash, password, stored)
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
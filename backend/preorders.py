@@ -0,0 +1,205 @@
+import sys
+from datetime import date, timedelta
+
+import events
+import ledger
+import reports
+import subscriptions
+from reservations import ReservationError, run_in_transaction
+
+
+# Предзаказы на будущие дни копятся в очереди и не трогают ни остатки, ни
+# баланс. Расчёт (settle) идёт по расписанию: очередь на наступившие дни
+# разбирается пачками в порядке поступления, на каждую пачку — одна
+# транзакция. Порции и деньги распределяются в памяти, а в базу уходят
+# несколькими executemany вместо тысяч отдельных условных UPDATE.
+
+MAX_DAYS_AHEAD = 30
+BATCH_SIZE = 5000
+
+REJECT_UNAVAILABLE = 'Блюдо недоступно'
+REJECT_SOLD_OUT = 'Порции закончились'
+REJECT_NO_FUNDS = 'Недостаточно средств'
+REJECT_NO_SUBSCRIPTION = 'Нет действующего абонемента'
+
+
+def create_table(cursor):
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS preorders (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       user_id INTEGER NOT NULL,
+                       dish_id INTEGER NOT NULL,
+                       service_date DATE NOT NULL,
+                       meal_type TEXT NOT NULL,
+                       payment_type TEXT NOT NULL,
+                       status TEXT NOT NULL DEFAULT 'queued',
+                       reason TEXT,
+                       order_id INTEGER,
+                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       settled_at TIMESTAMP,
+                       FOREIGN KEY (user_id) REFERENCES users (id),
+                       FOREIGN KEY (dish_id) REFERENCES dishes (id)
+                   )
+                   ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_preorders_queue '
+                   'ON preorders (status, service_date, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_preorders_user_date ON preorders (user_id, service_date)')
+
+
+def parse_service_date(text):
+    """Дата выдачи ГГГГ-ММ-ДД: не в прошлом и не дальше MAX_DAYS_AHEAD дней"""
+    try:
+        service_date = date.fromisoformat(text)
+    except (TypeError, ValueError):
+        raise ReservationError('Неверная дата')
+    today = date.today()
+    if service_date < today or service_date > today + timedelta(days=MAX_DAYS_AHEAD):
+        raise ReservationError(f'Предзаказ возможен на ближайшие {MAX_DAYS_AHEAD} дней')
+    return service_date.isoformat()
+
+
+def place(cursor, user_id, dish_id, service_date, meal_type, payment_type):
+    cursor.execute('SELECT id FROM dishes WHERE id = ? AND is_available = 1', (dish_id,))
+    if not cursor.fetchone():
+        raise ReservationError('Блюдо недоступно', dish_id)
+    cursor.execute('''
+                   INSERT INTO preorders (user_id, dish_id, service_date, meal_type, payment_type)
+                   VALUES (?, ?, ?, ?, ?)
+                   ''', (user_id, dish_id, service_date, meal_type, payment_type))
+    return cursor.lastrowid
+
+
+def cancel(cursor, preorder_id, user_id):
+    """Отмена своего предзаказа, пока он в очереди"""
+    cursor.execute('''
+                   UPDATE preorders SET status = 'cancelled', settled_at = CURRENT_TIMESTAMP
+                   WHERE id = ? AND user_id = ? AND status = 'queued'
+                   ''', (preorder_id, user_id))
+    return cursor.rowcount == 1
+
+
+def _settle_batch(cursor, until, batch_size):
+    cursor.execute('''
+                   SELECT p.id, p.user_id, p.dish_id, p.meal_type, p.payment_type
+                   FROM preorders p
+                   WHERE p.status = 'queued' AND p.service_date <= ?
+                   ORDER BY p.service_date, p.created_at, p.id
+                   LIMIT ?
+                   ''', (until, batch_size))
+    queued = cursor.fetchall()
+    if not queued:
+        return None
+
+    dish_ids = list({preorder['dish_id'] for preorder in queued})
+    user_ids = list({preorder['user_id'] for preorder in queued})
+    cursor.execute(f'SELECT id, name, price, quantity, is_available FROM dishes '
+                   f'WHERE id IN ({", ".join("?" * len(dish_ids))})', dish_ids)
+    dishes = {dish['id']: dish for dish in cursor.fetchall()}
+    stock = {dish_id: dish['quantity'] if dish['is_available'] else 0 for dish_id, dish in dishes.items()}
+    cursor.execute(f'SELECT id, balance FROM users WHERE id IN ({", ".join("?" * len(user_ids))})', user_ids)
+    balances = {user['id']: user['balance'] for user in cursor.fetchall()}
+
+    # Транзакция держит блокировку записи: остатки и балансы в памяти
+    # совпадают с базой до самого commit
+    accepted = []
+    rejected = []
+    # Предзаказы по абонементу списывают порцию тем же условным UPDATE, что и обычный заказ
+    redeemed = {}
+    for preorder in queued:
+        dish = dishes.get(preorder['dish_id'])
+        if dish is None or not dish['is_available']:
+            rejected.append((REJECT_UNAVAILABLE, preorder['id']))
+        elif stock[dish['id']] < 1:
+            rejected.append((REJECT_SOLD_OUT, preorder['id']))
+        elif preorder['payment_type'] == subscriptions.PAYMENT_TYPE:
+            try:
+                redeemed[preorder['id']] = subscriptions.redeem(cursor, preorder['user_id'])
+            except ReservationError:
+                rejected.append((REJECT_NO_SUBSCRIPTION, preorder['id']))
+                continue
+            stock[dish['id']] -= 1
+            accepted.append(preorder)
+        elif balances.get(preorder['user_id'], 0.0) < dish['price']:
+            rejected.append((REJECT_NO_FUNDS, preorder['id']))
+        else:
+            stock[dish['id']] -= 1
+            balances[preorder['user_id']] -= dish['price']
+            accepted.append(preorder)
+
+    if accepted:
+        debits = {}
+        portions = {}
+        for preorder in accepted:
+            dish = dishes[preorder['dish_id']]
+            if preorder['id'] not in redeemed:
+                debits[preorder['user_id']] = debits.get(preorder['user_id'], 0.0) + dish['price']
+            portions[dish['id']] = portions.get(dish['id'], 0) + 1
+        cursor.executemany('UPDATE dishes SET quantity = quantity - ? WHERE id = ?',
+                           [(count, dish_id) for dish_id, count in portions.items()])
+        cursor.executemany('UPDATE users SET balance = balance - ? WHERE id = ?',
+                           [(amount, user_id) for user_id, amount in debits.items()])
+
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM orders')
+        last_id = cursor.fetchone()[0]
+        cursor.executemany('''
+                           INSERT INTO orders (user_id, dish_id, dish_name, price, meal_type, payment_type,
+                                               status, subscription_id)
+                           VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
+                           ''', [(preorder['user_id'], preorder['dish_id'], dishes[preorder['dish_id']]['name'],
+                                  dishes[preorder['dish_id']]['price'], preorder['meal_type'],
+                                  preorder['payment_type'], redeemed.get(preorder['id'])) for preorder in accepted])
+        # Под блокировкой записи новые id идут подряд в порядке вставки
+        cursor.execute('SELECT id FROM orders WHERE id > ? ORDER BY id', (last_id,))
+        order_ids = [row[0] for row in cursor.fetchall()]
+        ledger.record_order_payments(cursor, [
+            {'id': order_id, 'user_id': preorder['user_id'], 'price': dishes[preorder['dish_id']]['price'],
+             'dish_name': dishes[preorder['dish_id']]['name']}
+            for order_id, preorder in zip(order_ids, accepted) if preorder['id'] not in redeemed])
+
+        cursor.executemany('''
+                           UPDATE preorders SET status = 'settled', order_id = ?, settled_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                           ''', [(order_id, preorder['id']) for order_id, preorder in zip(order_ids, accepted)])
+        reports.record_order_created(cursor, sum(dishes[preorder['dish_id']]['price'] for preorder in accepted),
+                                     count=len(order_ids))
+        events.record(cursor, 'created', order_ids)
+
+    if rejected:
+        cursor.executemany('''
+                           UPDATE preorders SET status = 'rejected', reason = ?, settled_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                           ''', rejected)
+
+    return len(accepted), len(rejected), [preorder['user_id'] for preorder in accepted]
+
+
+def settle(db, until=None, batch_size=BATCH_SIZE):
+    """Расчёт очереди предзаказов на даты по until включительно (по умолчанию сегодня).
+
+    Возвращает (оформлено, отклонено, id учеников со списанием).
+    """
+    until = until or date.today().isoformat()
+    settled = rejected = 0
+    charged = set()
+    while True:
+        result = run_in_transaction(db, lambda cursor: _settle_batch(cursor, until, batch_size))
+        if result is None:
+            return settled, rejected, charged
+        settled += result[0]
+        rejected += result[1]
+        charged.update(result[2])
+
+
+if __name__ == '__main__':
+    # python preorders.py settle [путь к базе] [дата] — запускается по расписанию (cron)
+    if len(sys.argv) < 2 or sys.argv[1] != 'settle':
+        print('Использование: python preorders.py settle [school_cafe_full.db] [ГГГГ-ММ-ДД]')
+        sys.exit(1)
+
+    from db import connect
+
+    database = sys.argv[2] if len(sys.argv) > 2 else 'school_cafe_full.db'
+    conn = connect(database)
+    settled, rejected, _ = settle(conn, sys.argv[3] if len(sys.argv) > 3 else None)
+    conn.close()
+    print(f'✅ Предзаказы: оформлено {settled}, отклонено {rejected}')
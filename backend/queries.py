@@ -0,0 +1,142 @@
+import functools
+import json
+from json.encoder import encode_basestring
+
+
+# Именованные запросы. Строка запроса — один и тот же объект при каждом
+# вызове, поэтому sqlite3 берёт подготовленное выражение из кэша соединения
+# вместо повторного разбора SQL.
+STATEMENTS = {
+    'menu': 'SELECT * FROM dishes WHERE is_available = 1 ORDER BY category, price',
+    'menu_by_category': 'SELECT * FROM dishes WHERE category = ? AND is_available = 1 ORDER BY price',
+    'dishes_all': 'SELECT * FROM dishes ORDER BY category, name',
+    'dish_by_id': 'SELECT * FROM dishes WHERE id = ?',
+    # None в параметре оставляет столбец без изменений; calories можно и обнулить
+    'dish_update': '''
+                   UPDATE dishes
+                   SET name = COALESCE(:name, name),
+                       description = COALESCE(:description, description),
+                       category = COALESCE(:category, category),
+                       price = COALESCE(:price, price),
+                       ingredients = COALESCE(:ingredients, ingredients),
+                       allergens = COALESCE(:allergens, allergens),
+                       calories = CASE WHEN :set_calories THEN :calories ELSE calories END,
+                       quantity = COALESCE(:quantity, quantity),
+                       is_available = COALESCE(:is_available, is_available)
+                   WHERE id = :id
+                   ''',
+    'orders_student': '''
+                      SELECT * FROM orders
+                      WHERE user_id = ?
+                      ORDER BY order_date DESC, id DESC
+                      ''',
+    'orders_cook': '''
+                   SELECT o.*, u.full_name as user_name, u.class_name
+                   FROM orders o
+                            JOIN users u ON o.user_id = u.id
+                   WHERE o.status = 'pending'
+                   ORDER BY o.order_date ASC, o.id ASC
+                   ''',
+    'orders_admin': '''
+                    SELECT o.*, u.full_name as user_name, u.class_name
+                    FROM orders o
+                             JOIN users u ON o.user_id = u.id
+                    ORDER BY o.order_date DESC, o.id DESC
+                    ''',
+    'purchases_cook': '''
+                      SELECT pr.*, u.full_name as created_by_name
+                      FROM purchase_requests pr
+                               JOIN users u ON pr.created_by = u.id
+                      WHERE pr.created_by = ?
+                      ORDER BY pr.created_at DESC, pr.id DESC
+                      ''',
+    'purchases_admin': '''
+                       SELECT pr.*, u1.full_name as created_by_name, u2.full_name as processed_by_name
+                       FROM purchase_requests pr
+                                JOIN users u1 ON pr.created_by = u1.id
+                                LEFT JOIN users u2 ON pr.processed_by = u2.id
+                       WHERE pr.status != 'draft'
+                       ORDER BY pr.status, pr.created_at DESC, pr.id DESC
+                       ''',
+    'report_recent_orders': '''
+                            SELECT o.id, o.order_date, o.dish_name, o.price, o.status, o.meal_type,
+                                   o.payment_type, u.username, u.full_name, u.class_name
+                            FROM orders o
+                                     JOIN users u ON o.user_id = u.id
+                            ORDER BY o.order_date DESC
+                            LIMIT 100
+                            ''',
+    # Выданные заказы и расходы — из отчётных таблиц, как у страниц ?section=users|dishes
+    'report_users': '''
+                    SELECT u.id, u.username, u.full_name, u.role, u.class_name, u.balance, u.created_at,
+                           COALESCE(r.order_count, 0) as total_orders,
+                           COALESCE(r.total_spent, 0) as total_spent
+                    FROM users u
+                             LEFT JOIN report_user r ON r.user_id = u.id
+                    ORDER BY u.created_at DESC, u.id DESC
+                    ''',
+    'report_dishes': '''
+                     SELECT d.id, d.name, d.category, d.price, d.quantity, d.rating, d.rating_count,
+                            COALESCE(r.order_count, 0) as order_count,
+                            COALESCE(r.revenue, 0) as revenue
+                     FROM dishes d
+                              LEFT JOIN report_dish r ON r.dish_id = d.id
+                     ORDER BY order_count DESC, d.id
+                     ''',
+}
+
+
+def execute(conn, name, params=()):
+    return conn.execute(STATEMENTS[name], params)
+
+
+def fetch(conn, name, params=()):
+    """Строки запроса кортежами: (столбцы, строки) без sqlite3.Row на каждую строку"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(STATEMENTS[name], params)
+    rows = cursor.fetchall()
+    return tuple(column[0] for column in cursor.description), rows
+
+
+@functools.lru_cache(maxsize=256)
+def _row_template(columns):
+    # '{"id":%s,"name":%s,...}' — ключи кодируются один раз на набор столбцов
+    return '{' + ','.join(encode_basestring(column).replace('%', '%%') + ':%s'
+                          for column in columns) + '}'
+
+
+_ENCODERS = {str: encode_basestring, int: int.__repr__, float: float.__repr__}
+
+
+def _encode_value(value):
+    if value is None:
+        return 'null'
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _encode_column(values):
+    # В столбце SQLite обычно один тип: тогда весь столбец кодируется
+    # одним map() по C-функции, без вызова Python на каждое значение
+    types = set(map(type, values))
+    if len(types) == 1:
+        encoder = _ENCODERS.get(types.pop())
+        if encoder is not None:
+            return list(map(encoder, values))
+    return list(map(_encode_value, values))
+
+
+def rows_to_json(columns, rows):
+    """JSON-массив объектов (str) прямо из кортежей, без промежуточных dict"""
+    if not rows:
+        return '[]'
+    template = _row_template(columns)
+    encoded = [_encode_column(values) for values in zip(*rows)]
+    return '[' + ','.join([template % row for row in zip(*encoded)]) + ']'
+
+
+def fetch_json(conn, name, params=()):
+    return rows_to_json(*fetch(conn, name, params))
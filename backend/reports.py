@@ -0,0 +1,152 @@
+import sqlite3
+import sys
+
+
+# Агрегаты для /api/reports/summary. Обновляются в той же транзакции,
+# что и сам заказ, поэтому отчёт не сканирует таблицу orders.
+TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS report_daily (
+        date TEXT PRIMARY KEY,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0.0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS report_status (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS report_dish (
+        dish_id INTEGER PRIMARY KEY,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0.0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS report_user (
+        user_id INTEGER PRIMARY KEY,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        total_spent REAL NOT NULL DEFAULT 0.0
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_report_user_spent ON report_user (total_spent)',
+)
+
+
+def create_tables(cursor):
+    for ddl in TABLES:
+        cursor.execute(ddl)
+
+
+def _add_status(cursor, status, delta):
+    cursor.execute('''
+                   INSERT INTO report_status (status, count) VALUES (?, ?)
+                   ON CONFLICT(status) DO UPDATE SET count = count + excluded.count
+                   ''', (status, delta))
+
+
+def record_order_created(cursor, price, count=1):
+    """Новые заказы: счётчик pending и дневная статистика; price — их общая сумма"""
+    _add_status(cursor, 'pending', count)
+    cursor.execute('''
+                   INSERT INTO report_daily (date, order_count, revenue) VALUES (DATE('now'), ?, ?)
+                   ON CONFLICT(date) DO UPDATE SET order_count = order_count + excluded.order_count,
+                                                   revenue = revenue + excluded.revenue
+                   ''', (count, price))
+
+
+def record_order_served(cursor, order):
+    record_orders_served(cursor, [order])
+
+
+def record_orders_served(cursor, orders):
+    """Выдача заказов: выручка по блюдам и расходы учеников"""
+    dishes = {}
+    users = {}
+    for order in orders:
+        _add_status(cursor, order['status'], -1)
+        count, revenue = dishes.get(order['dish_id'], (0, 0.0))
+        dishes[order['dish_id']] = (count + 1, revenue + order['price'])
+        count, spent = users.get(order['user_id'], (0, 0.0))
+        users[order['user_id']] = (count + 1, spent + order['price'])
+    _add_status(cursor, 'served', len(orders))
+
+    cursor.executemany('''
+                       INSERT INTO report_dish (dish_id, order_count, revenue) VALUES (?, ?, ?)
+                       ON CONFLICT(dish_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+                                                          revenue = revenue + excluded.revenue
+                       ''', [(dish_id, count, revenue) for dish_id, (count, revenue) in dishes.items()])
+    cursor.executemany('''
+                       INSERT INTO report_user (user_id, order_count, total_spent) VALUES (?, ?, ?)
+                       ON CONFLICT(user_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+                                                          total_spent = total_spent + excluded.total_spent
+                       ''', [(user_id, count, spent) for user_id, (count, spent) in users.items()])
+
+
+def record_order_cancelled(cursor, order):
+    record_orders_cancelled(cursor, [order])
+
+
+def record_orders_cancelled(cursor, orders):
+    for order in orders:
+        _add_status(cursor, order['status'], -1)
+    _add_status(cursor, 'cancelled', len(orders))
+
+
+def populate(cursor):
+    """Пересчёт агрегатов по таблице orders; транзакцией управляет вызывающий"""
+    cursor.execute('DELETE FROM report_daily')
+    cursor.execute('DELETE FROM report_status')
+    cursor.execute('DELETE FROM report_dish')
+    cursor.execute('DELETE FROM report_user')
+
+    cursor.execute('''
+                   INSERT INTO report_daily (date, order_count, revenue)
+                   SELECT DATE(order_date), COUNT(*), SUM(price)
+                   FROM orders
+                   GROUP BY DATE(order_date)
+                   ''')
+    cursor.execute('''
+                   INSERT INTO report_status (status, count)
+                   SELECT status, COUNT(*)
+                   FROM orders
+                   GROUP BY status
+                   ''')
+    cursor.execute('''
+                   INSERT INTO report_dish (dish_id, order_count, revenue)
+                   SELECT dish_id, COUNT(*), SUM(price)
+                   FROM orders
+                   WHERE status = 'served'
+                   GROUP BY dish_id
+                   ''')
+    cursor.execute('''
+                   INSERT INTO report_user (user_id, order_count, total_spent)
+                   SELECT user_id, COUNT(*), SUM(price)
+                   FROM orders
+                   WHERE status = 'served'
+                   GROUP BY user_id
+                   ''')
+
+
+def rebuild(db):
+    """Полный пересчёт агрегатов по таблице orders"""
+    cursor = db.cursor()
+    create_tables(cursor)
+    populate(cursor)
+    db.commit()
+
+
+if __name__ == '__main__':
+    # python reports.py rebuild [путь к базе]
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('Использование: python reports.py rebuild [school_cafe_full.db]')
+        sys.exit(1)
+
+    database = sys.argv[2] if len(sys.argv) > 2 else 'school_cafe_full.db'
+    conn = sqlite3.connect(database)
+    rebuild(conn)
+    conn.close()
+    print(f'✅ Отчётные таблицы пересчитаны: {database}')
@@ -0,0 +1,191 @@
+import random
+import sqlite3
+import time
+
+import events
+import ledger
+import reports
+import subscriptions
+
+
+class ReservationError(Exception):
+    """Заказ нельзя оформить; текст исключения показывается пользователю"""
+
+    def __init__(self, message, dish_id=None):
+        super().__init__(message)
+        self.dish_id = dish_id
+
+
+def run_in_transaction(db, work, attempts=5):
+    """Выполняет work(cursor) в BEGIN IMMEDIATE с повтором при занятой базе.
+
+    busy_timeout уже ждёт освобождения блокировки; повтор нужен, когда
+    ожидание не помогло. ReservationError откатывает транзакцию без повтора.
+    """
+    cursor = db.cursor()
+    for attempt in range(attempts):
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            result = work(cursor)
+            db.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            db.rollback()
+            if ('locked' not in str(e) and 'busy' not in str(e)) or attempt == attempts - 1:
+                raise
+            time.sleep(0.01 * (2 ** attempt) * random.random())
+        except Exception:
+            db.rollback()
+            raise
+
+
+def reserve_dish(cursor, dish_id, quantity=1):
+    """Списание порций с условием: остаток не может уйти в минус"""
+    cursor.execute('''
+                   UPDATE dishes SET quantity = quantity - ?
+                   WHERE id = ? AND is_available = 1 AND quantity >= ?
+                   ''', (quantity, dish_id, quantity))
+    if cursor.rowcount != 1:
+        raise ReservationError('Блюдо недоступно', dish_id)
+
+
+def charge_balance(cursor, user_id, amount):
+    """Списание с баланса с условием: баланс не может стать отрицательным"""
+    cursor.execute('UPDATE users SET balance = balance - ? WHERE id = ? AND balance >= ?',
+                   (amount, user_id, amount))
+    if cursor.rowcount != 1:
+        raise ReservationError('Недостаточно средств')
+
+
+def place_orders(db, user_id, quantities, meal_type, payment_type):
+    """Оформление заказов {dish_id: количество} одной транзакцией.
+
+    С payment_type 'абонемент' порции списываются с абонемента, иначе
+    стоимость — с баланса. Возвращает (order_ids, total) или бросает
+    ReservationError.
+    """
+    def work(cursor):
+        placeholders = ', '.join('?' * len(quantities))
+        cursor.execute(f'SELECT id, name, price FROM dishes WHERE id IN ({placeholders})',
+                       list(quantities))
+        dishes = {dish['id']: dish for dish in cursor.fetchall()}
+
+        total = 0.0
+        for dish_id, quantity in quantities.items():
+            if dish_id not in dishes:
+                raise ReservationError('Блюдо недоступно', dish_id)
+            reserve_dish(cursor, dish_id, quantity)
+            total += dishes[dish_id]['price'] * quantity
+
+        subscription_id = None
+        if payment_type == subscriptions.PAYMENT_TYPE:
+            subscription_id = subscriptions.redeem(cursor, user_id, sum(quantities.values()))
+        else:
+            charge_balance(cursor, user_id, total)
+
+        order_ids = []
+        payments = []
+        for dish_id, quantity in quantities.items():
+            dish = dishes[dish_id]
+            for _ in range(quantity):
+                cursor.execute('''
+                               INSERT INTO orders (user_id, dish_id, dish_name, price, meal_type, payment_type,
+                                                   status, subscription_id)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                               ''', (user_id, dish_id, dish['name'], dish['price'], meal_type, payment_type,
+                                     'pending', subscription_id))
+                order_ids.append(cursor.lastrowid)
+                payments.append({'id': cursor.lastrowid, 'user_id': user_id, 'price': dish['price'],
+                                 'dish_name': dish['name']})
+
+        if subscription_id is None:
+            ledger.record_order_payments(cursor, payments)
+        reports.record_order_created(cursor, total, count=len(order_ids))
+        events.record(cursor, 'created', order_ids)
+        return order_ids, total
+
+    return run_in_transaction(db, work)
+
+
+def _load_orders(cursor, order_ids):
+    placeholders = ', '.join('?' * len(order_ids))
+    cursor.execute(f'SELECT * FROM orders WHERE id IN ({placeholders})', list(order_ids))
+    return {order['id']: order for order in cursor.fetchall()}
+
+
+def serve_orders(db, order_ids):
+    """Выдача нескольких заказов одной транзакцией.
+
+    Возвращает {order_id: 'served' | 'not_found' | 'not_pending'}.
+    """
+    def work(cursor):
+        orders = _load_orders(cursor, order_ids)
+        results = {}
+        served = []
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if not order:
+                results[order_id] = 'not_found'
+            elif order['status'] != 'pending':
+                results[order_id] = 'not_pending'
+            else:
+                results[order_id] = 'served'
+                served.append(order)
+
+        if served:
+            cursor.executemany('''
+                               UPDATE orders SET status = 'served', served_at = CURRENT_TIMESTAMP
+                               WHERE id = ? AND status = 'pending'
+                               ''', [(order['id'],) for order in served])
+            reports.record_orders_served(cursor, served)
+            events.record(cursor, 'served', [order['id'] for order in served])
+        return results, served
+
+    return run_in_transaction(db, work)
+
+
+def cancel_orders(db, order_ids, user):
+    """Отмена нескольких заказов с возвратом денег и порций одной транзакцией.
+
+    Ученик может отменить только свои заказы. Возвращает
+    ({order_id: 'cancelled' | 'not_found' | 'forbidden' | 'not_pending'}, отменённые).
+    """
+    def work(cursor):
+        orders = _load_orders(cursor, order_ids)
+        results = {}
+        cancelled = []
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if not order:
+                results[order_id] = 'not_found'
+            elif user['role'] == 0 and order['user_id'] != user['id']:
+                results[order_id] = 'forbidden'
+            elif order['status'] != 'pending':
+                results[order_id] = 'not_pending'
+            else:
+                results[order_id] = 'cancelled'
+                cancelled.append(order)
+
+        if cancelled:
+            refunds = {}
+            restock = {}
+            paid = [order for order in cancelled if order['subscription_id'] is None]
+            for order in paid:
+                refunds[order['user_id']] = refunds.get(order['user_id'], 0.0) + order['price']
+            for order in cancelled:
+                restock[order['dish_id']] = restock.get(order['dish_id'], 0) + 1
+
+            cursor.executemany("UPDATE orders SET status = 'cancelled' WHERE id = ? AND status = 'pending'",
+                               [(order['id'],) for order in cancelled])
+            # Заказы по абонементу возвращают порцию на абонемент, остальные — деньги
+            cursor.executemany('UPDATE users SET balance = balance + ? WHERE id = ?',
+                               [(amount, user_id) for user_id, amount in refunds.items()])
+            ledger.record_order_refunds(cursor, paid)
+            subscriptions.restore(cursor, [order for order in cancelled if order['subscription_id'] is not None])
+            cursor.executemany('UPDATE dishes SET quantity = quantity + ? WHERE id = ?',
+                               [(count, dish_id) for dish_id, count in restock.items()])
+            reports.record_orders_cancelled(cursor, cancelled)
+            events.record(cursor, 'cancelled', [order['id'] for order in cancelled])
+        return results, cancelled
+
+    return run_in_transaction(db, work)
@@ -0,0 +1,144 @@
+import sqlite3
+import sys
+
+from reservations import ReservationError
+
+
+# Отзывы учеников о блюдах. dishes.rating и dishes.rating_count ведутся
+# как скользящее среднее в той же транзакции, что и запись отзыва: меню
+# читает готовое значение, а AVG() по всем отзывам считает только
+# разовая команда recompute.
+
+MIN_RATING = 1
+MAX_RATING = 5
+
+
+def create_table(cursor):
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS reviews (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       user_id INTEGER NOT NULL,
+                       dish_id INTEGER NOT NULL,
+                       rating INTEGER NOT NULL,
+                       comment TEXT,
+                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       UNIQUE (user_id, dish_id),
+                       FOREIGN KEY (user_id) REFERENCES users (id),
+                       FOREIGN KEY (dish_id) REFERENCES dishes (id)
+                   )
+                   ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reviews_dish_created ON reviews (dish_id, created_at)')
+
+
+def parse_rating(value):
+    # 4.0 из JSON допустимо, 4.5 и True — нет
+    if isinstance(value, bool) or not isinstance(value, (int, float)) \
+            or not MIN_RATING <= value <= MAX_RATING or value != int(value):
+        raise ReservationError(f'Оценка должна быть целым числом от {MIN_RATING} до {MAX_RATING}')
+    return int(value)
+
+
+def submit(cursor, user_id, dish_id, rating, comment=None):
+    """Отзыв ученика о блюде; повторный отзыв заменяет прежний.
+
+    Вызывается внутри run_in_transaction: блокировка записи взята до
+    чтения прежней оценки. Возвращает (id отзыва, создан ли новый).
+    """
+    cursor.execute('SELECT id, rating FROM reviews WHERE user_id = ? AND dish_id = ?', (user_id, dish_id))
+    previous = cursor.fetchone()
+
+    if previous is None:
+        cursor.execute('''
+                       UPDATE dishes
+                       SET rating = (rating * rating_count + ?) / (rating_count + 1),
+                           rating_count = rating_count + 1
+                       WHERE id = ?
+                       ''', (rating, dish_id))
+        if cursor.rowcount == 0:
+            raise ReservationError('Блюдо не найдено', dish_id)
+        cursor.execute('INSERT INTO reviews (user_id, dish_id, rating, comment) VALUES (?, ?, ?, ?)',
+                       (user_id, dish_id, rating, comment))
+        return cursor.lastrowid, True
+
+    # Число оценок не меняется, среднее сдвигается на разницу
+    cursor.execute('''
+                   UPDATE dishes
+                   SET rating = rating + (? - ?) * 1.0 / MAX(rating_count, 1)
+                   WHERE id = ?
+                   ''', (rating, previous['rating'], dish_id))
+    cursor.execute('UPDATE reviews SET rating = ?, comment = ?, created_at = CURRENT_TIMESTAMP WHERE id = ?',
+                   (rating, comment, previous['id']))
+    return previous['id'], False
+
+
+def delete(cursor, review_id, user_id=None):
+    """Удаление отзыва (user_id=None — любого, для администратора). Возвращает dish_id или None."""
+    if user_id is None:
+        cursor.execute('DELETE FROM reviews WHERE id = ? RETURNING dish_id, rating', (review_id,))
+    else:
+        cursor.execute('DELETE FROM reviews WHERE id = ? AND user_id = ? RETURNING dish_id, rating',
+                       (review_id, user_id))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    cursor.execute('''
+                   UPDATE dishes
+                   SET rating = CASE WHEN rating_count > 1
+                                     THEN (rating * rating_count - ?) / (rating_count - 1)
+                                     ELSE 0.0 END,
+                       rating_count = MAX(rating_count - 1, 0)
+                   WHERE id = ?
+                   ''', (row['rating'], row['dish_id']))
+    return row['dish_id']
+
+
+def page(cursor, dish_id, limit, after=None):
+    """limit + 1 отзывов о блюде, новые первыми; after — (created_at, id) последнего показанного"""
+    query = '''
+            SELECT r.id, r.dish_id, r.user_id, u.full_name as user_name, r.rating, r.comment, r.created_at
+            FROM reviews r
+                     JOIN users u ON u.id = r.user_id
+            WHERE r.dish_id = ?
+            '''
+    params = [dish_id]
+    if after:
+        query += ' AND (r.created_at, r.id) < (?, ?)'
+        params.extend(after)
+    query += ' ORDER BY r.created_at DESC, r.id DESC LIMIT ?'
+    params.append(limit + 1)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def recompute(cursor):
+    """Пересчёт rating и rating_count всех блюд по таблице отзывов.
+
+    Блюда без отзывов получают 0: начальные оценки из init_db и
+    накопленная погрешность скользящего среднего отбрасываются.
+    """
+    cursor.execute('''
+                   UPDATE dishes
+                   SET rating = COALESCE(r.average, 0.0),
+                       rating_count = COALESCE(r.count, 0)
+                   FROM (SELECT d.id as dish_id, AVG(rv.rating) as average, COUNT(rv.id) as count
+                         FROM dishes d
+                                  LEFT JOIN reviews rv ON rv.dish_id = d.id
+                         GROUP BY d.id) r
+                   WHERE r.dish_id = dishes.id
+                   ''')
+    return cursor.rowcount
+
+
+if __name__ == '__main__':
+    # python reviews.py recompute [путь к базе] — разовая сверка рейтингов с отзывами
+    if len(sys.argv) < 2 or sys.argv[1] != 'recompute':
+        print('Использование: python reviews.py recompute [school_cafe_full.db]')
+        sys.exit(1)
+
+    database = sys.argv[2] if len(sys.argv) > 2 else 'school_cafe_full.db'
+    conn = sqlite3.connect(database)
+    count = recompute(conn.cursor())
+    conn.commit()
+    conn.close()
+    print(f'✅ Пересчитан рейтинг блюд: {count}')
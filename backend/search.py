@@ -0,0 +1,192 @@
+import bisect
+import multiprocessing
+import re
+import threading
+
+
+# Инвертированный индекс блюд в памяти процесса: слово -> {id блюда: вес}.
+# Аллергены приводятся к каноническим названиям, поэтому исключение
+# «моих аллергенов» — это вычитание множеств, а не поиск подстрок по строкам.
+
+FIELD_WEIGHTS = (('name', 3), ('ingredients', 2), ('category', 2), ('description', 1))
+
+# Разные написания одного аллергена в меню и в анкетах учеников
+ALLERGEN_ALIASES = {
+    'молоко': 'молоко', 'молочные продукты': 'молоко', 'молочное': 'молоко', 'лактоза': 'молоко',
+    'сливки': 'молоко', 'сыр': 'молоко', 'творог': 'молоко', 'масло сливочное': 'молоко',
+    'глютен': 'глютен', 'пшеница': 'глютен', 'мука': 'глютен', 'клейковина': 'глютен',
+    'яйца': 'яйца', 'яйцо': 'яйца',
+    'орехи': 'орехи', 'орех': 'орехи', 'арахис': 'орехи', 'фундук': 'орехи', 'миндаль': 'орехи',
+    'рыба': 'рыба', 'морепродукты': 'морепродукты', 'креветки': 'морепродукты',
+    'соя': 'соя', 'мед': 'мед', 'цитрусовые': 'цитрусовые', 'апельсин': 'цитрусовые',
+    'кунжут': 'кунжут', 'горчица': 'горчица', 'сельдерей': 'сельдерей',
+}
+KNOWN_ALLERGENS = frozenset(ALLERGEN_ALIASES.values())
+
+_WORD = re.compile(r'\w+')
+_LIST_SEPARATORS = re.compile(r'[,;/]|\s+и\s+')
+
+
+def _normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def tokenize(text):
+    return _WORD.findall(_normalize(text or ''))
+
+
+def normalize_allergens(text):
+    """'Молочные продукты, орехи' -> {'молоко', 'орехи'}"""
+    result = set()
+    for item in _LIST_SEPARATORS.split(_normalize(text or '')):
+        item = ' '.join(item.split())
+        if item and item not in ('нет', '-'):
+            result.add(ALLERGEN_ALIASES.get(item, item))
+    return result
+
+
+def dish_allergens(dish):
+    # Кроме явного списка учитываются известные аллергены в составе
+    allergens = normalize_allergens(dish['allergens'])
+    allergens |= normalize_allergens(dish['ingredients']) & KNOWN_ALLERGENS
+    return allergens
+
+
+class DishIndex:
+    """Поиск блюд по названию, составу и описанию с фильтром по аллергенам.
+
+    Изменения блюд в этом процессе применяются к индексу точечно
+    (update_dish / remove_dish). После share_between_processes() версия
+    индекса лежит в общей памяти: воркер, увидевший чужое изменение,
+    перестраивает индекс из базы целиком.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._vocabulary = []
+        self._dishes = {}
+        self._allergens = {}
+        self._loaded = False
+        self._seen = 0
+        self._shared = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._dishes)
+
+    def share_between_processes(self):
+        self._shared = multiprocessing.RawValue('q', 0)
+        self._shared_lock = multiprocessing.Lock()
+
+    def ensure_loaded(self, conn):
+        if self._loaded and (self._shared is None or self._shared.value == self._seen):
+            return
+        with self._lock:
+            seen = self._shared.value if self._shared is not None else 0
+            if not self._loaded or seen != self._seen:
+                self._load(conn)
+                self._seen = seen
+
+    def _load(self, conn):
+        self._postings = {}
+        self._dishes = {}
+        self._allergens = {}
+        for dish in conn.execute('SELECT * FROM dishes'):
+            self._add(dict(dish))
+        self._vocabulary = sorted(self._postings)
+        self._loaded = True
+
+    def _add(self, dish):
+        dish_id = dish['id']
+        self._dishes[dish_id] = dish
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(dish[field]):
+                postings = self._postings.setdefault(token, {})
+                postings[dish_id] = postings.get(dish_id, 0) + weight
+        for allergen in dish_allergens(dish):
+            self._allergens.setdefault(allergen, set()).add(dish_id)
+
+    def _discard(self, dish_id):
+        dish = self._dishes.pop(dish_id, None)
+        if dish is None:
+            return
+        for field, _ in FIELD_WEIGHTS:
+            for token in tokenize(dish[field]):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(dish_id, None)
+                    if not postings:
+                        del self._postings[token]
+        for allergen in dish_allergens(dish):
+            self._allergens.get(allergen, set()).discard(dish_id)
+
+    def _bump(self):
+        if self._shared is None:
+            return
+        with self._shared_lock:
+            # Если версию успел поднять другой воркер, его изменение мы не видели
+            if self._shared.value != self._seen:
+                self._loaded = False
+            self._shared.value += 1
+            self._seen = self._shared.value
+
+    def update_dish(self, conn, dish_id):
+        """Перечитать одно блюдо из базы после изменения"""
+        row = conn.execute('SELECT * FROM dishes WHERE id = ?', (dish_id,)).fetchone()
+        with self._lock:
+            if self._loaded:
+                self._discard(dish_id)
+                if row is not None:
+                    self._add(dict(row))
+                self._vocabulary = sorted(self._postings)
+            self._bump()
+
+    def remove_dish(self, dish_id):
+        with self._lock:
+            if self._loaded:
+                self._discard(dish_id)
+                self._vocabulary = sorted(self._postings)
+            self._bump()
+
+    def _match_term(self, term):
+        # Префиксный поиск: «котл» находит «котлета», «котлеты»
+        scores = {}
+        vocabulary = self._vocabulary
+        for position in range(bisect.bisect_left(vocabulary, term), len(vocabulary)):
+            token = vocabulary[position]
+            if not token.startswith(term):
+                break
+            for dish_id, weight in self._postings[token].items():
+                if scores.get(dish_id, 0) < weight:
+                    scores[dish_id] = weight
+        return scores
+
+    def search(self, query='', category=None, exclude_allergens=(), available_only=True, limit=50):
+        """id блюд по убыванию релевантности"""
+        with self._lock:
+            terms = tokenize(query)
+            if terms:
+                scores = None
+                for term in terms:
+                    matched = self._match_term(term)
+                    if scores is None:
+                        scores = matched
+                    else:
+                        scores = {dish_id: score + matched[dish_id]
+                                  for dish_id, score in scores.items() if dish_id in matched}
+                    if not scores:
+                        return []
+            else:
+                scores = dict.fromkeys(self._dishes, 0)
+
+            excluded = set()
+            for allergen in exclude_allergens:
+                excluded |= self._allergens.get(allergen, set())
+
+            dishes = self._dishes
+            candidates = [dish_id for dish_id in scores.keys() - excluded
+                          if (not available_only or dishes[dish_id]['is_available'])
+                          and (not category or dishes[dish_id]['category'] == category)]
+            candidates.sort(key=lambda dish_id: (-scores[dish_id], dishes[dish_id]['category'] or '',
+                                                 dishes[dish_id]['price'], dish_id))
+            return candidates[:limit]
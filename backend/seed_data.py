@@ -0,0 +1,188 @@
+"""Генератор синтетической школы для нагрузочного тестирования.
+
+    cd backend
+    python seed_data.py --database bench.db --students 3000 --orders 1000000
+
+Создаёт учеников по классам, меню, заказы за указанный период (только
+учебные дни, пики на завтраке и обеде) и заявки на закупку. Данные
+вставляются пачками через executemany, после чего пересчитываются
+отчётные таблицы.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import subscriptions
+
+CATEGORIES = {
+    'завтрак': (['Каша', 'Омлет', 'Сырники', 'Блины', 'Запеканка', 'Оладьи'], (60, 160)),
+    'обед': (['Суп', 'Плов', 'Котлета', 'Паста', 'Рагу', 'Гуляш', 'Рыба'], (100, 250)),
+    'напиток': (['Компот', 'Чай', 'Какао', 'Морс', 'Сок'], (20, 60)),
+    'полдник': (['Булочка', 'Йогурт', 'Печенье', 'Фрукты'], (30, 90)),
+}
+ADJECTIVES = ['домашний', 'школьный', 'классический', 'фирменный', 'летний', 'осенний',
+              'с овощами', 'с курицей', 'с сыром', 'с ягодами', 'по-деревенски']
+ALLERGENS = ['молоко', 'глютен', 'яйца', 'орехи', 'рыба', 'соя', None, None, None]
+LETTERS = 'АБВГ'
+BATCH = 50000
+
+
+def school_days(days):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    result = []
+    for offset in range(days, 0, -1):
+        day = today - timedelta(days=offset)
+        if day.weekday() < 5:
+            result.append(day)
+    return result or [today]
+
+
+def order_time(rng, day, meal_type):
+    # Пики: завтрак около 9:00, обед около 13:00
+    center, spread = (9 * 60, 20) if meal_type == 'завтрак' else (13 * 60, 35)
+    minute = int(min(max(rng.gauss(center, spread), 7 * 60 + 30), 16 * 60))
+    return (day + timedelta(minutes=minute, seconds=rng.randrange(60))).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate(conn, students, dishes, orders, purchases, days, seed, password_hash):
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+
+    classes = [f'{grade}{letter}' for grade in range(1, 12) for letter in LETTERS]
+    users = [(f'gen_student{i}', password_hash, f'Ученик {i}', 0, rng.choice(classes),
+              round(rng.uniform(0, 3000), 2), rng.choice(ALLERGENS), None, None, None)
+             for i in range(students)]
+    users += [(f'gen_cook{i}', password_hash, f'Повар {i}', 1, None, 0.0, None, None, None, None)
+              for i in range(max(students // 500, 2))]
+    users.append(('gen_admin', password_hash, 'Администратор', 2, None, 0.0, None, None, None, None))
+    cursor.executemany('''
+                       INSERT INTO users (username, password_hash, full_name, role, class_name, balance,
+                                          allergies, dietary_preferences, email, phone)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ''', users)
+
+    menu = []
+    for i in range(dishes):
+        category = rng.choice(list(CATEGORIES))
+        names, (low, high) = CATEGORIES[category]
+        name = f'{rng.choice(names)} {rng.choice(ADJECTIVES)} №{i}'
+        menu.append((name, f'Описание блюда {name}', category, float(rng.randrange(low, high, 5)),
+                     f'ингредиент{rng.randrange(50)}, ингредиент{rng.randrange(50)}',
+                     rng.choice(ALLERGENS), rng.randrange(50, 600), 1, rng.randrange(0, 500),
+                     round(rng.uniform(3, 5), 1), rng.randrange(0, 200)))
+    cursor.executemany('''
+                       INSERT INTO dishes (name, description, category, price, ingredients, allergens,
+                                           calories, is_available, quantity, rating, rating_count)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ''', menu)
+
+    cursor.execute('SELECT id FROM users WHERE role = 0 AND username LIKE ?', ('gen_student%',))
+    student_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT id FROM users WHERE role = 1 AND username LIKE ?', ('gen_cook%',))
+    cook_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT id, name, price, category FROM dishes')
+    dish_rows = cursor.fetchall()
+
+    calendar = school_days(days)
+    last_day = calendar[-1]
+
+    # Примерно у трети учеников действующий абонемент, купленный до начала учёта
+    today = datetime.now().date()
+    plans = subscriptions.PLANS
+    cursor.executemany('''
+                       INSERT INTO subscriptions (user_id, plan, start_date, end_date, meals_left, total_meals, price)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ''', [(user_id, plan['code'], today.isoformat(),
+                              (today + timedelta(days=plan['days'] - 1)).isoformat(),
+                              plan['meals'], plan['meals'], plan['price'])
+                             for user_id in student_ids if rng.random() < 0.3
+                             for plan in [rng.choice(plans)]])
+    batch = []
+    for _ in range(orders):
+        dish_id, name, price, category = rng.choice(dish_rows)
+        meal_type = 'завтрак' if category == 'завтрак' else 'обед'
+        day = rng.choice(calendar)
+        ordered_at = order_time(rng, day, meal_type)
+        if day == last_day and rng.random() < 0.3:
+            status, served_at = 'pending', None
+        elif rng.random() < 0.06:
+            status, served_at = 'cancelled', None
+        else:
+            status, served_at = 'served', ordered_at
+        payment_type = 'абонемент' if rng.random() < 0.2 else 'разовый'
+        batch.append((rng.choice(student_ids), dish_id, name, price, meal_type, payment_type,
+                      status, ordered_at, served_at))
+        if len(batch) >= BATCH:
+            _insert_orders(cursor, batch)
+            batch = []
+    if batch:
+        _insert_orders(cursor, batch)
+
+    requests = []
+    for _ in range(purchases):
+        dish_id, name, _, _ = rng.choice(dish_rows)
+        day = rng.choice(calendar)
+        status = rng.choice(['approved', 'approved', 'rejected', 'pending'])
+        created = (day + timedelta(hours=rng.randrange(7, 17), minutes=rng.randrange(60))).strftime('%Y-%m-%d %H:%M:%S')
+        requests.append((rng.choice(cook_ids), dish_id, name, rng.randrange(5, 100), 'Пополнение запаса',
+                         status, created))
+    cursor.executemany('''
+                       INSERT INTO purchase_requests (created_by, dish_id, dish_name, quantity, reason, status, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ''', requests)
+    conn.commit()
+
+
+def _insert_orders(cursor, batch):
+    cursor.executemany('''
+                       INSERT INTO orders (user_id, dish_id, dish_name, price, meal_type, payment_type,
+                                           status, order_date, served_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ''', batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация тестовых данных школьной столовой')
+    parser.add_argument('--database', default='bench.db')
+    parser.add_argument('--students', type=int, default=3000)
+    parser.add_argument('--dishes', type=int, default=300)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--purchases', type=int, default=20000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Схема и миграции — те же, что у сервера
+    os.environ['CAFE_DATABASE'] = args.database
+    import ledger
+    import passwords
+    import reports
+    import working_server
+    working_server.init_db()
+    working_server.pool.close_all()
+
+    started = time.time()
+    conn = sqlite3.connect(args.database)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    # Один хэш на всех: scrypt для миллиона пользователей считался бы часами
+    password_hash = passwords.hash_password('password123')
+    generate(conn, args.students, args.dishes, args.orders, args.purchases, args.days, args.seed,
+             password_hash)
+    reports.rebuild(conn)
+    # Сгенерированные балансы становятся начальными строками журнала
+    ledger.open_accounts(conn.cursor())
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+    print(f'✅ {args.database}: {args.students} учеников, {args.dishes} блюд, '
+          f'{args.orders} заказов, {args.purchases} заявок за {time.time() - started:.1f} с')
+    print('   Пароль всех сгенерированных пользователей: password123')
+
+
+if __name__ == '__main__':
+    main()
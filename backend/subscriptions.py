@@ -0,0 +1,119 @@
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import ledger
+import reservations
+
+
+# Абонемент — оплаченный заранее набор обедов на период. При заказе с
+# payment_type 'абонемент' списывается не баланс, а одна порция meals_left:
+# условный UPDATE по частичному индексу активных абонементов, без чтения
+# и без сканирования дат. Истёкшие абонементы выключает пакетная задача
+# expire(), поэтому в индексе остаются только действующие.
+
+PAYMENT_TYPE = 'абонемент'
+
+PLANS = [
+    {'code': 'week', 'name': 'Неделя обедов', 'meals': 5, 'days': 7, 'price': 700.0},
+    {'code': 'month', 'name': 'Месяц обедов', 'meals': 20, 'days': 31, 'price': 2600.0},
+    {'code': 'month_full', 'name': 'Месяц: завтрак и обед', 'meals': 40, 'days': 31, 'price': 4800.0},
+]
+PLANS_BY_CODE = {plan['code']: plan for plan in PLANS}
+
+
+def create_table(cursor):
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS subscriptions (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       user_id INTEGER NOT NULL,
+                       plan TEXT NOT NULL,
+                       start_date DATE NOT NULL,
+                       end_date DATE NOT NULL,
+                       meals_left INTEGER NOT NULL,
+                       total_meals INTEGER NOT NULL,
+                       price REAL NOT NULL,
+                       is_active INTEGER NOT NULL DEFAULT 1,
+                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       FOREIGN KEY (user_id) REFERENCES users (id)
+                   )
+                   ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_active '
+                   'ON subscriptions (user_id, end_date) WHERE is_active = 1')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions (user_id, created_at)')
+
+
+def purchase(cursor, user_id, plan_code):
+    """Покупка абонемента с баланса. Возвращает id абонемента."""
+    plan = PLANS_BY_CODE.get(plan_code)
+    if plan is None:
+        raise reservations.ReservationError('Неизвестный абонемент')
+
+    reservations.charge_balance(cursor, user_id, plan['price'])
+    start = date.today()
+    cursor.execute('''
+                   INSERT INTO subscriptions (user_id, plan, start_date, end_date, meals_left, total_meals, price)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ''', (user_id, plan['code'], start.isoformat(),
+                         (start + timedelta(days=plan['days'] - 1)).isoformat(),
+                         plan['meals'], plan['meals'], plan['price']))
+    subscription_id = cursor.lastrowid
+    ledger.record(cursor, user_id, -plan['price'], 'subscription', f'Абонемент «{plan["name"]}»')
+    return subscription_id
+
+
+def redeem(cursor, user_id, meals=1):
+    """Списание порций с абонемента, который закончится раньше других. Возвращает его id."""
+    # end_date >= сегодня страхует промежуток между истечением и ночным expire();
+    # это диапазон по тому же частичному индексу, а не перебор строк
+    cursor.execute('''
+                   UPDATE subscriptions
+                   SET meals_left = meals_left - ?1,
+                       is_active = meals_left - ?1 > 0
+                   WHERE id = (SELECT id FROM subscriptions
+                               WHERE user_id = ?2 AND is_active = 1 AND end_date >= DATE('now', 'localtime')
+                                 AND meals_left >= ?1
+                               ORDER BY end_date
+                               LIMIT 1)
+                   RETURNING id
+                   ''', (meals, user_id))
+    row = cursor.fetchone()
+    if row is None:
+        raise reservations.ReservationError('Нет действующего абонемента')
+    return row[0]
+
+
+def restore(cursor, orders):
+    """Возврат порций при отмене заказов, оплаченных абонементом"""
+    counts = {}
+    for order in orders:
+        counts[order['subscription_id']] = counts.get(order['subscription_id'], 0) + 1
+    cursor.executemany('''
+                       UPDATE subscriptions
+                       SET meals_left = meals_left + ?,
+                           is_active = end_date >= DATE('now', 'localtime')
+                       WHERE id = ?
+                       ''', [(count, subscription_id) for subscription_id, count in counts.items()])
+
+
+def expire(cursor):
+    """Пакетное выключение истёкших и израсходованных абонементов"""
+    cursor.execute('''
+                   UPDATE subscriptions SET is_active = 0
+                   WHERE is_active = 1 AND (end_date < DATE('now', 'localtime') OR meals_left <= 0)
+                   ''')
+    return cursor.rowcount
+
+
+if __name__ == '__main__':
+    # python subscriptions.py expire [путь к базе] — запускается по расписанию (cron)
+    if len(sys.argv) < 2 or sys.argv[1] != 'expire':
+        print('Использование: python subscriptions.py expire [school_cafe_full.db]')
+        sys.exit(1)
+
+    database = sys.argv[2] if len(sys.argv) > 2 else 'school_cafe_full.db'
+    conn = sqlite3.connect(database)
+    count = expire(conn.cursor())
+    conn.commit()
+    conn.close()
+    print(f'✅ Выключено абонементов: {count}')
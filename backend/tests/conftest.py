@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+# Модули бэкенда лежат плоско в backend/ и импортируются по имени
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    """working_server на временной базе со схемой, миграциями и начальными данными"""
+    # Настройки читаются при импорте, поэтому окружение задаётся до него
+    os.environ['CAFE_DATABASE'] = str(tmp_path_factory.mktemp('db') / 'school_cafe.db')
+    os.environ['CAFE_HASH_WORKERS'] = '0'
+    os.environ['CAFE_SCRYPT_N'] = '1024'
+    os.environ['CAFE_LOG_LEVEL'] = 'OFF'
+    import working_server
+
+    working_server.init_db()
+    yield working_server
+    working_server.pool.close_all()
+
+
+@pytest.fixture
+def db(server):
+    conn = server.pool.acquire()
+    yield conn
+    server.pool.release(conn)
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def auth(server, db):
+    """Заголовок Authorization для пользователя с указанным логином"""
+    from auth import issue_token
+
+    def header(username):
+        user = db.execute('SELECT id, username, role FROM users WHERE username = ?', (username,)).fetchone()
+        token = issue_token(user, server.app.config['SECRET_KEY'], server.app.config['TOKEN_TTL'])
+        return {'Authorization': f'Bearer {token}'}
+    return header
+
+
+@pytest.fixture
+def statements():
+    """SQL-запросы, выполненные за время теста: список (sql, params)"""
+    import db as db_module
+
+    executed = []
+    previous = db_module._query_observer
+    db_module.set_query_observer(lambda sql, params, seconds: executed.append((sql, params)))
+    yield executed
+    db_module.set_query_observer(previous)
@@ -0,0 +1,27 @@
+import multiprocessing
+
+import pytest
+
+from auth import UserCache
+
+
+def test_stale_read_is_not_cached():
+    cache = UserCache()
+    generation = cache.generation(1)
+    # Пока строка читалась из базы, баланс изменили
+    cache.invalidate(1)
+    cache.put(1, {'balance': 1000.0}, generation)
+    assert cache.get(1) is None
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='нужен fork')
+def test_invalidate_reaches_other_processes():
+    cache = UserCache()
+    cache.share_between_processes()
+    cache.put(1, {'balance': 1000.0}, cache.generation(1))
+
+    # Другой воркер пополняет баланс
+    worker = multiprocessing.get_context('fork').Process(target=cache.invalidate, args=(1,))
+    worker.start()
+    worker.join()
+    assert cache.get(1) is None
@@ -0,0 +1,30 @@
+import gzip
+
+
+def test_menu_is_compressed_once_per_version(client, server, monkeypatch):
+    calls = []
+    encode = server.compressor.encode
+
+    def counting_encode(body, encoding):
+        calls.append(encoding)
+        return encode(body, encoding)
+
+    monkeypatch.setattr(server.compressor, 'encode', counting_encode)
+    server.menu_cache.invalidate()
+
+    plain = client.get('/api/menu')
+    assert 'Content-Encoding' not in plain.headers and len(plain.data) >= server.compressor.min_size
+
+    for _ in range(3):
+        response = client.get('/api/menu', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == plain.data
+    assert calls == ['gzip']
+
+    # Слабый ETag сжатого ответа подходит для If-None-Match
+    cached = client.get('/api/menu', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+    server.menu_cache.invalidate()
+    client.get('/api/menu', headers={'Accept-Encoding': 'gzip'})
+    assert calls == ['gzip', 'gzip']
@@ -0,0 +1,45 @@
+import logging
+
+import pytest
+
+from metrics import Metrics
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def slow_queries(monkeypatch):
+    """Metrics с порогом 0 мс и записи его журнала медленных запросов"""
+    log = logging.getLogger('cafe.metrics')
+    handler = Collect()
+    monkeypatch.setattr(log, 'handlers', [handler])
+    monkeypatch.setattr(log, 'propagate', False)
+    level = log.level
+    log.setLevel(logging.WARNING)
+    yield Metrics(slow_query_ms=0), handler.records
+    log.setLevel(level)
+
+
+def test_slow_query_log_hides_users_params(slow_queries):
+    metrics, records = slow_queries
+    metrics.observe_query('UPDATE users SET password_hash = ? WHERE id = ?', ('scrypt$secret', 7), 0.5)
+    metrics.observe_query('SELECT * FROM orders WHERE id = ?', (7,), 0.5)
+
+    assert [record.params for record in records] == ['<скрыто: 2>', (7,)]
+
+
+def test_metrics_are_for_admin_or_scraper(client, auth, server, monkeypatch):
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers=auth('cook1')).status_code == 403
+    assert client.get('/api/metrics', headers=auth('admin1')).status_code == 200
+
+    monkeypatch.setitem(server.app.config, 'METRICS_TOKEN', 'scrape-me')
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-you'}).status_code == 401
@@ -0,0 +1,54 @@
+import pytest
+
+import migrations
+import queries
+
+
+# Запросы горячих обработчиков: каждая таблица читается через индекс или первичный ключ
+HOT_QUERIES = [
+    ('get_menu', queries.STATEMENTS['menu'], ()),
+    ('get_menu?category', queries.STATEMENTS['menu_by_category'], ('обед',)),
+    ('get_my_orders ученик', queries.STATEMENTS['orders_student'], (1,)),
+    ('get_my_orders повар', queries.STATEMENTS['orders_cook'], ()),
+    ('get_my_orders администратор', queries.STATEMENTS['orders_admin'], ()),
+    ('manage_single_dish DELETE',
+     'SELECT COUNT(*) FROM orders WHERE dish_id = ? AND status = "pending"', (1,)),
+    ('get_purchases повар', queries.STATEMENTS['purchases_cook'], (3,)),
+    ('get_purchases администратор', queries.STATEMENTS['purchases_admin'], ()),
+]
+
+
+def query_plan(db, sql, params=()):
+    return [row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def full_scans(plan):
+    # «SCAN t» без USING — проход по всей таблице; SCAN/SEARCH ... USING INDEX допустимы
+    return [detail for detail in plan if detail.startswith(('SCAN', 'SEARCH')) and 'USING' not in detail]
+
+
+@pytest.mark.parametrize('name, sql, params', HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_queries_use_indexes(db, name, sql, params):
+    plan = query_plan(db, sql, params)
+    assert not full_scans(plan), plan
+
+
+def test_schema_is_at_latest_version(db):
+    assert migrations.current_version(db.cursor()) == migrations.MIGRATIONS[-1][0]
+    db.commit()
+
+
+def test_migrate_rechecks_version_under_lock(db, monkeypatch):
+    # Второй процесс прочитал версию до того, как первый применил миграции:
+    # под блокировкой записи он видит актуальную версию и ничего не повторяет
+    # (иначе шаг 7 упал бы на повторном ALTER TABLE ... ADD COLUMN)
+    real_current_version = migrations.current_version
+    calls = []
+
+    def stale_then_real(cursor):
+        calls.append(cursor)
+        return 0 if len(calls) == 1 else real_current_version(cursor)
+
+    monkeypatch.setattr(migrations, 'current_version', stale_then_real)
+    assert migrations.migrate(db) == []
+    assert not db.in_transaction
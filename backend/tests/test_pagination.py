@@ -0,0 +1,81 @@
+import pytest
+
+from pagination import encode_cursor
+
+
+@pytest.fixture(scope='module')
+def purchase_requests(server):
+    # Заявки всех статусов с одинаковым created_at, чтобы порядок решал id
+    conn = server.pool.acquire()
+    cook = conn.execute("SELECT id FROM users WHERE username = 'cook1'").fetchone()['id']
+    conn.executemany('''
+                     INSERT INTO purchase_requests (created_by, dish_name, quantity, status, created_at)
+                     VALUES (?, ?, 1, ?, '2026-01-01 10:00:00')
+                     ''', [(cook, f'Заявка {number}', status)
+                           for number, status in enumerate(['approved', 'draft', 'pending', 'rejected'] * 5)])
+    conn.commit()
+    server.pool.release(conn)
+
+
+def walk(client, url, headers, limit, **params):
+    items, cursor = [], None
+    while True:
+        query = dict(params, limit=limit, **({'cursor': cursor} if cursor else {}))
+        page = client.get(url, query_string=query, headers=headers).get_json()
+        items.extend(page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            return items
+
+
+@pytest.mark.parametrize('limit', [1, 3, 7, 50])
+def test_admin_purchase_pages_match_full_list(client, auth, purchase_requests, limit):
+    headers = auth('admin1')
+    full = client.get('/api/purchases', headers=headers).get_json()
+    pages = walk(client, '/api/purchases', headers, limit)
+    assert [item['id'] for item in pages] == [item['id'] for item in full]
+    assert all(item['status'] != 'draft' for item in pages)
+
+
+def query_plans(db, executed, table):
+    return [[row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params or ())]
+            for sql, params in executed if sql.lstrip().upper().startswith('SELECT') and table in sql]
+
+
+def test_admin_purchase_page_is_index_range(client, auth, db, purchase_requests, statements):
+    headers = auth('admin1')
+    first = client.get('/api/purchases', query_string={'limit': 3}, headers=headers).get_json()
+    client.get('/api/purchases', query_string={'limit': 3, 'cursor': first['next_cursor']}, headers=headers)
+
+    first_plan, next_plan = query_plans(db, statements, 'purchase_requests')
+    # Первая страница читается в порядке индекса и останавливается на limit
+    assert not any('TEMP B-TREE' in detail for detail in first_plan), first_plan
+    # Следующие — два диапазона индекса, без прохода по всей таблице
+    scans = [detail for detail in next_plan if 'purchase_requests' in detail]
+    assert scans and all(detail.startswith('SEARCH') for detail in scans), next_plan
+
+
+@pytest.mark.parametrize('section', ['users', 'dishes'])
+def test_report_sections_do_not_read_order_history(client, auth, statements, section):
+    response = client.get('/api/reports/detailed', query_string={'section': section, 'limit': 2},
+                          headers=auth('admin1'))
+    assert response.status_code == 200
+    assert not any(' orders ' in f' {sql} ' for sql, _ in statements)
+
+
+@pytest.mark.parametrize('url, user, section, cursor', [
+    ('/api/dishes/1/reviews', None, None, []),
+    ('/api/orders/my', 'student1', None, ['2026-01-01 10:00:00']),
+    ('/api/purchases', 'cook1', None, ['2026-01-01 10:00:00', 1, 2]),
+    ('/api/purchases', 'admin1', None, ['2026-01-01 10:00:00', 1]),
+    ('/api/reports/detailed', 'admin1', 'users', [1, '2026-01-01 10:00:00']),
+    ('/api/reports/detailed', 'admin1', 'dishes', []),
+    ('/api/reports/detailed', 'admin1', 'orders', ['2026-01-01 10:00:00', True]),
+])
+def test_malformed_cursor_is_rejected(client, auth, url, user, section, cursor):
+    headers = auth(user) if user else {}
+    params = {'section': section} if section else {}
+    for value in (encode_cursor(cursor), 'не base64'):
+        response = client.get(url, query_string=dict(params, cursor=value), headers=headers)
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Неверный курсор'}
@@ -0,0 +1,33 @@
+def test_summary_skips_draft_purchase_requests(client, auth, db):
+    headers = auth('admin1')
+    before = client.get('/api/reports/summary', headers=headers).get_json()
+
+    cook_id = db.execute("SELECT id FROM users WHERE username = 'cook1'").fetchone()[0]
+    db.execute('''
+               INSERT INTO purchase_requests (created_by, dish_name, quantity, reason, status)
+               VALUES (?, 'Гречка', 10, 'Прогноз', 'draft')
+               ''', (cook_id,))
+    db.commit()
+
+    after = client.get('/api/reports/summary', headers=headers).get_json()
+    assert after['summary']['total_requests'] == before['summary']['total_requests']
+    assert 'draft' not in after['purchase_requests']['by_status']
+    assert sum(after['purchase_requests']['by_status'].values()) == after['summary']['total_requests']
+
+
+def test_detailed_report_counts_match_between_full_and_paged(client, auth, db):
+    # Заказы во всех статусах: выданный, отменённый и ожидающий
+    student = auth('student1')
+    dish_id = db.execute('SELECT id FROM dishes WHERE is_available = 1 AND quantity > 2').fetchone()[0]
+    order_ids = [client.post('/api/orders', json={'dish_id': dish_id}, headers=student).get_json()['order_id']
+                 for _ in range(3)]
+    assert client.post(f'/api/orders/{order_ids[0]}/serve', headers=auth('cook1')).status_code == 200
+    assert client.post(f'/api/orders/{order_ids[1]}/cancel', headers=student).status_code == 200
+
+    headers = auth('admin1')
+    full = client.get('/api/reports/detailed', headers=headers).get_json()
+    for section, count_field, money_field in (('users', 'total_orders', 'total_spent'),
+                                              ('dishes', 'order_count', 'revenue')):
+        paged = client.get(f'/api/reports/detailed?section={section}&limit=200', headers=headers).get_json()
+        assert {row['id']: (row[count_field], row[money_field]) for row in paged['items']} == \
+               {row['id']: (row[count_field], row[money_field]) for row in full[section]}
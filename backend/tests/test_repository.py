@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+
+# Число SQL-запросов (без PRAGMA нового соединения) на один HTTP-запрос
+# администратора; рост числа означает N+1 в обработчике
+ADMIN_STATEMENTS = [
+    ('/api/purchases', 1),
+    ('/api/purchases?limit=5', 1),
+    ('/api/orders/my?limit=5', 1),
+    ('/api/dishes', 1),
+    ('/api/reports/detailed', 3),
+    ('/api/reports/detailed?section=orders&limit=5', 1),
+    ('/api/reports/detailed?section=users&limit=5', 1),
+    ('/api/reports/detailed?section=dishes&limit=5', 1),
+    ('/api/reports/summary', 11),
+]
+
+
+@pytest.fixture(scope='module')
+def history(server):
+    """Заявки с разными авторами и обработавшими и заказы разных учеников"""
+    conn = server.pool.acquire()
+    users = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+    dish_id = conn.execute('SELECT id FROM dishes ORDER BY id LIMIT 1').fetchone()[0]
+    conn.executemany('''
+                     INSERT INTO purchase_requests (created_by, dish_name, quantity, reason, status, processed_by)
+                     VALUES (?, 'Мука', 1, 'запас', ?, ?)
+                     ''', [(users[i % len(users)], status, users[(i + 1) % len(users)] if status != 'pending' else None)
+                           for i, status in enumerate(['pending', 'approved', 'rejected'] * 4)])
+    conn.executemany('''
+                     INSERT INTO orders (user_id, dish_id, dish_name, price, status)
+                     VALUES (?, ?, 'Каша', 50, 'served')
+                     ''', [(users[i % len(users)], dish_id) for i in range(12)])
+    conn.commit()
+    server.pool.release(conn)
+
+
+@pytest.mark.parametrize('url, expected', ADMIN_STATEMENTS)
+def test_admin_statement_counts(client, auth, statements, history, url, expected):
+    headers = auth('admin1')
+    # Первое обращение может открыть соединение; считается второе
+    client.get(url, headers=headers)
+    statements.clear()
+    assert client.get(url, headers=headers).status_code == 200
+    assert len([sql for sql, _ in statements if not sql.startswith('PRAGMA')]) == expected
+
+
+def test_repository_matches_sql(client, auth, server, history, monkeypatch):
+    headers = auth('admin1')
+    urls = ['/api/purchases', '/api/reports/detailed?section=orders&limit=5']
+    through_models = [json.loads(client.get(url, headers=headers).data) for url in urls]
+    cursor = through_models[1]['next_cursor']
+    second_page = json.loads(client.get(urls[1] + f'&cursor={cursor}', headers=headers).data)
+
+    monkeypatch.setattr(server, 'repository', None)
+    through_sql = [json.loads(client.get(url, headers=headers).data) for url in urls]
+    for body in through_models[1:] + through_sql[1:]:
+        body.pop('generated_at')
+    assert through_models == through_sql
+    assert second_page['items'] == json.loads(
+        client.get(urls[1] + f'&cursor={cursor}', headers=headers).data)['items']
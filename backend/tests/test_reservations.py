@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+import ledger
+from auth import issue_token
+
+
+THREADS = 200
+ORDERS_PER_THREAD = 5
+PRICE = 40.0
+BALANCE = 100.0
+
+
+@pytest.fixture
+def crowd(server, db):
+    """Блюдо с заданным остатком и THREADS учеников с балансом BALANCE"""
+    def make(stock, name):
+        cursor = db.cursor()
+        cursor.execute('''
+                       INSERT INTO dishes (name, category, price, is_available, quantity)
+                       VALUES (?, 'обед', ?, 1, ?)
+                       ''', (name, PRICE, stock))
+        dish_id = cursor.lastrowid
+        cursor.executemany('''
+                           INSERT INTO users (username, password_hash, full_name, role, class_name, balance)
+                           VALUES (?, 'x', 'Ученик', 0, '5А', ?)
+                           ''', [(f'{name}-{number}', BALANCE) for number in range(THREADS)])
+        ledger.open_accounts(cursor)
+        db.commit()
+        users = db.execute('SELECT id, username, role FROM users WHERE username LIKE ?', (f'{name}-%',)).fetchall()
+        tokens = [issue_token(user, server.app.config['SECRET_KEY'], 3600) for user in users]
+        return dish_id, tokens
+    return make
+
+
+def order_storm(server, dish_id, tokens):
+    """Каждый поток шлёт ORDERS_PER_THREAD пакетных заказов; возвращает (коды ответов, заказов/с)"""
+    codes = {}
+    lock = threading.Lock()
+    start = threading.Barrier(len(tokens))
+
+    def student(token):
+        client = server.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        start.wait()
+        for _ in range(ORDERS_PER_THREAD):
+            response = client.post('/api/orders/batch', json={'items': [{'dish_id': dish_id}]}, headers=headers)
+            with lock:
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=student, args=(token,)) for token in tokens]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return codes, sum(codes.values()) / elapsed
+
+
+def test_last_portions_are_not_oversold(server, db, crowd):
+    dish_id, tokens = crowd(stock=50, name='stress-stock')
+    codes, rate = order_storm(server, dish_id, tokens)
+    print(f'\n{THREADS * ORDERS_PER_THREAD} заказов на 50 порций: {codes}, {rate:.0f} запросов/с')
+
+    assert codes == {200: 50, 400: THREADS * ORDERS_PER_THREAD - 50}
+    assert db.execute('SELECT quantity FROM dishes WHERE id = ?', (dish_id,)).fetchone()[0] == 0
+    assert db.execute('SELECT COUNT(*) FROM orders WHERE dish_id = ?', (dish_id,)).fetchone()[0] == 50
+    assert db.execute("SELECT MIN(balance) FROM users WHERE username LIKE 'stress-stock-%'").fetchone()[0] >= 0
+
+
+def test_balances_never_go_negative(server, db, crowd):
+    # Порций хватает на всех, ограничивает баланс: каждый может оплатить два заказа
+    dish_id, tokens = crowd(stock=THREADS * ORDERS_PER_THREAD, name='stress-balance')
+    codes, rate = order_storm(server, dish_id, tokens)
+    print(f'\n{THREADS * ORDERS_PER_THREAD} заказов при балансе на 2: {codes}, {rate:.0f} запросов/с')
+
+    affordable = int(BALANCE // PRICE)
+    assert codes[200] == THREADS * affordable
+    balances = db.execute("SELECT MIN(balance), MAX(balance) FROM users WHERE username LIKE 'stress-balance-%'")
+    assert tuple(balances.fetchone()) == (BALANCE - affordable * PRICE,) * 2
+    remaining = db.execute('SELECT quantity FROM dishes WHERE id = ?', (dish_id,)).fetchone()[0]
+    assert remaining == THREADS * (ORDERS_PER_THREAD - affordable)
+    assert not ledger.find_mismatches(db.cursor())
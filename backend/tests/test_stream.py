@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def stream_slots(server, monkeypatch):
+    monkeypatch.setattr(server, 'stream_slots', threading.BoundedSemaphore(1))
+    return server.stream_slots
+
+
+def ticket(client, headers):
+    response = client.post('/api/orders/stream/ticket', headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_only_kitchen_and_admin_get_tickets(client, auth):
+    assert ticket(client, auth('student1'))[0] == 403
+    status, body = ticket(client, auth('cook1'))
+    assert status == 200 and body['expires_in'] == 60
+
+
+def test_stream_accepts_ticket_but_not_bearer_token_in_url(client, auth, stream_slots):
+    headers = auth('cook1')
+    bearer = headers['Authorization'][7:]
+    assert client.get('/api/orders/stream', query_string={'token': bearer}).status_code == 403
+    assert client.get('/api/orders/stream', query_string={'ticket': bearer}).status_code == 403
+
+    response = client.get('/api/orders/stream', query_string={'ticket': ticket(client, headers)[1]['ticket']})
+    assert response.status_code == 200
+    response.close()
+
+
+def test_ticket_is_not_a_bearer_token(client, auth):
+    stream_ticket = ticket(client, auth('cook1'))[1]['ticket']
+    response = client.get('/api/orders/my', headers={'Authorization': f'Bearer {stream_ticket}'})
+    assert response.status_code == 401
+
+
+def test_streams_are_capped_per_process(client, auth, stream_slots):
+    headers = auth('cook1')
+    first = client.get('/api/orders/stream', headers=headers)
+    assert first.status_code == 200
+    assert client.get('/api/orders/stream', headers=headers).status_code == 503
+
+    # Закрытие ответа освобождает место, даже если генератор не запускался
+    first.close()
+    second = client.get('/api/orders/stream', headers=headers)
+    assert second.status_code == 200
+    second.close()
@@ -1,11 +1,56 @@
 from flask import Flask, jsonify, request, make_response, g
 from flask_cors import CORS
-import sqlite3
-import hashlib
+import hmac
+import os
+import queue
+import threading
 from datetime import datetime
 
+import events
+import export
+import forecast
+import ledger
+import migrations
+import passwords
+import preorders
+import queries
+import reports
+import reservations
+import reviews
+import search
+import subscriptions
+from auth import UserCache, issue_token, verify_token
+from compression import Compressor
+from logs import logger, setup_logging
+from db import ConnectionPool
+from json_provider import FastJSONProvider
+from menu_cache import MenuCache
+from metrics import Metrics
+from pagination import DEFAULT_LIMIT, InvalidCursor, get_page_args, make_page
+from passwords import HasherBusy, PasswordHasher
+
+try:
+    # Редкие админские выборки идут через модели; без SQLAlchemy — прежним SQL
+    import models
+    from models import repository
+except ImportError:
+    models = repository = None
+
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'school-cafe-secret-key-2024'
+app.json = FastJSONProvider(app)
+# Ключ подписи токенов. Встроенный ключ опубликован вместе с кодом и годится
+# только для разработки: wsgi.create_app без SECRET_KEY не запускается
+DEV_SECRET_KEY = 'school-cafe-secret-key-2024'
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or DEV_SECRET_KEY
+app.config['TOKEN_TTL'] = 12 * 60 * 60
+app.config['USER_CACHE_TTL'] = 30
+# Билет для EventSource живёт минуту: он попадает в URL и журнал доступа
+app.config['STREAM_TICKET_TTL'] = 60
+# Открытых потоков событий на процесс; каждый занимает поток воркера
+app.config['MAX_STREAMS'] = int(os.environ.get('CAFE_MAX_STREAMS', 16))
+# Процессы для scrypt; 0 — считать прямо в потоке запроса. Под gunicorn по
+# умолчанию ядра делятся между воркерами (gunicorn.conf.py)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('CAFE_HASH_WORKERS', os.cpu_count() or 2))
 CORS(app,
      resources={r"/api/*": {"origins": ["http://localhost:8000", "http://127.0.0.1:8000"]}},
      supports_credentials=True,
@@ -13,20 +58,55 @@ CORS(app,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 
-DATABASE = 'school_cafe_full.db'
+DATABASE = os.environ.get('CAFE_DATABASE', 'school_cafe_full.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('CAFE_DB_POOL_SIZE', 8))
+# Ответы больше этого размера сжимаются gzip/brotli; 0 — не сжимать
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('CAFE_COMPRESS_MIN_SIZE', 1024))
+# Порог журнала медленных запросов, мс; не задан — журнал выключен
+app.config['SLOW_QUERY_MS'] = float(os.environ['CAFE_SLOW_QUERY_MS']) if os.environ.get('CAFE_SLOW_QUERY_MS') else None
+# /api/metrics открыт администратору и сборщику метрик с этим токеном
+app.config['METRICS_TOKEN'] = os.environ.get('CAFE_METRICS_TOKEN')
+
+pool = ConnectionPool(DATABASE, max_size=app.config['DB_POOL_SIZE'])
+orm_engine = models.make_engine(DATABASE, pool_size=app.config['DB_POOL_SIZE']) if models else None
+user_cache = UserCache(ttl=app.config['USER_CACHE_TTL'])
+menu_cache = MenuCache()
+dish_index = search.DishIndex()
+hasher = PasswordHasher(app.config['PASSWORD_HASH_WORKERS'])
+order_events = events.OrderEventBus(DATABASE)
+stream_slots = threading.BoundedSemaphore(app.config['MAX_STREAMS'])
+metrics = Metrics(slow_query_ms=app.config['SLOW_QUERY_MS'])
+metrics.init_app(app)
+setup_logging(app, os.environ.get('CAFE_LOG_LEVEL', 'INFO'))
+compressor = Compressor(min_size=app.config['COMPRESS_MIN_SIZE']) if app.config['COMPRESS_MIN_SIZE'] > 0 else None
+if compressor is not None:
+    compressor.init_app(app)
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = pool.acquire()
     return db
 
+def get_session():
+    """Сессия ORM на время запроса для models.repository"""
+    session = getattr(g, '_session', None)
+    if session is None:
+        session = g._session = models.Session(bind=orm_engine)
+    return session
+
+def json_response(body, status=200):
+    """Ответ из готового JSON (queries.rows_to_json), минуя jsonify"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        pool.release(db)
+    session = g.pop('_session', None)
+    if session is not None:
+        session.close()
 
 def init_db():
     with app.app_context():
@@ -104,8 +184,7 @@ def init_db():
 
         cursor.execute('SELECT COUNT(*) FROM users')
         if cursor.fetchone()[0] == 0:
-            def hash_pw(pwd):
-                return hashlib.sha256(pwd.encode()).hexdigest()
+            hash_pw = passwords.hash_password
 
             users = [
                 ('student1', hash_pw('password123'), 'Иванов Иван', 0, '10А', 1000.0, 'орехи, молоко', 'вегетарианец', 'ivan@school.ru', '+79161234567'),
@@ -144,34 +223,38 @@ def init_db():
 
         db.commit()
 
+        migrations.migrate(db)
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return hasher.hash(password)
 
-def get_user_from_token():
-    """Получение пользователя из токена"""
+def get_token_claims():
+    """Данные пользователя из подписанного токена (id, username, role) без запроса к БД"""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         return None
 
-    try:
-        token = auth_header.split(' ')[1]
-        parts = token.split('-')
-
-        if len(parts) >= 2:
-            username = parts[1]
-
-            db = get_db()
-            cursor = db.cursor()
-            cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-            user = cursor.fetchone()
-
-            if user:
-                return user
+    return verify_token(auth_header[7:], app.config['SECRET_KEY'])
 
-        return None
-    except:
+def get_user_from_token():
+    """Получение пользователя из токена"""
+    claims = get_token_claims()
+    if not claims:
         return None
 
+    user = user_cache.get(claims['id'])
+    if user is None:
+        generation = user_cache.generation(claims['id'])
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute('SELECT * FROM users WHERE id = ?', (claims['id'],))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        user = dict(row)
+        user_cache.put(user['id'], user, generation)
+    return user
+
 
 @app.route('/api/auth/register', methods=['POST', 'OPTIONS'])
 def register():
@@ -186,7 +269,7 @@ def register():
         role = data.get('role', 0)
         class_name = data.get('class_name', '').strip()
 
-        print(f"📝 Регистрация: username={username}, full_name={full_name}, role={role}")
+        logger.info("Регистрация", extra={'username': username, 'full_name': full_name, 'role': role})
 
         if not username or not password or not full_name:
             return jsonify({'error': 'Заполните все обязательные поля'}), 400
@@ -213,7 +296,7 @@ def register():
         cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
         user = cursor.fetchone()
 
-        token = f'token-{user["username"]}-{datetime.now().timestamp()}'
+        token = issue_token(user, app.config['SECRET_KEY'], app.config['TOKEN_TTL'])
 
         return jsonify({
             'success': True,
@@ -229,10 +312,10 @@ def register():
             }
         }), 201
 
+    except HasherBusy:
+        return jsonify({'error': 'Сервер перегружен, повторите попытку'}), 503
     except Exception as e:
-        print(f"🔥 Ошибка регистрации: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Ошибка регистрации")
         return jsonify({'error': 'Ошибка регистрации'}), 500
 
 
@@ -257,10 +340,17 @@ def login():
         if not user:
             return jsonify({'error': 'Неверный логин или пароль'}), 401
 
-        if user['password_hash'] != hash_password(password):
+        password_ok, new_hash = hasher.check(password, user['password_hash'])
+        if not password_ok:
             return jsonify({'error': 'Неверный логин или пароль'}), 401
 
-        token = f'token-{user["username"]}-{datetime.now().timestamp()}'
+        # Хэш старого формата (SHA-256) или с устаревшей стоимостью
+        if new_hash:
+            cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, user['id']))
+            db.commit()
+            user_cache.invalidate(user['id'])
+
+        token = issue_token(user, app.config['SECRET_KEY'], app.config['TOKEN_TTL'])
 
         return jsonify({
             'success': True,
@@ -280,8 +370,10 @@ def login():
             }
         })
 
+    except HasherBusy:
+        return jsonify({'error': 'Сервер перегружен, повторите попытку'}), 503
     except Exception as e:
-        print(f"Ошибка входа: {e}")
+        logger.exception("Ошибка входа")
         return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
 @app.route('/api/user/profile', methods=['GET', 'OPTIONS'])
@@ -309,7 +401,7 @@ def get_profile():
         })
 
     except Exception as e:
-        print(f"Ошибка получения профиля: {e}")
+        logger.exception("Ошибка получения профиля")
         return jsonify({'error': 'Ошибка получения профиля'}), 500
 
 @app.route('/api/menu', methods=['GET', 'OPTIONS'])
@@ -320,22 +412,70 @@ def get_menu():
     try:
         category = request.args.get('category')
 
-        db = get_db()
-        cursor = db.cursor()
+        def load_menu():
+            db = get_db()
+            if category:
+                return queries.fetch_json(db, 'menu_by_category', (category,)).encode()
+            return queries.fetch_json(db, 'menu').encode()
+
+        key = category or ''
+        etag, body = menu_cache.get(key, load_menu)
+
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+
+        # Сжатое меню тоже берётся из кэша, а не сжимается на каждый запрос
+        if compressor is not None and response.status_code == 200:
+            response.vary.add('Accept-Encoding')
+            encoding = compressor.encoding_for(body)
+            if encoding is not None:
+                encoded = menu_cache.get_encoded(key, etag, encoding, lambda: compressor.encode(body, encoding))
+                compressor.apply(response, encoded, encoding)
+        return response
 
-        if category:
-            cursor.execute('SELECT * FROM dishes WHERE category = ? AND is_available = 1 ORDER BY price', (category,))
-        else:
-            cursor.execute('SELECT * FROM dishes WHERE is_available = 1 ORDER BY category, price')
+    except Exception as e:
+        logger.exception("Ошибка получения меню")
+        return jsonify({'error': 'Ошибка получения меню'}), 500
 
-        dishes = cursor.fetchall()
 
-        return jsonify([dict(dish) for dish in dishes])
 
-    except Exception as e:
-        print(f"Ошибка получения меню: {e}")
-        return jsonify({'error': 'Ошибка получения меню'}), 500
+@app.route('/api/menu/search', methods=['GET', 'OPTIONS'])
+def search_menu():
+    """Поиск блюд: ?q=&category=&exclude=молоко,орехи&exclude_my=1&limit="""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        excluded = search.normalize_allergens(request.args.get('exclude'))
 
+        # exclude_my=1 — исключить аллергены из профиля ученика
+        if request.args.get('exclude_my') == '1':
+            user = get_user_from_token()
+            if not user:
+                return jsonify({'error': 'Неавторизован'}), 401
+            excluded |= search.normalize_allergens(user['allergies'])
+
+        db = get_db()
+        dish_index.ensure_loaded(db)
+        dish_ids = dish_index.search(request.args.get('q', ''), request.args.get('category'),
+                                     excluded, limit=limit)
+        if not dish_ids:
+            return jsonify([])
+
+        # Остатки меняются с каждым заказом, поэтому строки берутся из базы
+        placeholders = ', '.join('?' * len(dish_ids))
+        rows = {row['id']: row for row in db.execute(
+            f'SELECT * FROM dishes WHERE id IN ({placeholders}) AND is_available = 1', dish_ids)}
+        return jsonify([rows[dish_id] for dish_id in dish_ids if dish_id in rows])
+
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка поиска блюд")
+        return jsonify({'error': 'Ошибка поиска блюд'}), 500
 
 
 @app.route('/api/dishes', methods=['GET', 'POST', 'OPTIONS'])
@@ -344,7 +484,7 @@ def manage_dishes():
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user:
             return jsonify({'error': 'Неавторизован'}), 401
 
@@ -353,12 +493,7 @@ def manage_dishes():
             if user['role'] != 2:
                 return jsonify({'error': 'Недостаточно прав'}), 403
 
-            db = get_db()
-            cursor = db.cursor()
-            cursor.execute('SELECT * FROM dishes ORDER BY category, name')
-            dishes = cursor.fetchall()
-
-            return jsonify([dict(dish) for dish in dishes])
+            return json_response(queries.fetch_json(get_db(), 'dishes_all'))
 
         # POST - добавление нового блюда
         elif request.method == 'POST':
@@ -403,11 +538,13 @@ def manage_dishes():
 
             dish_id = cursor.lastrowid
             db.commit()
+            menu_cache.invalidate()
+            dish_index.update_dish(db, dish_id)
 
             cursor.execute('SELECT * FROM dishes WHERE id = ?', (dish_id,))
             dish = cursor.fetchone()
 
-            print(f"✅ Администратор {user['username']} добавил блюдо: {name}")
+            logger.info("Добавлено блюдо", extra={'admin': user['username'], 'dish': name})
 
             return jsonify({
                 'success': True,
@@ -418,7 +555,7 @@ def manage_dishes():
     except ValueError as e:
         return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"Ошибка управления блюдами: {e}")
+        logger.exception("Ошибка управления блюдами")
         return jsonify({'error': 'Ошибка управления блюдами'}), 500
 
 @app.route('/api/dishes/<int:dish_id>', methods=['PUT', 'DELETE', 'OPTIONS'])
@@ -427,7 +564,7 @@ def manage_single_dish(dish_id):
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только администратор может управлять блюдами'}), 403
 
@@ -443,8 +580,8 @@ def manage_single_dish(dish_id):
         if request.method == 'PUT':
             data = request.get_json()
 
-            updates = []
-            values = []
+            fields = {column: None for column in ('name', 'description', 'category', 'price',
+                                                  'ingredients', 'allergens', 'quantity', 'is_available')}
 
             if 'name' in data:
                 new_name = data['name'].strip()
@@ -454,56 +591,36 @@ def manage_single_dish(dish_id):
                                    (new_name, dish_id))
                     if cursor.fetchone():
                         return jsonify({'error': 'Блюдо с таким названием уже существует'}), 400
-                    updates.append('name = ?')
-                    values.append(new_name)
-
-            if 'description' in data:
-                updates.append('description = ?')
-                values.append(data['description'].strip())
+                    fields['name'] = new_name
 
-            if 'category' in data:
-                updates.append('category = ?')
-                values.append(data['category'].strip())
+            for column in ('description', 'category', 'ingredients', 'allergens'):
+                if column in data:
+                    fields[column] = data[column].strip()
 
             if 'price' in data:
                 price = float(data['price'])
                 if price <= 0:
                     return jsonify({'error': 'Цена должна быть положительной'}), 400
-                updates.append('price = ?')
-                values.append(price)
-
-            if 'ingredients' in data:
-                updates.append('ingredients = ?')
-                values.append(data['ingredients'].strip())
-
-            if 'allergens' in data:
-                updates.append('allergens = ?')
-                values.append(data['allergens'].strip())
-
-            if 'calories' in data:
-                updates.append('calories = ?')
-                values.append(data['calories'])
+                fields['price'] = price
 
             if 'quantity' in data:
                 quantity = int(data['quantity'])
                 if quantity < 0:
                     return jsonify({'error': 'Количество не может быть отрицательным'}), 400
-                updates.append('quantity = ?')
-                updates.append('is_available = ?')
-                values.append(quantity)
-                values.append(1 if quantity > 0 else 0)
+                fields['quantity'] = quantity
+                fields['is_available'] = 1 if quantity > 0 else 0
 
             if 'is_available' in data:
-                updates.append('is_available = ?')
-                values.append(1 if data['is_available'] else 0)
+                fields['is_available'] = 1 if data['is_available'] else 0
 
-            if not updates:
+            if all(value is None for value in fields.values()) and 'calories' not in data:
                 return jsonify({'error': 'Нет данных для обновления'}), 400
 
-            values.append(dish_id)
-            update_query = f'UPDATE dishes SET {", ".join(updates)} WHERE id = ?'
-            cursor.execute(update_query, values)
+            fields.update(id=dish_id, set_calories='calories' in data, calories=data.get('calories'))
+            queries.execute(db, 'dish_update', fields)
             db.commit()
+            menu_cache.invalidate()
+            dish_index.update_dish(db, dish_id)
 
             cursor.execute('SELECT * FROM dishes WHERE id = ?', (dish_id,))
             updated_dish = cursor.fetchone()
@@ -525,10 +642,13 @@ def manage_single_dish(dish_id):
                     'suggestion': 'Сначала отмените заказы или отметьте блюдо как недоступное'
                 }), 400
 
+            cursor.execute('DELETE FROM reviews WHERE dish_id = ?', (dish_id,))
             cursor.execute('DELETE FROM dishes WHERE id = ?', (dish_id,))
             db.commit()
+            menu_cache.invalidate()
+            dish_index.remove_dish(dish_id)
 
-            print(f"🗑️ Администратор {user['username']} удалил блюдо: {dish['name']}")
+            logger.info("Удалено блюдо", extra={'admin': user['username'], 'dish': dish['name']})
 
             return jsonify({
                 'success': True,
@@ -538,7 +658,7 @@ def manage_single_dish(dish_id):
     except ValueError as e:
         return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"Ошибка управления блюдом: {e}")
+        logger.exception("Ошибка управления блюдом")
         return jsonify({'error': 'Ошибка управления блюдом'}), 500
 
 @app.route('/api/dishes/<int:dish_id>/toggle', methods=['POST', 'OPTIONS'])
@@ -548,7 +668,7 @@ def toggle_dish_availability(dish_id):
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только администратор может управлять блюдами'}), 403
 
@@ -566,6 +686,8 @@ def toggle_dish_availability(dish_id):
         cursor.execute('UPDATE dishes SET is_available = ? WHERE id = ?',
                        (new_status, dish_id))
         db.commit()
+        menu_cache.invalidate()
+        dish_index.update_dish(db, dish_id)
 
         status_text = "доступно" if new_status else "недоступно"
 
@@ -576,79 +698,189 @@ def toggle_dish_availability(dish_id):
         })
 
     except Exception as e:
-        print(f"Ошибка переключения доступности: {e}")
+        logger.exception("Ошибка переключения доступности")
         return jsonify({'error': 'Ошибка переключения доступности'}), 500
 
 
+@app.route('/api/dishes/<int:dish_id>/reviews', methods=['GET', 'POST', 'OPTIONS'])
+def dish_reviews(dish_id):
+    """Отзывы о блюде: GET ?limit=&cursor= — новые первыми, POST — оценка ученика"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        db = get_db()
+
+        if request.method == 'GET':
+            limit, after = get_page_args(request.args, shape=(str, int)) or (DEFAULT_LIMIT, None)
+            rows = reviews.page(db.cursor(), dish_id, limit, after)
+            return jsonify(make_page(rows, limit, lambda r: (r['created_at'], r['id'])))
+
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        if user['role'] != 0:
+            return jsonify({'error': 'Только ученики могут оставлять отзывы'}), 403
+
+        data = request.get_json()
+        comment = (data.get('comment') or '').strip() or None
+        try:
+            rating = reviews.parse_rating(data.get('rating'))
+            review_id, created = reservations.run_in_transaction(
+                db, lambda cursor: reviews.submit(cursor, user['id'], dish_id, rating, comment))
+        except reservations.ReservationError as e:
+            return jsonify({'error': str(e)}), 400
+        # Рейтинг входит в закэшированные ответы меню
+        menu_cache.invalidate()
+
+        return jsonify({
+            'success': True,
+            'review_id': review_id,
+            'message': 'Отзыв добавлен' if created else 'Отзыв обновлён'
+        }), 201 if created else 200
+
+    except InvalidCursor:
+        return jsonify({'error': 'Неверный курсор'}), 400
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка работы с отзывами")
+        return jsonify({'error': 'Ошибка работы с отзывами'}), 500
+
+@app.route('/api/reviews/<int:review_id>', methods=['DELETE', 'OPTIONS'])
+def delete_review(review_id):
+    """Удаление своего отзыва; администратор может удалить любой"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        db = get_db()
+        owner = None if user['role'] == 2 else user['id']
+        dish_id = reservations.run_in_transaction(db, lambda cursor: reviews.delete(cursor, review_id, owner))
+        if dish_id is None:
+            return jsonify({'error': 'Отзыв не найден'}), 404
+        menu_cache.invalidate()
+
+        return jsonify({'success': True, 'message': 'Отзыв удалён'})
+
+    except Exception as e:
+        logger.exception("Ошибка удаления отзыва")
+        return jsonify({'error': 'Ошибка удаления отзыва'}), 500
+
 @app.route('/api/orders', methods=['POST', 'OPTIONS'])
 def create_order():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
     try:
-        print("=" * 50)
-        print("📦 ЗАПРОС НА СОЗДАНИЕ ЗАКАЗА")
-
-        user = get_user_from_token()
-        print("Пользователь из токена:", user['username'] if user else 'Нет пользователя')
+        user = get_token_claims()
 
         if not user:
-            print("❌ Ошибка: Неавторизован")
             return jsonify({'error': 'Неавторизован'}), 401
 
         if user['role'] != 0:
-            print(f"❌ Ошибка: Роль {user['role']} не может создавать заказы")
             return jsonify({'error': 'Только ученики могут создавать заказы'}), 403
 
         data = request.get_json()
-        print("Данные заказа:", data)
+        logger.debug("Запрос на создание заказа", extra={'user': user['username'], 'data': data})
 
         dish_id = data.get('dish_id')
         meal_type = data.get('meal_type', 'обед')
         payment_type = data.get('payment_type', 'разовый')
 
         if not dish_id:
-            print("❌ Ошибка: Нет dish_id")
             return jsonify({'error': 'Укажите блюдо'}), 400
 
         db = get_db()
-        cursor = db.cursor()
 
-        cursor.execute('SELECT * FROM dishes WHERE id = ? AND is_available = 1 AND quantity > 0', (dish_id,))
-        dish = cursor.fetchone()
+        # Остаток и баланс проверяются условными UPDATE внутри одной транзакции
+        try:
+            order_ids, _ = reservations.place_orders(db, user['id'], {int(dish_id): 1}, meal_type, payment_type)
+        except reservations.ReservationError as e:
+            logger.info("Заказ отклонён", extra={'user': user['username'], 'reason': str(e)})
+            return jsonify({'error': str(e)}), 400
 
-        if not dish:
-            print("❌ Ошибка: Блюдо недоступно")
-            return jsonify({'error': 'Блюдо недоступно'}), 400
+        order_id = order_ids[0]
+        user_cache.invalidate(user['id'])
+        menu_cache.invalidate()
 
-        if user['balance'] < dish['price']:
-            print(f"❌ Ошибка: Недостаточно средств. Баланс: {user['balance']}, Цена: {dish['price']}")
-            return jsonify({'error': 'Недостаточно средств'}), 400
+        logger.info("Заказ создан", extra={'user': user['username'], 'order_id': order_id})
+        return jsonify({
+            'success': True,
+            'order_id': order_id,
+            'message': 'Заказ создан успешно'
+        })
 
-        cursor.execute('''
-                       INSERT INTO orders (user_id, dish_id, dish_name, price, meal_type, payment_type, status)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)
-                       ''', (user['id'], dish_id, dish['name'], dish['price'], meal_type, payment_type, 'pending'))
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка создания заказа")
+        return jsonify({'error': 'Ошибка создания заказа'}), 500
 
-        order_id = cursor.lastrowid
+@app.route('/api/orders/batch', methods=['POST', 'OPTIONS'])
+def create_orders_batch():
+    """Несколько блюд одним заказом в одной транзакции"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
 
-        cursor.execute('UPDATE dishes SET quantity = quantity - 1 WHERE id = ?', (dish_id,))
-        cursor.execute('UPDATE users SET balance = balance - ? WHERE id = ?', (dish['price'], user['id']))
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
 
-        db.commit()
+        if user['role'] != 0:
+            return jsonify({'error': 'Только ученики могут создавать заказы'}), 403
+
+        data = request.get_json()
+        items = data.get('items') or []
+        meal_type = data.get('meal_type', 'обед')
+        payment_type = data.get('payment_type', 'разовый')
+
+        if not items:
+            return jsonify({'error': 'Укажите блюда'}), 400
+
+        if len(items) > 20:
+            return jsonify({'error': 'Слишком много позиций в заказе'}), 400
+
+        # Одинаковые блюда объединяем: {dish_id: количество}
+        quantities = {}
+        for item in items:
+            dish_id = int(item['dish_id'])
+            quantity = int(item.get('quantity', 1))
+            if quantity <= 0 or quantity > 10:
+                return jsonify({'error': 'Количество должно быть от 1 до 10'}), 400
+            quantities[dish_id] = quantities.get(dish_id, 0) + quantity
+
+        db = get_db()
+
+        try:
+            order_ids, total = reservations.place_orders(db, user['id'], quantities, meal_type, payment_type)
+        except reservations.ReservationError as e:
+            error = {'error': str(e)}
+            if e.dish_id is not None:
+                error['dish_id'] = e.dish_id
+            return jsonify(error), 400
+
+        user_cache.invalidate(user['id'])
+        menu_cache.invalidate()
 
-        print(f"✅ Заказ создан успешно, ID: {order_id}")
         return jsonify({
             'success': True,
-            'order_id': order_id,
-            'message': 'Заказ создан успешно'
+            'order_ids': order_ids,
+            'total': total,
+            'message': f'Создано заказов: {len(order_ids)}'
         })
 
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"🔥 Ошибка создания заказа: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': 'Ошибка создания заказа'}), 500
+        logger.exception("Ошибка создания заказов")
+        return jsonify({'error': 'Ошибка создания заказов'}), 500
 
 @app.route('/api/orders/my', methods=['GET', 'OPTIONS'])
 def get_my_orders():
@@ -656,46 +888,223 @@ def get_my_orders():
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user:
             return jsonify({'error': 'Неавторизован'}), 401
 
-        db = get_db()
-        cursor = db.cursor()
+        # ?limit=&cursor= включает постраничную выдачу по ключу (order_date, id)
+        page = get_page_args(request.args, shape=(str, int))
+        if not page:
+            if user['role'] == 0:
+                return json_response(queries.fetch_json(get_db(), 'orders_student', (user['id'],)))
+            return json_response(queries.fetch_json(get_db(), 'orders_cook' if user['role'] == 1 else 'orders_admin'))
+
+        conditions = []
+        params = []
 
         if user['role'] == 0:
-            cursor.execute('SELECT * FROM orders WHERE user_id = ? ORDER BY order_date DESC', (user['id'],))
-        elif user['role'] == 1:
-            cursor.execute('''
-                           SELECT o.*, u.full_name as user_name, u.class_name
-                           FROM orders o
-                                    JOIN users u ON o.user_id = u.id
-                           WHERE o.status = 'pending'
-                           ORDER BY o.order_date
-                           ''')
+            query = 'SELECT o.* FROM orders o'
+            conditions.append('o.user_id = ?')
+            params.append(user['id'])
+            direction = 'DESC'
         else:
-            cursor.execute('''
-                           SELECT o.*, u.full_name as user_name, u.class_name
-                           FROM orders o
-                                    JOIN users u ON o.user_id = u.id
-                           ORDER BY o.order_date DESC
-                           ''')
+            query = '''
+                    SELECT o.*, u.full_name as user_name, u.class_name
+                    FROM orders o
+                             JOIN users u ON o.user_id = u.id
+                    '''
+            if user['role'] == 1:
+                conditions.append("o.status = 'pending'")
+                direction = 'ASC'
+            else:
+                direction = 'DESC'
+
+        if page[1]:
+            order_date, order_id = page[1]
+            conditions.append(f'(o.order_date, o.id) {"<" if direction == "DESC" else ">"} (?, ?)')
+            params.extend([order_date, order_id])
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f' ORDER BY o.order_date {direction}, o.id {direction}'
+
+        query += ' LIMIT ?'
+        params.append(page[0] + 1)
 
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute(query, params)
         orders = cursor.fetchall()
 
-        return jsonify([dict(order) for order in orders])
+        return jsonify(make_page(orders, page[0], lambda o: (o['order_date'], o['id'])))
 
+    except InvalidCursor:
+        return jsonify({'error': 'Неверный курсор'}), 400
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"Ошибка получения заказов: {e}")
+        logger.exception("Ошибка получения заказов")
         return jsonify({'error': 'Ошибка получения заказов'}), 500
 
+def get_order_ids(data, limit=200):
+    """Список id заказов из тела запроса; неверный формат даёт ValueError"""
+    order_ids = [int(order_id) for order_id in data.get('order_ids') or []]
+    if not order_ids or len(order_ids) > limit:
+        raise ValueError('Неверный список заказов')
+    return list(dict.fromkeys(order_ids))
+
+@app.route('/api/orders/serve', methods=['POST', 'OPTIONS'])
+def serve_orders_bulk():
+    """Выдача подноса заказов одним запросом"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user or user['role'] != 1:
+            return jsonify({'error': 'Только повар может отмечать заказы как выданные'}), 403
+
+        order_ids = get_order_ids(request.get_json())
+        results, served = reservations.serve_orders(get_db(), order_ids)
+
+        return jsonify({
+            'success': True,
+            'results': {str(order_id): status for order_id, status in results.items()},
+            'message': f'Выдано заказов: {len(served)}'
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка отметки заказов")
+        return jsonify({'error': 'Ошибка отметки заказов'}), 500
+
+@app.route('/api/orders/cancel', methods=['POST', 'OPTIONS'])
+def cancel_orders_bulk():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        order_ids = get_order_ids(request.get_json())
+        results, cancelled = reservations.cancel_orders(get_db(), order_ids, user)
+
+        for user_id in {order['user_id'] for order in cancelled}:
+            user_cache.invalidate(user_id)
+        if cancelled:
+            menu_cache.invalidate()
+
+        return jsonify({
+            'success': True,
+            'results': {str(order_id): status for order_id, status in results.items()},
+            'message': f'Отменено заказов: {len(cancelled)}'
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка отмены заказов")
+        return jsonify({'error': 'Ошибка отмены заказов'}), 500
+
+@app.route('/api/orders/stream/ticket', methods=['POST', 'OPTIONS'])
+def issue_stream_ticket():
+    """Короткоживущий билет для подключения к /api/orders/stream"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    user = get_token_claims()
+    if not user or user['role'] not in [1, 2]:
+        return jsonify({'error': 'Недостаточно прав'}), 403
+
+    ttl = app.config['STREAM_TICKET_TTL']
+    return jsonify({
+        'ticket': issue_token(user, app.config['SECRET_KEY'], ttl, scope='stream'),
+        'expires_in': ttl
+    })
+
+@app.route('/api/orders/stream', methods=['GET', 'OPTIONS'])
+def stream_orders():
+    """Поток событий заказов (Server-Sent Events) для экранов кухни.
+
+    EventSource не умеет передавать заголовки, поэтому вместо токена в
+    параметре ?ticket= передаётся билет из POST /api/orders/stream/ticket:
+    он действует минуту и годится только для подключения к потоку. Билет
+    проверяется при подключении; после обрыва клиент берёт новый и
+    переподключается с Last-Event-ID, пропущенные события досылаются из базы.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims() or verify_token(request.args.get('ticket', ''), app.config['SECRET_KEY'],
+                                                  scope='stream')
+        if not user or user['role'] not in [1, 2]:
+            return jsonify({'error': 'Недостаточно прав'}), 403
+
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+
+        # Поток держит поток воркера, пока открыт: остальным запросам оставляем запас
+        if not stream_slots.acquire(blocking=False):
+            response = jsonify({'error': 'Слишком много подключений к потоку событий'})
+            response.headers['Retry-After'] = '10'
+            return response, 503
+
+        try:
+            # Подписка раньше чтения пропущенного: так ничего не потеряется,
+            # а повторы отсекаются по id
+            subscription = order_events.subscribe()
+            backlog = events.fetch_since(get_db(), last_event_id) if last_event_id else []
+        except Exception:
+            stream_slots.release()
+            raise
+
+        def generate():
+            sent = last_event_id
+            yield 'retry: 3000\n\n'
+            for event_id, event_type, order in backlog:
+                sent = event_id
+                yield events.format_sse(event_id, event_type, order)
+
+            while True:
+                try:
+                    event = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    break
+                if event[0] <= sent:
+                    continue
+                sent = event[0]
+                yield events.format_sse(*event)
+
+        def close():
+            # Сервер закрывает ответ и тогда, когда генератор так и не запустился
+            order_events.unsubscribe(subscription)
+            stream_slots.release()
+
+        response = app.response_class(generate(), mimetype='text/event-stream')
+        response.call_on_close(close)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка подписки на заказы")
+        return jsonify({'error': 'Ошибка подписки на заказы'}), 500
+
 @app.route('/api/orders/<int:order_id>/cancel', methods=['POST', 'OPTIONS'])
 def cancel_order(order_id):
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user:
             return jsonify({'error': 'Неавторизован'}), 401
 
@@ -717,15 +1126,26 @@ def cancel_order(order_id):
         if order['status'] != 'pending':
             return jsonify({'error': 'Можно отменять только ожидающие заказы'}), 400
 
-        cursor.execute('UPDATE orders SET status = ? WHERE id = ?', ('cancelled', order_id))
+        # Условие по статусу защищает от двойного возврата при параллельной отмене
+        cursor.execute("UPDATE orders SET status = ? WHERE id = ? AND status = 'pending'", ('cancelled', order_id))
+        if cursor.rowcount != 1:
+            db.rollback()
+            return jsonify({'error': 'Можно отменять только ожидающие заказы'}), 400
+        reports.record_order_cancelled(cursor, order)
+        events.record(cursor, 'cancelled', [order_id])
 
-        if order['status'] == 'pending':
+        if order['subscription_id'] is not None:
+            subscriptions.restore(cursor, [order])
+        else:
             cursor.execute('UPDATE users SET balance = balance + ? WHERE id = ?',
                            (order['price'], order['user_id']))
-            cursor.execute('UPDATE dishes SET quantity = quantity + 1 WHERE id = ?',
-                           (order['dish_id'],))
+            ledger.record_order_refunds(cursor, [order])
+        cursor.execute('UPDATE dishes SET quantity = quantity + 1 WHERE id = ?',
+                       (order['dish_id'],))
 
         db.commit()
+        user_cache.invalidate(order['user_id'])
+        menu_cache.invalidate()
 
         return jsonify({
             'success': True,
@@ -733,7 +1153,7 @@ def cancel_order(order_id):
         })
 
     except Exception as e:
-        print(f"Ошибка отмены заказа: {e}")
+        logger.exception("Ошибка отмены заказа")
         return jsonify({'error': 'Ошибка отмены заказа'}), 500
 
 
@@ -744,7 +1164,7 @@ def serve_order(order_id):
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 1:
             return jsonify({'error': 'Только повар может отмечать заказы как выданные'}), 403
 
@@ -760,8 +1180,13 @@ def serve_order(order_id):
         if order['status'] != 'pending':
             return jsonify({'error': 'Заказ уже обработан'}), 400
 
-        cursor.execute('UPDATE orders SET status = ?, served_at = CURRENT_TIMESTAMP WHERE id = ?',
+        cursor.execute("UPDATE orders SET status = ?, served_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'pending'",
                        ('served', order_id))
+        if cursor.rowcount != 1:
+            db.rollback()
+            return jsonify({'error': 'Заказ уже обработан'}), 400
+        reports.record_order_served(cursor, order)
+        events.record(cursor, 'served', [order_id])
 
         db.commit()
 
@@ -771,19 +1196,157 @@ def serve_order(order_id):
         })
 
     except Exception as e:
-        print(f"Ошибка отметки заказа: {e}")
+        logger.exception("Ошибка отметки заказа")
         return jsonify({'error': 'Ошибка отметки заказа'}), 500
 
 
 
 
+@app.route('/api/preorders', methods=['POST', 'OPTIONS'])
+def create_preorder():
+    """Предзаказ на дату: деньги и порции списываются при расчёте очереди"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        if user['role'] != 0:
+            return jsonify({'error': 'Только ученики могут создавать заказы'}), 403
+
+        data = request.get_json()
+        dish_id = data.get('dish_id')
+        if not dish_id:
+            return jsonify({'error': 'Укажите блюдо'}), 400
+
+        db = get_db()
+        try:
+            service_date = preorders.parse_service_date(data.get('service_date'))
+            preorder_id = preorders.place(db.cursor(), user['id'], int(dish_id), service_date,
+                                          data.get('meal_type', 'обед'), data.get('payment_type', 'разовый'))
+        except reservations.ReservationError as e:
+            return jsonify({'error': str(e)}), 400
+        db.commit()
+
+        return jsonify({
+            'success': True,
+            'preorder_id': preorder_id,
+            'message': f'Предзаказ на {service_date} принят'
+        }), 201
+
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка создания предзаказа")
+        return jsonify({'error': 'Ошибка создания предзаказа'}), 500
+
+@app.route('/api/preorders/my', methods=['GET', 'OPTIONS'])
+def get_my_preorders():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        # Отклонённые предзаказы несут причину в поле reason
+        cursor = get_db().cursor()
+        cursor.execute('''
+                       SELECT p.*, d.name as dish_name, d.price
+                       FROM preorders p
+                                LEFT JOIN dishes d ON p.dish_id = d.id
+                       WHERE p.user_id = ? AND p.service_date >= DATE('now', '-7 days')
+                       ORDER BY p.service_date DESC, p.id DESC
+                       ''', (user['id'],))
+        return jsonify(cursor.fetchall())
+
+    except Exception as e:
+        logger.exception("Ошибка получения предзаказов")
+        return jsonify({'error': 'Ошибка получения предзаказов'}), 500
+
+@app.route('/api/preorders/<int:preorder_id>/cancel', methods=['POST', 'OPTIONS'])
+def cancel_preorder(preorder_id):
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        db = get_db()
+        if not preorders.cancel(db.cursor(), preorder_id, user['id']):
+            return jsonify({'error': 'Предзаказ не найден или уже обработан'}), 400
+        db.commit()
+
+        return jsonify({'success': True, 'message': f'Предзаказ #{preorder_id} отменен'})
+
+    except Exception as e:
+        logger.exception("Ошибка отмены предзаказа")
+        return jsonify({'error': 'Ошибка отмены предзаказа'}), 500
+
+@app.route('/api/preorders/plan', methods=['GET', 'OPTIONS'])
+def get_preorder_plan():
+    """Спрос по блюдам на дату (?date=) для планирования закупок и остатков"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user or user['role'] not in [1, 2]:
+            return jsonify({'error': 'Недостаточно прав'}), 403
+
+        service_date = request.args.get('date') or datetime.now().date().isoformat()
+        cursor = get_db().cursor()
+        cursor.execute('''
+                       SELECT p.dish_id, d.name as dish_name, p.meal_type,
+                              COUNT(*) as queued, d.quantity as in_stock
+                       FROM preorders p
+                                LEFT JOIN dishes d ON p.dish_id = d.id
+                       WHERE p.status = 'queued' AND p.service_date = ?
+                       GROUP BY p.dish_id, p.meal_type
+                       ORDER BY queued DESC
+                       ''', (service_date,))
+        return jsonify(cursor.fetchall())
+
+    except Exception as e:
+        logger.exception("Ошибка получения плана предзаказов")
+        return jsonify({'error': 'Ошибка получения плана предзаказов'}), 500
+
+@app.route('/api/preorders/settle', methods=['POST', 'OPTIONS'])
+def settle_preorders():
+    """Ручной запуск расчёта очереди; по расписанию — python preorders.py settle"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user or user['role'] != 2:
+            return jsonify({'error': 'Только администратор может рассчитывать предзаказы'}), 403
+
+        data = request.get_json(silent=True) or {}
+        settled, rejected, charged = preorders.settle(get_db(), data.get('until'))
+        if settled:
+            for user_id in charged:
+                user_cache.invalidate(user_id)
+            menu_cache.invalidate()
+
+        return jsonify({'success': True, 'settled': settled, 'rejected': rejected})
+
+    except Exception as e:
+        logger.exception("Ошибка расчёта предзаказов")
+        return jsonify({'error': 'Ошибка расчёта предзаказов'}), 500
+
 @app.route('/api/balance/topup', methods=['POST', 'OPTIONS'])
 def topup_balance():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user:
             return jsonify({'error': 'Неавторизован'}), 401
 
@@ -803,7 +1366,9 @@ def topup_balance():
         cursor = db.cursor()
 
         cursor.execute('UPDATE users SET balance = balance + ? WHERE id = ?', (amount, user['id']))
+        ledger.record(cursor, user['id'], amount, 'topup', 'Пополнение баланса')
         db.commit()
+        user_cache.invalidate(user['id'])
 
         cursor.execute('SELECT * FROM users WHERE id = ?', (user['id'],))
         updated_user = cursor.fetchone()
@@ -815,47 +1380,175 @@ def topup_balance():
         })
 
     except Exception as e:
-        print(f"Ошибка пополнения баланса: {e}")
+        logger.exception("Ошибка пополнения баланса")
         return jsonify({'error': 'Ошибка пополнения баланса'}), 500
 
 
 
+@app.route('/api/balance/statement', methods=['GET', 'OPTIONS'])
+def get_balance_statement():
+    """Выписка ?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД; администратор может указать user_id"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        user_id = user['id']
+        if request.args.get('user_id') and user['role'] == 2:
+            user_id = int(request.args['user_id'])
+
+        today = datetime.now().date()
+        date_to = datetime.strptime(request.args.get('to', today.isoformat()), '%Y-%m-%d').date()
+        date_from = datetime.strptime(request.args.get('from', date_to.replace(day=1).isoformat()), '%Y-%m-%d').date()
+        if date_from > date_to:
+            return jsonify({'error': 'Неверный период'}), 400
+
+        return jsonify(ledger.statement(get_db().cursor(), user_id, date_from.isoformat(), date_to.isoformat()))
+
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка получения выписки")
+        return jsonify({'error': 'Ошибка получения выписки'}), 500
+
+
+
+@app.route('/api/subscriptions/plans', methods=['GET', 'OPTIONS'])
+def get_subscription_plans():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    return jsonify(subscriptions.PLANS)
+
+@app.route('/api/subscriptions', methods=['GET', 'POST', 'OPTIONS'])
+def manage_subscriptions():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+
+        db = get_db()
+
+        if request.method == 'GET':
+            cursor = db.cursor()
+            cursor.execute('''
+                           SELECT * FROM subscriptions
+                           WHERE user_id = ?
+                           ORDER BY created_at DESC, id DESC
+                           ''', (user['id'],))
+            return jsonify(cursor.fetchall())
+
+        # POST - покупка абонемента с баланса
+        if user['role'] != 0:
+            return jsonify({'error': 'Только ученики могут покупать абонементы'}), 403
+
+        data = request.get_json()
+        try:
+            subscription_id = reservations.run_in_transaction(
+                db, lambda cursor: subscriptions.purchase(cursor, user['id'], data.get('plan')))
+        except reservations.ReservationError as e:
+            return jsonify({'error': str(e)}), 400
+        user_cache.invalidate(user['id'])
+
+        return jsonify({
+            'success': True,
+            'subscription_id': subscription_id,
+            'message': 'Абонемент оформлен'
+        }), 201
+
+    except Exception as e:
+        logger.exception("Ошибка оформления абонемента")
+        return jsonify({'error': 'Ошибка оформления абонемента'}), 500
+
+
+
 @app.route('/api/purchases', methods=['GET', 'OPTIONS'])
 def get_purchases():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] not in [1, 2]:
             return jsonify({'error': 'Недостаточно прав'}), 403
 
         db = get_db()
         cursor = db.cursor()
 
-        if user['role'] == 1:
-            cursor.execute('''
-                           SELECT pr.*, u.full_name as created_by_name
-                           FROM purchase_requests pr
-                                    JOIN users u ON pr.created_by = u.id
-                           WHERE pr.created_by = ?
-                           ORDER BY pr.created_at DESC
-                           ''', (user['id'],))
-        else:
-            cursor.execute('''
-                           SELECT pr.*, u1.full_name as created_by_name, u2.full_name as processed_by_name
-                           FROM purchase_requests pr
-                                    JOIN users u1 ON pr.created_by = u1.id
-                                    LEFT JOIN users u2 ON pr.processed_by = u2.id
-                           ORDER BY pr.status, pr.created_at DESC
-                           ''')
-
-        requests = cursor.fetchall()
+        # Ключ выдачи повара (created_at, id), администратора (status, created_at, id)
+        page = get_page_args(request.args, shape=(str, int) if user['role'] == 1 else (str, str, int))
+        if not page:
+            if user['role'] == 1:
+                return json_response(queries.fetch_json(db, 'purchases_cook', (user['id'],)))
+            if repository is not None:
+                return jsonify([dict(repository.row_dict(pr), created_by_name=pr.creator.full_name,
+                                     processed_by_name=pr.processor.full_name if pr.processor else None)
+                                for pr in repository.admin_purchase_requests(get_session())])
+            return json_response(queries.fetch_json(db, 'purchases_admin'))
 
-        return jsonify([dict(req) for req in requests])
+        page_cursor = page[1]
+        params = []
 
+        if user['role'] == 1:
+            query = '''
+                    SELECT pr.*, u.full_name as created_by_name
+                    FROM purchase_requests pr
+                             JOIN users u ON pr.created_by = u.id
+                    WHERE pr.created_by = ?
+                    '''
+            params.append(user['id'])
+            if page_cursor:
+                created_at, request_id = page_cursor
+                query += ' AND (pr.created_at, pr.id) < (?, ?)'
+                params.extend([created_at, request_id])
+            query += ' ORDER BY pr.created_at DESC, pr.id DESC'
+            page_key = lambda r: (r['created_at'], r['id'])
+        else:
+            source = 'purchase_requests'
+            if page_cursor:
+                # Остаток текущего статуса и начало следующих — два диапазона индекса
+                # (status, created_at DESC, id DESC); сортируются только 2 * limit строк
+                status, created_at, request_id = page_cursor
+                source = '''
+                         (SELECT * FROM (SELECT * FROM purchase_requests
+                                         WHERE status = ? AND (created_at, id) < (?, ?)
+                                         ORDER BY created_at DESC, id DESC
+                                         LIMIT ?)
+                          UNION ALL
+                          SELECT * FROM (SELECT * FROM purchase_requests
+                                         WHERE status > ? AND status != 'draft'
+                                         ORDER BY status, created_at DESC, id DESC
+                                         LIMIT ?))
+                         '''
+                params.extend([status, created_at, request_id, page[0] + 1, status, page[0] + 1])
+            query = '''
+                    SELECT pr.*, u1.full_name as created_by_name, u2.full_name as processed_by_name
+                    FROM {source} pr
+                             JOIN users u1 ON pr.created_by = u1.id
+                             LEFT JOIN users u2 ON pr.processed_by = u2.id
+                    WHERE pr.status != 'draft'
+                    '''.format(source=source)
+            query += ' ORDER BY pr.status, pr.created_at DESC, pr.id DESC'
+            page_key = lambda r: (r['status'], r['created_at'], r['id'])
+
+        query += ' LIMIT ?'
+        params.append(page[0] + 1)
+
+        cursor.execute(query, params)
+        return jsonify(make_page(cursor.fetchall(), page[0], page_key))
+
+    except InvalidCursor:
+        return jsonify({'error': 'Неверный курсор'}), 400
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"Ошибка получения заявок: {e}")
+        logger.exception("Ошибка получения заявок")
         return jsonify({'error': 'Ошибка получения заявок'}), 500
 
 @app.route('/api/purchases', methods=['POST', 'OPTIONS'])
@@ -864,7 +1557,7 @@ def create_purchase():
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 1:
             return jsonify({'error': 'Только повар может создавать заявки'}), 403
 
@@ -903,16 +1596,118 @@ def create_purchase():
         })
 
     except Exception as e:
-        print(f"Ошибка создания заявки: {e}")
+        logger.exception("Ошибка создания заявки")
         return jsonify({'error': 'Ошибка создания заявки'}), 500
 
+@app.route('/api/purchases/forecast', methods=['GET', 'POST', 'OPTIONS'])
+def purchase_forecast():
+    """Прогноз спроса на ?days= дней; POST — черновики заявок на недостающее"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user or user['role'] not in [1, 2]:
+            return jsonify({'error': 'Недостаточно прав'}), 403
+
+        if not forecast.available():
+            return jsonify({'error': 'Прогноз недоступен: не установлен numpy'}), 503
+
+        data = request.get_json(silent=True) or {}
+        days = int(data.get('days', request.args.get('days', forecast.HORIZON_DAYS)))
+        if not 1 <= days <= forecast.MAX_HORIZON_DAYS:
+            return jsonify({'error': f'Прогноз возможен на 1-{forecast.MAX_HORIZON_DAYS} дней'}), 400
+
+        db = get_db()
+
+        if request.method == 'GET':
+            return jsonify(forecast.plan(db, days))
+
+        if user['role'] != 1:
+            return jsonify({'error': 'Только повар может создавать заявки'}), 403
+
+        rows = forecast.plan(db, days)
+        count = reservations.run_in_transaction(
+            db, lambda cursor: forecast.draft_purchases(cursor, user['id'], rows, days))
+
+        return jsonify({
+            'success': True,
+            'drafts': count,
+            'message': f'Черновиков заявок: {count}'
+        }), 201
+
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
+    except Exception as e:
+        logger.exception("Ошибка прогноза спроса")
+        return jsonify({'error': 'Ошибка прогноза спроса'}), 500
+
+@app.route('/api/purchases/drafts', methods=['GET', 'OPTIONS'])
+def get_purchase_drafts():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user or user['role'] != 1:
+            return jsonify({'error': 'Только повар может просматривать черновики'}), 403
+
+        cursor = get_db().cursor()
+        cursor.execute('''
+                       SELECT * FROM purchase_requests
+                       WHERE status = ?
+                       ORDER BY quantity DESC, id
+                       ''', (forecast.DRAFT_STATUS,))
+        return jsonify(cursor.fetchall())
+
+    except Exception as e:
+        logger.exception("Ошибка получения черновиков")
+        return jsonify({'error': 'Ошибка получения черновиков'}), 500
+
+@app.route('/api/purchases/<int:request_id>/confirm', methods=['POST', 'OPTIONS'])
+def confirm_purchase(request_id):
+    """Повар подтверждает черновик (можно поправить quantity), и заявка уходит администратору"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+
+    try:
+        user = get_token_claims()
+        if not user or user['role'] != 1:
+            return jsonify({'error': 'Только повар может подтверждать заявки'}), 403
+
+        data = request.get_json(silent=True) or {}
+        quantity = data.get('quantity')
+        if quantity is not None and (not isinstance(quantity, int) or quantity <= 0):
+            return jsonify({'error': 'Количество должно быть положительным'}), 400
+
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute('''
+                       UPDATE purchase_requests
+                       SET status = 'pending', quantity = COALESCE(?, quantity),
+                           created_by = ?, created_at = CURRENT_TIMESTAMP
+                       WHERE id = ? AND status = ?
+                       ''', (quantity, user['id'], request_id, forecast.DRAFT_STATUS))
+        if cursor.rowcount == 0:
+            return jsonify({'error': 'Черновик не найден'}), 404
+        db.commit()
+
+        return jsonify({
+            'success': True,
+            'message': 'Заявка отправлена администратору'
+        })
+
+    except Exception as e:
+        logger.exception("Ошибка подтверждения заявки")
+        return jsonify({'error': 'Ошибка подтверждения заявки'}), 500
+
 @app.route('/api/purchases/<int:request_id>/approve', methods=['POST', 'OPTIONS'])
 def approve_purchase(request_id):
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только админ может утверждать заявки'}), 403
 
@@ -942,6 +1737,7 @@ def approve_purchase(request_id):
                            ''', (request_data['quantity'], request_data['dish_id']))
 
         db.commit()
+        menu_cache.invalidate()
 
         return jsonify({
             'success': True,
@@ -949,7 +1745,7 @@ def approve_purchase(request_id):
         })
 
     except Exception as e:
-        print(f"Ошибка утверждения заявки: {e}")
+        logger.exception("Ошибка утверждения заявки")
         return jsonify({'error': 'Ошибка утверждения заявки'}), 500
 
 @app.route('/api/purchases/<int:request_id>/reject', methods=['POST', 'OPTIONS'])
@@ -958,7 +1754,7 @@ def reject_purchase(request_id):
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только админ может отклонять заявки'}), 403
 
@@ -988,7 +1784,7 @@ def reject_purchase(request_id):
         })
 
     except Exception as e:
-        print(f"Ошибка отклонения заявки: {e}")
+        logger.exception("Ошибка отклонения заявки")
         return jsonify({'error': 'Ошибка отклонения заявки'}), 500
 
 
@@ -998,7 +1794,7 @@ def get_reports_summary():
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только администратор может просматривать отчеты'}), 403
 
@@ -1008,75 +1804,62 @@ def get_reports_summary():
         cursor.execute('SELECT COUNT(*) as total_users FROM users')
         total_users = cursor.fetchone()['total_users']
 
-        cursor.execute('SELECT COUNT(*) as total_orders FROM orders')
-        total_orders = cursor.fetchone()['total_orders']
-
         cursor.execute('SELECT COUNT(*) as total_dishes FROM dishes')
         total_dishes = cursor.fetchone()['total_dishes']
 
-        # Финансовая статистика
-        cursor.execute('SELECT SUM(price) as total_revenue FROM orders WHERE status = "served"')
-        total_revenue = cursor.fetchone()['total_revenue'] or 0
-
         cursor.execute('SELECT SUM(balance) as total_balance FROM users')
         total_balance = cursor.fetchone()['total_balance'] or 0
 
-        cursor.execute('''
-                       SELECT status, COUNT(*) as count
-                       FROM orders
-                       GROUP BY status
-                       ''')
+        # Статистика заказов читается из отчётных таблиц (reports.py)
+        cursor.execute('SELECT status, count FROM report_status WHERE count > 0')
         orders_by_status = dict(cursor.fetchall())
+        total_orders = sum(orders_by_status.values())
+
+        cursor.execute('SELECT SUM(revenue) as total_revenue FROM report_dish')
+        total_revenue = cursor.fetchone()['total_revenue'] or 0
 
         cursor.execute('''
-                       SELECT d.category, COUNT(o.id) as order_count, SUM(o.price) as revenue
-                       FROM orders o
-                                JOIN dishes d ON o.dish_id = d.id
-                       WHERE o.status = "served"
+                       SELECT d.category, SUM(r.order_count) as order_count, SUM(r.revenue) as revenue
+                       FROM report_dish r
+                                JOIN dishes d ON r.dish_id = d.id
                        GROUP BY d.category
                        ''')
         categories_data = cursor.fetchall()
 
         cursor.execute('''
-                       SELECT d.name, COUNT(o.id) as order_count, SUM(o.price) as revenue
-                       FROM orders o
-                                JOIN dishes d ON o.dish_id = d.id
-                       WHERE o.status = "served"
-                       GROUP BY d.id
-                       ORDER BY order_count DESC
+                       SELECT d.name, r.order_count, r.revenue
+                       FROM report_dish r
+                                JOIN dishes d ON r.dish_id = d.id
+                       ORDER BY r.order_count DESC
                            LIMIT 10
                        ''')
         popular_dishes = cursor.fetchall()
 
         cursor.execute('''
-                       SELECT u.username, u.full_name, COUNT(o.id) as order_count, SUM(o.price) as total_spent
-                       FROM orders o
-                                JOIN users u ON o.user_id = u.id
-                       WHERE o.status = "served"
-                       GROUP BY u.id
-                       ORDER BY total_spent DESC
+                       SELECT u.username, u.full_name, r.order_count, r.total_spent
+                       FROM report_user r
+                                JOIN users u ON r.user_id = u.id
+                       ORDER BY r.total_spent DESC
                            LIMIT 10
                        ''')
         active_users = cursor.fetchall()
 
         cursor.execute('''
-                       SELECT
-                           DATE(order_date) as date,
-                           COUNT(*) as order_count,
-                           SUM(price) as daily_revenue
-                       FROM orders
-                       WHERE order_date >= DATE('now', '-7 days')
-                       GROUP BY DATE(order_date)
+                       SELECT date, order_count, revenue as daily_revenue
+                       FROM report_daily
+                       WHERE date >= DATE('now', '-7 days')
                        ORDER BY date
                        ''')
         daily_stats = cursor.fetchall()
 
-        cursor.execute('SELECT COUNT(*) as total_requests FROM purchase_requests')
+        # Черновики по прогнозу администратору не видны, пока повар их не подтвердит
+        cursor.execute("SELECT COUNT(*) as total_requests FROM purchase_requests WHERE status != 'draft'")
         total_requests = cursor.fetchone()['total_requests']
 
         cursor.execute('''
                        SELECT status, COUNT(*) as count
                        FROM purchase_requests
+                       WHERE status != 'draft'
                        GROUP BY status
                        ''')
         requests_by_status = dict(cursor.fetchall())
@@ -1104,86 +1887,123 @@ def get_reports_summary():
         })
 
     except Exception as e:
-        print(f"Ошибка получения отчетов: {e}")
+        logger.exception("Ошибка получения отчетов")
         return jsonify({'error': 'Ошибка получения отчетов'}), 500
 
+REPORT_ORDER_COLUMNS = ('id', 'order_date', 'dish_name', 'price', 'status', 'meal_type', 'payment_type')
+
+# Типы полей ключа сортировки каждой секции детального отчета (для проверки курсора)
+REPORT_PAGE_KEYS = {'orders': (str, int), 'users': (str, int), 'dishes': (int,)}
+
+def get_detailed_report_page(cursor, section, limit, page_cursor):
+    """Страница детального отчета: заказы и пользователи от новых к старым, блюда по id"""
+    rows = None
+    if section == 'orders' and repository is not None:
+        rows = []
+        for order in repository.recent_orders(get_session(), limit + 1, before=page_cursor, with_dish=False):
+            row = repository.row_dict(order)
+            rows.append({column: row[column] for column in REPORT_ORDER_COLUMNS})
+            rows[-1].update(username=order.user.username, full_name=order.user.full_name,
+                            class_name=order.user.class_name)
+        page_key = lambda r: (r['order_date'], r['id'])
+
+    elif section == 'orders':
+        query = '''
+                SELECT o.id, o.order_date, o.dish_name, o.price, o.status, o.meal_type, o.payment_type,
+                       u.username, u.full_name, u.class_name
+                FROM orders o
+                         JOIN users u ON o.user_id = u.id
+                '''
+        params = []
+        if page_cursor:
+            order_date, order_id = page_cursor
+            query += ' WHERE (o.order_date, o.id) < (?, ?)'
+            params.extend([order_date, order_id])
+        query += ' ORDER BY o.order_date DESC, o.id DESC LIMIT ?'
+        page_key = lambda r: (r['order_date'], r['id'])
+
+    elif section == 'users':
+        # Выданные заказы и расходы берутся из отчётной таблицы, а не из всей истории orders
+        query = '''
+                SELECT p.*,
+                       COALESCE(r.order_count, 0) as total_orders,
+                       COALESCE(r.total_spent, 0) as total_spent
+                FROM (SELECT id, username, full_name, role, class_name, balance, created_at
+                      FROM users
+                      {where}
+                      ORDER BY created_at DESC, id DESC
+                      LIMIT ?) p
+                         LEFT JOIN report_user r ON r.user_id = p.id
+                ORDER BY p.created_at DESC, p.id DESC
+                '''
+        params = []
+        where = ''
+        if page_cursor:
+            created_at, user_id = page_cursor
+            where = 'WHERE (created_at, id) < (?, ?)'
+            params.extend([created_at, user_id])
+        query = query.format(where=where)
+        page_key = lambda r: (r['created_at'], r['id'])
+
+    elif section == 'dishes':
+        query = '''
+                SELECT p.*,
+                       COALESCE(r.order_count, 0) as order_count,
+                       COALESCE(r.revenue, 0) as revenue
+                FROM (SELECT id, name, category, price, quantity, rating, rating_count
+                      FROM dishes
+                      WHERE id > ?
+                      ORDER BY id
+                      LIMIT ?) p
+                         LEFT JOIN report_dish r ON r.dish_id = p.id
+                ORDER BY p.id
+                '''
+        params = [page_cursor[0] if page_cursor else 0]
+        page_key = lambda r: (r['id'],)
+
+    else:
+        raise ValueError('Неизвестная секция отчета')
+
+    if rows is None:
+        params.append(limit + 1)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    result = make_page(rows, limit, page_key)
+    result['section'] = section
+    result['generated_at'] = datetime.now().isoformat()
+    return result
+
 @app.route('/api/reports/detailed', methods=['GET', 'OPTIONS'])
 def get_detailed_report():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только администратор может просматривать отчеты'}), 403
 
         db = get_db()
         cursor = db.cursor()
 
-        cursor.execute('''
-                       SELECT
-                           o.id,
-                           o.order_date,
-                           o.dish_name,
-                           o.price,
-                           o.status,
-                           o.meal_type,
-                           o.payment_type,
-                           u.username,
-                           u.full_name,
-                           u.class_name
-                       FROM orders o
-                                JOIN users u ON o.user_id = u.id
-                       ORDER BY o.order_date DESC
-                           LIMIT 100
-                       ''')
-        detailed_orders = cursor.fetchall()
+        # ?section=orders|users|dishes&limit=&cursor= отдаёт одну секцию постранично
+        page = get_page_args(request.args, keys=('section', 'limit', 'cursor'),
+                             shape=REPORT_PAGE_KEYS.get(request.args.get('section', 'orders')))
+        if page:
+            return jsonify(get_detailed_report_page(cursor, request.args.get('section', 'orders'), *page))
 
-        cursor.execute('''
-                       SELECT
-                           u.id,
-                           u.username,
-                           u.full_name,
-                           u.role,
-                           u.class_name,
-                           u.balance,
-                           u.created_at,
-                           COUNT(o.id) as total_orders,
-                           SUM(CASE WHEN o.status = "served" THEN o.price ELSE 0 END) as total_spent
-                       FROM users u
-                                LEFT JOIN orders o ON u.id = o.user_id
-                       GROUP BY u.id
-                       ORDER BY u.created_at DESC
-                       ''')
-        detailed_users = cursor.fetchall()
-
-        cursor.execute('''
-                       SELECT
-                           d.id,
-                           d.name,
-                           d.category,
-                           d.price,
-                           d.quantity,
-                           d.rating,
-                           d.rating_count,
-                           COUNT(o.id) as order_count,
-                           SUM(CASE WHEN o.status = "served" THEN o.price ELSE 0 END) as revenue
-                       FROM dishes d
-                                LEFT JOIN orders o ON d.id = o.dish_id
-                       GROUP BY d.id
-                       ORDER BY order_count DESC
-                       ''')
-        detailed_dishes = cursor.fetchall()
-
-        return jsonify({
-            'orders': [dict(order) for order in detailed_orders],
-            'users': [dict(user) for user in detailed_users],
-            'dishes': [dict(dish) for dish in detailed_dishes],
-            'generated_at': datetime.now().isoformat()
-        })
+        return json_response('{"orders":%s,"users":%s,"dishes":%s,"generated_at":%s}' % (
+            queries.fetch_json(db, 'report_recent_orders'),
+            queries.fetch_json(db, 'report_users'),
+            queries.fetch_json(db, 'report_dishes'),
+            app.json.dumps(datetime.now().isoformat())))
 
+    except InvalidCursor:
+        return jsonify({'error': 'Неверный курсор'}), 400
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"Ошибка получения детального отчета: {e}")
+        logger.exception("Ошибка получения детального отчета")
         return jsonify({'error': 'Ошибка получения отчета'}), 500
 
 @app.route('/api/reports/export', methods=['GET', 'OPTIONS'])
@@ -1192,28 +2012,61 @@ def export_reports():
         return jsonify({'status': 'ok'})
 
     try:
-        user = get_user_from_token()
+        user = get_token_claims()
         if not user or user['role'] != 2:
             return jsonify({'error': 'Только администратор может экспортировать отчеты'}), 403
 
         format_type = request.args.get('format', 'json')
 
-        if format_type == 'csv':
-            return jsonify({
-                'success': True,
-                'message': 'Экспорт в CSV будет реализован позже',
-                'url': '#'
-            })
+        if format_type in ('csv', 'ndjson'):
+            # Выгрузка всех заказов потоком: память не зависит от числа строк
+            filters = export.parse_filters(request.args)
+            query, params = export.build_orders_query(filters)
+            batches = export.iter_rows(pool, query, params)
+
+            if format_type == 'csv':
+                body = export.iter_csv(batches, export.ORDER_COLUMNS)
+                mimetype = 'text/csv'
+            else:
+                body = export.iter_ndjson(batches, export.ORDER_COLUMNS)
+                mimetype = 'application/x-ndjson'
+
+            filename = f'orders.{format_type}'
+            if request.args.get('compress') == 'gzip':
+                body = export.gzip_stream(body)
+                mimetype = 'application/gzip'
+                filename += '.gz'
+
+            response = app.response_class(body, mimetype=mimetype)
+            response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+            return response
         else:
             # Возвращаем JSON с данными
             return get_reports_summary()
 
+    except ValueError as e:
+        return jsonify({'error': 'Неверный формат данных'}), 400
     except Exception as e:
-        print(f"Ошибка экспорта отчетов: {e}")
+        logger.exception("Ошибка экспорта отчетов")
         return jsonify({'error': 'Ошибка экспорта отчетов'}), 500
 
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    auth_header = request.headers.get('Authorization', '')
+    scraper = app.config['METRICS_TOKEN'] and auth_header.startswith('Bearer ') \
+        and hmac.compare_digest(auth_header[7:], app.config['METRICS_TOKEN'])
+    if not scraper:
+        user = get_token_claims()
+        if not user:
+            return jsonify({'error': 'Неавторизован'}), 401
+        if user['role'] != 2:
+            return jsonify({'error': 'Недостаточно прав'}), 403
+
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health', methods=['GET', 'OPTIONS'])
 def health_check():
     if request.method == 'OPTIONS':
@@ -1244,7 +2097,7 @@ def health_check():
         })
 
     except Exception as e:
-        print(f"Ошибка health check: {e}")
+        logger.exception("Ошибка health check")
         return jsonify({'error': 'Database error'}), 500
 
 
@@ -1253,6 +2106,8 @@ def health_check():
 
 if __name__ == '__main__':
     init_db()
+    if app.config['SECRET_KEY'] == DEV_SECRET_KEY:
+        logger.warning("SECRET_KEY не задан: токены подписываются встроенным ключом разработки")
 
     print("=" * 60)
     print("🚀 ПОЛНЫЙ СЕРВЕР СО ВСЕМИ ФУНКЦИЯМИ")
@@ -1271,4 +2126,5 @@ if __name__ == '__main__':
     print("  👨‍💼 Админ:   все функции + управление заявками")
     print("=" * 60)
 
-    app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
+    # Сервер разработки; в продакшене: gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(debug=os.environ.get('CAFE_DEBUG') == '1', port=5000, host='0.0.0.0', threaded=True)
\ No newline at end of file
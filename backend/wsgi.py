@@ -0,0 +1,28 @@
+"""Точка входа для WSGI-сервера.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+import working_server
+
+
+def create_app():
+    """Подготовка приложения в мастер-процессе, до запуска воркеров"""
+    # Встроенным ключом разработки любой читатель репозитория подпишет токен администратора
+    if working_server.app.config['SECRET_KEY'] == working_server.DEV_SECRET_KEY \
+            and os.environ.get('CAFE_DEBUG') != '1':
+        raise RuntimeError('SECRET_KEY не задан: задайте длинный случайный ключ в переменных окружения '
+                           '(или CAFE_DEBUG=1 для локального запуска)')
+    # Миграции и начальные данные применяются один раз, а не в каждом воркере
+    working_server.init_db()
+    # Соединения SQLite не должны переживать fork: воркеры откроют свои
+    working_server.pool.close_all()
+    working_server.menu_cache.share_between_processes()
+    working_server.dish_index.share_between_processes()
+    working_server.user_cache.share_between_processes()
+    return working_server.app
+
+
+app = create_app()
@@ -8,6 +8,7 @@ ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend,
 const AdminPanel = () => {
     const [activeTab, setActiveTab] = useState('dashboard');
     const [purchaseRequests, setPurchaseRequests] = useState([]);
+    const [purchasesCursor, setPurchasesCursor] = useState(null);
     const [financialReport, setFinancialReport] = useState(null);
     const [nutritionReport, setNutritionReport] = useState(null);
     const [adminComment, setAdminComment] = useState('');
@@ -17,10 +18,11 @@ const AdminPanel = () => {
         fetchReports();
     }, []);
 
-    const fetchPurchaseRequests = async () => {
+    const fetchPurchaseRequests = async (cursor = null) => {
         try {
-            const response = await api.getPurchaseRequests();
-            setPurchaseRequests(response.data);
+            const response = await api.getPurchaseRequests(cursor);
+            setPurchaseRequests(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+            setPurchasesCursor(response.data.next_cursor);
         } catch (error) {
             console.error('Ошибка загрузки заявок:', error);
         }
@@ -28,10 +30,10 @@ const AdminPanel = () => {
 
     const fetchReports = async () => {
         try {
+            // Популярные блюда приходят в сводке: детальный отчет отдаётся страницами
             const financial = await api.getFinancialReport();
-            const nutrition = await api.getNutritionReport();
             setFinancialReport(financial.data);
-            setNutritionReport(nutrition.data);
+            setNutritionReport(financial.data);
         } catch (error) {
             console.error('Ошибка загрузки отчетов:', error);
         }
@@ -193,6 +195,11 @@ const AdminPanel = () => {
                                 </div>
                             </div>
                         )}
+                        {purchasesCursor && (
+                            <button className="btn btn-outline-secondary mt-3" onClick={() => fetchPurchaseRequests(purchasesCursor)}>
+                                Показать ещё
+                            </button>
+                        )}
                     </div>
                 )}
 
@@ -5,6 +5,7 @@ const CookPanel = () => {
     const [activeTab, setActiveTab] = useState('orders');
     const [pendingOrders, setPendingOrders] = useState([]);
     const [purchaseRequests, setPurchaseRequests] = useState([]);
+    const [purchasesCursor, setPurchasesCursor] = useState(null);
     const [newRequest, setNewRequest] = useState({
         product_name: '',
         quantity: '',
@@ -27,10 +28,11 @@ const CookPanel = () => {
         }
     };
 
-    const fetchPurchaseRequests = async () => {
+    const fetchPurchaseRequests = async (cursor = null) => {
         try {
-            const response = await api.getPurchaseRequests();
-            setPurchaseRequests(response.data);
+            const response = await api.getPurchaseRequests(cursor);
+            setPurchaseRequests(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+            setPurchasesCursor(response.data.next_cursor);
         } catch (error) {
             console.error('Ошибка загрузки заявок:', error);
         }
@@ -130,6 +132,11 @@ const CookPanel = () => {
                                     ))}
                                 </div>
                             )}
+                            {purchasesCursor && (
+                                <button className="btn btn-outline-secondary mt-3" onClick={() => fetchPurchaseRequests(purchasesCursor)}>
+                                    Показать ещё
+                                </button>
+                            )}
                         </div>
 
                         <div className="col-md-6">
@@ -9,6 +9,7 @@ const StudentPanel = () => {
     const [balance, setBalance] = useState(0);
     const [topupAmount, setTopupAmount] = useState(100);
     const [orders, setOrders] = useState([]);
+    const [ordersCursor, setOrdersCursor] = useState(null);
 
     useEffect(() => {
         fetchUserData();
@@ -24,10 +25,11 @@ const StudentPanel = () => {
         }
     };
 
-    const fetchOrders = async () => {
+    const fetchOrders = async (cursor = null) => {
         try {
-            const response = await api.getMyOrders();
-            setOrders(response.data);
+            const response = await api.getMyOrders(cursor);
+            setOrders(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+            setOrdersCursor(response.data.next_cursor);
         } catch (error) {
             console.error('Ошибка загрузки заказов:', error);
         }
@@ -108,6 +110,11 @@ const StudentPanel = () => {
                     <div>
                         <h3>Мои заказы</h3>
                         <OrderList orders={orders} />
+                        {ordersCursor && (
+                            <button className="btn btn-outline-secondary mt-3" onClick={() => fetchOrders(ordersCursor)}>
+                                Показать ещё
+                            </button>
+                        )}
                     </div>
                 )}
 
@@ -2,6 +2,13 @@ import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// С limit сервер отдаёт списки страницами {items, next_cursor}
+const PAGE_LIMIT = 50;
+
+const page = (cursor, params = {}) => ({
+    params: { ...params, limit: PAGE_LIMIT, ...(cursor ? { cursor } : {}) },
+});
+
 const api = axios.create({
     baseURL: API_BASE_URL,
     headers: {
@@ -68,8 +75,8 @@ export default {
     createOrder: (dishId, mealType, paymentType) =>
         api.post('/orders', { dish_id: dishId, meal_type: mealType, payment_type: paymentType }),
 
-    getMyOrders: () =>
-        api.get('/orders/my'),
+    getMyOrders: (cursor) =>
+        api.get('/orders/my', page(cursor)),
 
     getAllOrders: () =>
         api.get('/orders/all'),
@@ -92,8 +99,8 @@ export default {
     createPurchaseRequest: (data) =>
         api.post('/purchases', data),
 
-    getPurchaseRequests: () =>
-        api.get('/purchases'),
+    getPurchaseRequests: (cursor) =>
+        api.get('/purchases', page(cursor)),
 
     processPurchaseRequest: (requestId, action, comment) => {
         if (action === 'approve') {
@@ -108,8 +115,8 @@ export default {
     getFinancialReport: () =>
         api.get('/reports/summary'),
 
-    getNutritionReport: () =>
-        api.get('/reports/detailed'),
+    getNutritionReport: (section, cursor) =>
+        api.get('/reports/detailed', page(cursor, { section })),
 
 
     testDoubleOrder: () =>